@@ -1,8 +1,27 @@
+import logging
+import time
+from dataclasses import dataclass
 from os import environ
 from os.path import dirname, join
+from typing import Optional
 
 from dotenv import load_dotenv
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import (
+    Blueprint,
+    Flask,
+    abort,
+    current_app,
+    flash,
+    g,
+    has_request_context,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    stream_template,
+    url_for,
+)
 from flask_login import (
     LoginManager,
     current_user,
@@ -10,52 +29,202 @@ from flask_login import (
     login_user,
     logout_user,
 )
+from werkzeug.local import LocalProxy
+
+from barathrum.controller.controller import Controller, SolutionNotFoundException
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.pagination import InvalidCursorException
+from barathrum.controller.db.storage import (
+    ACTIVE_SOLUTION_JOB_STATUSES,
+    create_storage,
+)
+from barathrum.controller.passwords import PasswordHasherBusyException
+from barathrum.controller.workers import (
+    SolutionWorkerPool,
+    create_solution_worker_pool,
+)
+from barathrum.metrics import Metrics
+from barathrum.models.entities import OrderStatuses
+from barathrum.profiling import (
+    PROFILE_HEADER,
+    RequestProfiler,
+    create_request_profiler,
+)
 
-from barathrum.controller.controller import Controller
-from barathrum.controller.db.mongo import MongoBase
-
-app = Flask(__name__, template_folder="templates", static_folder="static")
-controller = Controller(MongoBase())
 dotenv_path = join(dirname(__file__), "config.env")
 load_dotenv(dotenv_path)
-app.config["SECRET_KEY"] = environ.get("SECRET_KEY")
 
+views = Blueprint("barathrum", __name__)
 login_manager = LoginManager()
-login_manager.init_app(app)
+logger = logging.getLogger("barathrum")
+
+
+@dataclass
+class Services:
+    controller: Controller
+    solution_workers: SolutionWorkerPool
+    metrics: Metrics
+    profiler: RequestProfiler
+
+
+controller: Controller = LocalProxy(
+    lambda: current_app.extensions["barathrum"].controller
+)
+solution_workers: SolutionWorkerPool = LocalProxy(
+    lambda: current_app.extensions["barathrum"].solution_workers
+)
+metrics: Metrics = LocalProxy(lambda: current_app.extensions["barathrum"].metrics)
+profiler: RequestProfiler = LocalProxy(
+    lambda: current_app.extensions["barathrum"].profiler
+)
 
 
-# TODO: Сделать создание решений не сразу после создания заказа, а при просмотре заказов
 # TODO: Сделать удаление заказа
 
 
+def request_identity_map() -> Optional[IdentityMap]:
+    if not has_request_context():
+        return None
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def create_app(
+    app_controller: Optional[Controller] = None, start_workers: bool = True
+) -> Flask:
+    app = Flask(__name__, template_folder="templates", static_folder="static")
+    app.config["SECRET_KEY"] = environ.get("SECRET_KEY")
+    if app_controller is None:
+        app_controller = Controller(create_storage())
+    app_controller.database.identity_map_provider = request_identity_map
+    app_metrics = Metrics(token=environ.get("METRICS_TOKEN"))
+    app_metrics.instrument(app_controller, "controller")
+    app_metrics.instrument(app_controller.database, "database")
+    workers = create_solution_worker_pool(app_controller)
+    if start_workers and workers.workers:
+        workers.start()
+    services = Services(app_controller, workers, app_metrics, create_request_profiler())
+    app_metrics.register_state(services)
+    app.extensions["barathrum"] = services
+    login_manager.init_app(app)
+    app.register_blueprint(views)
+    return app
+
+
+@views.before_app_request
+def count_database_operations():
+    g.request_started = time.perf_counter()
+    g.database_operations = controller.database.operations.start()
+
+
+@views.after_app_request
+def observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe_request(
+            request.endpoint or "unmatched",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+        )
+    return response
+
+
+@views.before_app_request
+def start_profiling():
+    requested = PROFILE_HEADER in request.headers
+    email = current_user.email if requested and current_user.is_authenticated else None
+    if profiler.should_profile(requested, email):
+        g.profile = profiler.start()
+        g.profile_operations = g.database_operations
+
+
+@views.after_app_request
+def remember_status(response):
+    if g.get("profile") is not None:
+        g.profile_status = response.status_code
+    return response
+
+
+@views.teardown_app_request
+def finish_profiling(exception=None):
+    active = g.pop("profile", None)
+    if active is None:
+        return
+    summary = profiler.finish(
+        active,
+        request.endpoint or "unmatched",
+        request.method,
+        request.path,
+        g.pop("profile_status", None),
+        g.pop("profile_operations", None),
+    )
+    logger.info(
+        f"Profiled {summary.endpoint} in {summary.wall_seconds:.3f}s: "
+        f"{summary.database_seconds:.3f}s database, "
+        f"{summary.python_seconds:.3f}s python, saved as {summary.name}"
+    )
+
+
+@views.teardown_app_request
+def log_database_operations(exception=None):
+    counts = g.pop("database_operations", None)
+    if counts is None:
+        return
+    controller.database.operations.stop(counts)
+    pool = controller.database.pool.stats()
+    logger.info(
+        f"{request.endpoint}: {counts.reads} database reads, "
+        f"{counts.writes} database writes, "
+        f"{pool.checked_out}/{pool.connections} connections checked out, "
+        f"{pool.waiters} waiting"
+    )
+
+
 @login_manager.user_loader
 def load_user(user_id: str):
     return controller.get_user_by_id(user_id)
 
 
-@app.route("/")
+@views.route("/")
 def root():
     return render_template("index.html")
 
 
-@app.route("/make_order", methods=["GET"])
+@views.route("/make_order", methods=["GET"])
 @login_required
 def create_order():
     return render_template("order.html")
 
 
-@app.route("/make_order/order", methods=["POST"])
+@views.route("/make_order/order", methods=["POST"])
 @login_required
 def send_order():
     received_data = request.form.to_dict()
     controller.create_order(current_user, received_data)
-    return redirect(url_for("show_orders"))
+    return redirect(url_for(".show_orders"))
+
 
+def customer_solution_job(job_id: str) -> Optional[dict]:
+    job = solution_workers.get_job(job_id)
+    if job is None or job["customer"] != str(current_user.id):
+        return None
+    return job
 
-@app.route("/solutions/<order_id>", methods=["GET"])
+
+@views.route("/solutions/<order_id>", methods=["GET"])
 @login_required
 def give_solutions(order_id):
-    controller.make_solutions_by_order_id(current_user, order_id)
+    job = None
+    if "job" in request.args:
+        job = customer_solution_job(request.args["job"])
+    if job is None or job["order"] != order_id:
+        job = solution_workers.submit(current_user, order_id)
+    if job["status"] in ACTIVE_SOLUTION_JOB_STATUSES:
+        return render_template(
+            "solutions.html", order_id=order_id, job=job, solutions=[]
+        )
     solutions = controller.extract_solutions_from_bd(order_id)
     if not solutions:
         flash(
@@ -65,83 +234,153 @@ def give_solutions(order_id):
     return render_template("solutions.html", order_id=order_id, solutions=solutions)
 
 
-@app.route("/solutions/<order_id>/<solution_id>", methods=["GET"])
+@views.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def solution_job_status(job_id):
+    job = customer_solution_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(
+        id=job["id"],
+        order=job["order"],
+        status=job["status"],
+        ready=job["status"] not in ACTIVE_SOLUTION_JOB_STATUSES,
+    )
+
+
+@views.route("/solutions/<order_id>/<solution_id>", methods=["GET"])
 @login_required
 def confirm_solution(order_id, solution_id):
-    controller.confirm_solution(current_user, order_id, solution_id)
-    return redirect(url_for("show_orders"))
+    try:
+        controller.confirm_solution(current_user, order_id, solution_id)
+    except SolutionNotFoundException:
+        flash("Решение устарело, выберите одно из актуальных")
+        return redirect(url_for(".give_solutions", order_id=order_id))
+    return redirect(url_for(".show_orders"))
 
 
-@app.route("/orders/<order_id>/agreement", methods=["GET"])
+@views.route("/orders/<order_id>/agreement", methods=["GET"])
 @login_required
 def show_agreement(order_id):
     agreement = controller.create_agreement(current_user, order_id)
     return render_template("agreement.html", order_id=order_id, agreement=agreement)
 
 
-@app.route("/orders/<order_id>/agreement/confirm", methods=["GET"])
+@views.route("/orders/<order_id>/agreement/confirm", methods=["GET"])
 @login_required
 def confirm_agreement(order_id):
     controller.confirm_agreement(current_user, order_id)
-    return redirect(url_for("show_orders"))
+    return redirect(url_for(".show_orders"))
 
 
-@app.route("/orders/<order_id>/payments", methods=["GET"])
+@views.route("/orders/<order_id>/payments", methods=["GET"])
 @login_required
 def show_payments(order_id):
     payments = controller.show_payments(current_user, order_id)
     return render_template("payments.html", order_id=order_id, payments=payments)
 
 
-@app.route("/orders/<order_id>/payments/confirm", methods=["GET"])
+@views.route("/orders/<order_id>/payments/confirm", methods=["GET"])
 @login_required
 def confirm_payments(order_id):
     controller.confirm_payments(current_user, order_id)
-    return redirect(url_for("show_orders"))
+    return redirect(url_for(".show_orders"))
 
 
-@app.route("/orders/<order_id>/done", methods=["GET"])
+@views.route("/orders/<order_id>/done", methods=["GET"])
 @login_required
 def close_order(order_id):
     controller.accomplish_order(current_user, order_id)
-    return redirect(url_for("show_orders"))
+    return redirect(url_for(".show_orders"))
+
 
+@views.app_errorhandler(PasswordHasherBusyException)
+def password_hasher_busy(exception):
+    return "Сервис перегружен, попробуйте войти позже", 503, {"Retry-After": "1"}
 
-@app.route("/login", methods=["GET", "POST"])
+
+@views.route("/login", methods=["GET", "POST"])
 def login_form():
     if request.method == "POST":
         try:
             customer = controller.login_user(request.form.to_dict())
             login_user(customer)
+        except PasswordHasherBusyException:
+            raise
         except Exception:
             flash("Аккаунта с такой почтой и паролем не существует")
-            return redirect(url_for("login_form"))
-        return redirect(url_for("root"))
+            return redirect(url_for(".login_form"))
+        return redirect(url_for(".root"))
     return render_template("login.html")
 
 
-@app.route("/signup", methods=["GET", "POST"])
+@views.route("/signup", methods=["GET", "POST"])
 def signup():
     if request.method == "POST":
         if not controller.sign_up_user(request.form.to_dict()):
             flash("Аккаунт с такой почтой или телефоном уже зарегистрирован")
-            return redirect(url_for("signup"))
+            return redirect(url_for(".signup"))
     return render_template("login.html")
 
 
-@app.route("/orders", methods=["GET"])
+@views.route("/orders", methods=["GET"])
 @login_required
 def show_orders():
-    orders = controller.get_orders_by_user(current_user)
-    return render_template("orders.html", orders=orders)
+    statuses = [
+        status.value
+        for status in OrderStatuses
+        if status.value in request.args.getlist("status")
+    ]
+    try:
+        page = controller.get_orders_by_user(
+            current_user, cursor=request.args.get("cursor"), statuses=statuses
+        )
+    except InvalidCursorException:
+        abort(400)
+    return stream_template(
+        "orders.html",
+        orders=page.orders,
+        next_cursor=page.next_cursor,
+        statuses=statuses,
+        order_statuses=list(OrderStatuses),
+    )
+
+
+@views.route("/metrics", methods=["GET"])
+def show_metrics():
+    if not metrics.token:
+        abort(404)
+    if not metrics.is_allowed(request.headers.get("Authorization")):
+        abort(401)
+    body, content_type = metrics.exposition()
+    return body, 200, {"Content-Type": content_type}
+
+
+def require_profile_access():
+    if not profiler.is_allowed(current_user.email):
+        abort(403)
+
+
+@views.route("/admin/profiles", methods=["GET"])
+@login_required
+def list_profiles():
+    require_profile_access()
+    return jsonify(profiles=profiler.summaries())
+
+
+@views.route("/admin/profiles/<name>", methods=["GET"])
+@login_required
+def download_profile(name):
+    require_profile_access()
+    return send_from_directory(profiler.directory, name, as_attachment=True)
 
 
-@app.route("/logout", methods=["GET"])
+@views.route("/logout", methods=["GET"])
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for("root"))
+    return redirect(url_for(".root"))
 
 
 def run():
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
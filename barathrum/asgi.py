@@ -0,0 +1,202 @@
+from functools import wraps
+from os import environ
+from os.path import dirname, join
+
+from dotenv import load_dotenv
+from flask_login import AnonymousUserMixin
+from quart import (
+    Quart,
+    abort,
+    flash,
+    g,
+    redirect,
+    render_template,
+    request,
+    session,
+    stream_template,
+    url_for,
+)
+
+from barathrum.controller.async_controller import AsyncController
+from barathrum.controller.controller import SolutionNotFoundException
+from barathrum.controller.db.motor import create_motor_base
+from barathrum.controller.db.pagination import InvalidCursorException
+from barathrum.controller.passwords import PasswordHasherBusyException
+from barathrum.models.entities import OrderStatuses
+
+app = Quart(__name__, template_folder="templates", static_folder="static")
+dotenv_path = join(dirname(__file__), "config.env")
+load_dotenv(dotenv_path)
+app.config["SECRET_KEY"] = environ.get("SECRET_KEY")
+controller = AsyncController(create_motor_base())
+
+
+@app.before_serving
+async def ensure_indexes():
+    await controller.database.ensure_indexes()
+
+
+@app.before_request
+async def load_current_user():
+    g.current_user = AnonymousUserMixin()
+    user_id = session.get("_user_id")
+    if user_id is not None:
+        customer = await controller.get_user_by_id(user_id)
+        if customer is not None:
+            g.current_user = customer
+
+
+@app.context_processor
+async def inject_current_user():
+    return {"current_user": g.current_user}
+
+
+def login_required(view):
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if not g.current_user.is_authenticated:
+            return redirect(url_for("login_form"))
+        return await view(*args, **kwargs)
+
+    return wrapper
+
+
+@app.route("/")
+async def root():
+    return await render_template("index.html")
+
+
+@app.route("/make_order", methods=["GET"])
+@login_required
+async def create_order():
+    return await render_template("order.html")
+
+
+@app.route("/make_order/order", methods=["POST"])
+@login_required
+async def send_order():
+    received_data = (await request.form).to_dict()
+    await controller.create_order(g.current_user, received_data)
+    return redirect(url_for("show_orders"))
+
+
+@app.route("/solutions/<order_id>", methods=["GET"])
+@login_required
+async def give_solutions(order_id):
+    await controller.make_solutions_by_order_id(g.current_user, order_id)
+    solutions = await controller.extract_solutions_from_bd(order_id)
+    if not solutions:
+        await flash(
+            "К сожалению, мы не смогли составить решения"
+            " из-за высокой нагрузки на систему"
+        )
+    return await render_template(
+        "solutions.html", order_id=order_id, solutions=solutions
+    )
+
+
+@app.route("/solutions/<order_id>/<solution_id>", methods=["GET"])
+@login_required
+async def confirm_solution(order_id, solution_id):
+    try:
+        await controller.confirm_solution(g.current_user, order_id, solution_id)
+    except SolutionNotFoundException:
+        await flash("Решение устарело, выберите одно из актуальных")
+        return redirect(url_for("give_solutions", order_id=order_id))
+    return redirect(url_for("show_orders"))
+
+
+@app.route("/orders/<order_id>/agreement", methods=["GET"])
+@login_required
+async def show_agreement(order_id):
+    agreement = await controller.create_agreement(g.current_user, order_id)
+    return await render_template(
+        "agreement.html", order_id=order_id, agreement=agreement
+    )
+
+
+@app.route("/orders/<order_id>/agreement/confirm", methods=["GET"])
+@login_required
+async def confirm_agreement(order_id):
+    await controller.confirm_agreement(g.current_user, order_id)
+    return redirect(url_for("show_orders"))
+
+
+@app.route("/orders/<order_id>/payments", methods=["GET"])
+@login_required
+async def show_payments(order_id):
+    payments = await controller.show_payments(g.current_user, order_id)
+    return await render_template("payments.html", order_id=order_id, payments=payments)
+
+
+@app.route("/orders/<order_id>/payments/confirm", methods=["GET"])
+@login_required
+async def confirm_payments(order_id):
+    await controller.confirm_payments(g.current_user, order_id)
+    return redirect(url_for("show_orders"))
+
+
+@app.route("/orders/<order_id>/done", methods=["GET"])
+@login_required
+async def close_order(order_id):
+    await controller.accomplish_order(g.current_user, order_id)
+    return redirect(url_for("show_orders"))
+
+
+@app.errorhandler(PasswordHasherBusyException)
+async def password_hasher_busy(exception):
+    return "Сервис перегружен, попробуйте войти позже", 503, {"Retry-After": "1"}
+
+
+@app.route("/login", methods=["GET", "POST"])
+async def login_form():
+    if request.method == "POST":
+        try:
+            customer = await controller.login_user((await request.form).to_dict())
+            session["_user_id"] = str(customer.id)
+        except PasswordHasherBusyException:
+            raise
+        except Exception:
+            await flash("Аккаунта с такой почтой и паролем не существует")
+            return redirect(url_for("login_form"))
+        return redirect(url_for("root"))
+    return await render_template("login.html")
+
+
+@app.route("/signup", methods=["GET", "POST"])
+async def signup():
+    if request.method == "POST":
+        if not await controller.sign_up_user((await request.form).to_dict()):
+            await flash("Аккаунт с такой почтой или телефоном уже зарегистрирован")
+            return redirect(url_for("signup"))
+    return await render_template("login.html")
+
+
+@app.route("/orders", methods=["GET"])
+@login_required
+async def show_orders():
+    statuses = [
+        status.value
+        for status in OrderStatuses
+        if status.value in request.args.getlist("status")
+    ]
+    try:
+        page = await controller.get_orders_by_user(
+            g.current_user, cursor=request.args.get("cursor"), statuses=statuses
+        )
+    except InvalidCursorException:
+        abort(400)
+    return await stream_template(
+        "orders.html",
+        orders=page.orders,
+        next_cursor=page.next_cursor,
+        statuses=statuses,
+        order_statuses=list(OrderStatuses),
+    )
+
+
+@app.route("/logout", methods=["GET"])
+@login_required
+async def logout():
+    session.pop("_user_id", None)
+    return redirect(url_for("root"))
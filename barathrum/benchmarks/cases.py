@@ -0,0 +1,139 @@
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from orjson import orjson
+
+from barathrum.controller.controller import Controller
+from barathrum.controller.scoring import DriverPool, ScoringEngine
+from barathrum.models.codec import from_trusted_document, to_document
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverQualification,
+    DriverStatuses,
+    Order,
+    OrderStatuses,
+)
+
+ORDER_DATA = {
+    "address_from": "Москва",
+    "address_to": "Тверь",
+    "cargo_type": "Обычный",
+    "height": "1",
+    "length": "2",
+    "weight": "100",
+    "width": "1",
+}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+
+
+def make_drivers(count: int) -> List[Driver]:
+    qualifications = list(DriverQualification)
+    randomizer = random.Random(count)
+    return [
+        Driver(
+            name="Пётр",
+            second_name="Петров",
+            qualification=randomizer.choice(qualifications),
+            experience=randomizer.randint(2, 60),
+            status=randomizer.choice(
+                [DriverStatuses.IS_WAITING, DriverStatuses.IS_CANDIDATE]
+            ),
+        )
+        for _ in range(count)
+    ]
+
+
+def make_orders(count: int) -> List[Order]:
+    orders = []
+    for driver in make_drivers(count):
+        order = Order(cargo=Cargo(**ORDER_DATA), **ORDER_DATA)
+        order.set_solution_params(driver, 1200.5, 12)
+        order.update_status(OrderStatuses.IN_PROGRESS)
+        order.update_status(OrderStatuses.READY)
+        orders.append(order)
+    return orders
+
+
+def make_customer(orders: List[Order]) -> Customer:
+    return Customer(
+        name="Иван",
+        second_name="Иванов",
+        email="kekus@mail.ru",
+        phone="88005553535",
+        password="$2b$04$" + "a" * 53,
+        orders=orders,
+    )
+
+
+def order_validated(size: int) -> Callable[[], object]:
+    documents = [to_document(order) for order in make_orders(size)]
+    return lambda: [Order(**document) for document in documents]
+
+
+def order_trusted(size: int) -> Callable[[], object]:
+    documents = [to_document(order) for order in make_orders(size)]
+    return lambda: [from_trusted_document(Order, document) for document in documents]
+
+
+def customer_validated(size: int) -> Callable[[], object]:
+    document = to_document(make_customer(make_orders(size)))
+    return lambda: Customer(**document)
+
+
+def customer_trusted(size: int) -> Callable[[], object]:
+    document = to_document(make_customer(make_orders(size)))
+    return lambda: from_trusted_document(Customer, document)
+
+
+def customer_json(size: int) -> Callable[[], object]:
+    customer = make_customer(make_orders(size))
+    return lambda: orjson.loads(customer.json())
+
+
+def customer_to_document(size: int) -> Callable[[], object]:
+    customer = make_customer(make_orders(size))
+    return lambda: to_document(customer)
+
+
+def calculate_cost(size: int) -> Callable[[], object]:
+    drivers = make_drivers(size)
+    cargo = Cargo(**ORDER_DATA)
+    return lambda: [Controller._calculate_cost(driver, cargo) for driver in drivers]
+
+
+def scoring_rank(size: int) -> Callable[[], object]:
+    pool = DriverPool.from_documents(
+        [to_document(driver) for driver in make_drivers(size)]
+    )
+    cargo = Cargo(**ORDER_DATA)
+    engine = ScoringEngine()
+    return lambda: engine.rank(pool, cargo)
+
+
+def get_expectation(size: int) -> Callable[[], object]:
+    orders = make_orders(size)
+    return lambda: [order.get_expectation() for order in orders]
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    benchmark.name: benchmark
+    for benchmark in (
+        Benchmark("order_validated", order_validated),
+        Benchmark("order_trusted", order_trusted),
+        Benchmark("customer_validated", customer_validated),
+        Benchmark("customer_trusted", customer_trusted),
+        Benchmark("customer_json", customer_json),
+        Benchmark("customer_to_document", customer_to_document),
+        Benchmark("calculate_cost", calculate_cost),
+        Benchmark("scoring_rank", scoring_rank),
+        Benchmark("get_expectation", get_expectation),
+    )
+}
@@ -0,0 +1,73 @@
+import logging
+import logging.config
+import os
+import sys
+from argparse import ArgumentParser
+
+from barathrum.benchmarks.cases import BENCHMARKS
+from barathrum.benchmarks.runner import (
+    compare_results,
+    format_results,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+from barathrum.config import LOGGING_CONFIG
+
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger("barathrum")
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Time model and controller hot paths")
+    parser.add_argument(
+        "--sizes",
+        default="10,100,1000",
+        help="comma separated data sizes, e.g. orders per customer",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=sorted(BENCHMARKS),
+        help="run only these benchmarks",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="seconds each timing round should last at least",
+    )
+    parser.add_argument("--save", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare the results with this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed relative slowdown against the baseline",
+    )
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    benchmarks = [BENCHMARKS[name] for name in args.only or sorted(BENCHMARKS)]
+    baseline = {}
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            # Без базового файла сравнивать не с чем: молча пропущенная
+            # проверка выглядела бы как отсутствие регрессий
+            parser.error(
+                f"baseline {args.baseline} does not exist, "
+                "save one with --save first"
+            )
+        baseline = load_results(args.baseline)
+    results = run_benchmarks(benchmarks, sizes, args.repeat, args.min_time)
+    print("\n".join(format_results(results, baseline)))
+    if args.save:
+        save_results(results, args.save)
+    regressions = compare_results(baseline, results, args.threshold)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import statistics
+import time
+import timeit
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List
+
+from barathrum.benchmarks.cases import Benchmark
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    best: float
+    median: float
+    calls: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}[{self.size}]"
+
+
+def calls_per_round(
+    timer: timeit.Timer, min_time: float, max_calls: int = 1_000_000
+) -> int:
+    calls = 1
+    while calls < max_calls and timer.timeit(calls) < min_time:
+        calls *= 2
+    return calls
+
+
+def measure(
+    name: str,
+    size: int,
+    function: Callable[[], object],
+    repeat: int = 5,
+    min_time: float = 0.05,
+    clock: Callable[[], float] = time.perf_counter,
+) -> BenchmarkResult:
+    timer = timeit.Timer(function, timer=clock)
+    calls = calls_per_round(timer, min_time)
+    rounds = [elapsed / calls for elapsed in timer.repeat(repeat, calls)]
+    return BenchmarkResult(name, size, min(rounds), statistics.median(rounds), calls)
+
+
+def run_benchmarks(
+    benchmarks: Iterable[Benchmark],
+    sizes: List[int],
+    repeat: int = 5,
+    min_time: float = 0.05,
+) -> List[BenchmarkResult]:
+    results = []
+    for benchmark in benchmarks:
+        for size in sizes:
+            function = benchmark.setup(size)
+            results.append(measure(benchmark.name, size, function, repeat, min_time))
+    return results
+
+
+def compare_results(
+    baseline: Dict[str, BenchmarkResult],
+    results: List[BenchmarkResult],
+    threshold: float,
+) -> List[str]:
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.key)
+        if expected is not None and result.best > expected.best * (1 + threshold):
+            regressions.append(
+                f"{result.key} {result.best * 1e6:.1f} us,"
+                f" baseline {expected.best * 1e6:.1f} us"
+                f" (+{(result.best / expected.best - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def format_results(
+    results: List[BenchmarkResult], baseline: Dict[str, BenchmarkResult]
+) -> List[str]:
+    lines = [f"{'benchmark':<32} {'best':>12} {'median':>12} {'baseline':>12}"]
+    for result in results:
+        expected = baseline.get(result.key)
+        reference = "-" if expected is None else f"{expected.best * 1e6:.1f} us"
+        lines.append(
+            f"{result.key:<32} {result.best * 1e6:>9.1f} us"
+            f" {result.median * 1e6:>9.1f} us {reference:>12}"
+        )
+    return lines
+
+
+def save_results(results: List[BenchmarkResult], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump([asdict(result) for result in results], file, indent=2)
+
+
+def load_results(path: str) -> Dict[str, BenchmarkResult]:
+    with open(path, encoding="utf-8") as file:
+        results = [BenchmarkResult(**result) for result in json.load(file)]
+    return {result.key: result for result in results}
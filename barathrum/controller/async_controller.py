@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from barathrum.controller.cache import UserCache
+from barathrum.controller.controller import (
+    OrdersPage,
+    SolutionNotFoundException,
+    SolutionStats,
+    WrongPasswordException,
+    build_solutions,
+    candidate_drivers,
+    solution_driver_ids,
+    solutions_are_fresh,
+    solutions_are_recent,
+)
+from barathrum.controller.db.motor import MotorBase
+from barathrum.controller.db.pagination import OrderCursor
+from barathrum.controller.db.storage import (
+    CustomerExistsException,
+    DriverIsBusyException,
+)
+from barathrum.controller.passwords import (
+    PasswordHasher,
+    PasswordHasherBusyException,
+    create_password_hasher,
+)
+from barathrum.controller.scoring import (
+    RankedDrivers,
+    ScoringEngine,
+    drivers_fingerprint,
+)
+from barathrum.models.codec import from_trusted_document
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    OrderStatuses,
+    Solution,
+)
+
+logger = logging.getLogger("barathrum")
+
+
+class AsyncController:
+    database: MotorBase
+    user_cache: UserCache
+    scoring_engine: ScoringEngine
+    password_hasher: PasswordHasher
+
+    def __init__(
+        self,
+        database: MotorBase,
+        user_cache: Optional[UserCache] = None,
+        scoring_engine: Optional[ScoringEngine] = None,
+        password_hasher: Optional[PasswordHasher] = None,
+    ):
+        self.database = database
+        if user_cache is None:
+            user_cache = UserCache(
+                max_size=int(os.environ.get("USER_CACHE_SIZE", 1024)),
+                ttl=float(os.environ.get("USER_CACHE_TTL", 60)),
+            )
+        self.user_cache = user_cache
+        if scoring_engine is None:
+            scoring_engine = ScoringEngine(k=int(os.environ.get("SOLUTIONS_LIMIT", 10)))
+        self.scoring_engine = scoring_engine
+        if password_hasher is None:
+            password_hasher = create_password_hasher()
+        self.password_hasher = password_hasher
+        self.solutions_ttl = float(os.environ.get("SOLUTIONS_TTL", 300))
+        self.solution_stats = SolutionStats()
+        self.orders_page_size = int(os.environ.get("ORDERS_PAGE_SIZE", 20))
+        self.database.change_listeners.append(self._on_database_change)
+
+    def _on_database_change(self, collection_name: str, entity_id: str) -> None:
+        if collection_name == Customer.__name__.lower():
+            self.user_cache.invalidate(entity_id)
+        elif collection_name == Order.__name__.lower():
+            self.user_cache.forget_orders(entity_id)
+
+    async def create_order(self, customer: Customer, data: dict) -> None:
+        cargo = Cargo(**data)
+        order = Order(cargo=cargo, **data)
+        order.update_status(OrderStatuses.WAIT_DECISION)
+        await self.database.upload_order_for_customer(customer, order)
+
+    async def make_solutions_by_order_id(
+        self, customer: Customer, order_id: str
+    ) -> bool:
+        existing = await self.database.get_solutions_by_order_id(order_id)
+        if await self._solutions_are_reusable(existing):
+            self.solution_stats.reused += 1
+            logger.info(
+                f"Reused solutions for order {order_id}, "
+                f"{self.solution_stats.reused} regenerations avoided"
+            )
+            return False
+        pool, order_db = await asyncio.gather(
+            self.database.get_vacant_driver_pool(),
+            self.database.get_order_by_id(customer, order_id),
+        )
+        order = from_trusted_document(Order, order_db)
+        self.solution_stats.generated += 1
+        ranked = self.scoring_engine.rank(pool, order.cargo)
+        solutions, new_candidates = await self._build_solutions(order, ranked)
+        async with self.database.unit_of_work() as uow:
+            if existing:
+                uow.delete_solutions_by_order(order)
+            if new_candidates:
+                logger.info(f"Setting {len(new_candidates)} drivers as candidates")
+                uow.update_drivers_status(new_candidates, DriverStatuses.IS_CANDIDATE)
+            if solutions:
+                uow.upload_solutions(solutions)
+            if solutions and order.status != OrderStatuses.WAIT_DECISION:
+                order.update_status(OrderStatuses.WAIT_DECISION)
+                uow.update_order_status(customer, order)
+        return True
+
+    async def _solutions_are_reusable(self, solutions: List[dict]) -> bool:
+        if not solutions_are_recent(solutions, self.solutions_ttl):
+            return False
+        drivers = await self.database.get_drivers_by_ids(solution_driver_ids(solutions))
+        return solutions_are_fresh(
+            solutions, drivers_fingerprint(drivers), self.solutions_ttl
+        )
+
+    async def _build_solutions(
+        self, order: Order, ranked: RankedDrivers
+    ) -> Tuple[List[Solution], List[Driver]]:
+        if not ranked.ids:
+            logger.info("Did not find any drivers")
+            return [], []
+        drivers = await self.database.get_drivers_by_ids(ranked.ids)
+        new_candidates = candidate_drivers(drivers)
+        return build_solutions(order, drivers, ranked), new_candidates
+
+    async def extract_solutions_from_bd(self, order_id: str) -> List[dict]:
+        return await self.database.get_solutions_by_order_id(order_id)
+
+    async def sign_up_user(self, data: dict) -> bool:
+        data["password"] = await self.password_hasher.hash_async(data["password"])
+        customer = Customer(**data)
+        try:
+            await self.database.upload_customer(customer)
+        except CustomerExistsException:
+            logger.info(f"User with {customer} already exists")
+            return False
+        logger.info(f"User {customer} does not exists in db")
+        return True
+
+    async def login_user(self, data: dict) -> Customer:
+        customer = await self.database.get_customer_by_email(data["email"])
+        if customer is not None and await self.password_hasher.verify_async(
+            data["password"], customer.password
+        ):
+            logger.info(f"{customer} is authenticated")
+            customer = await self._rehash_password(customer, data["password"])
+            self.user_cache.put(str(customer.id), customer)
+            return customer
+        raise WrongPasswordException
+
+    async def _rehash_password(self, customer: Customer, password: str) -> Customer:
+        if not self.password_hasher.needs_rehash(customer.password):
+            return customer
+        try:
+            hashed = await self.password_hasher.hash_async(password)
+        except PasswordHasherBusyException:
+            logger.info(f"Postponed password rehash for {customer}")
+            return customer
+        # Транзакций у MotorBase нет, поэтому хеш пишется условным обновлением:
+        # если пока считался bcrypt пароль сменили, запись ничего не изменит
+        if not await self.database.replace_customer_password(customer, hashed):
+            return customer
+        logger.info(f"Rehashed password for {customer}")
+        return customer.copy(update={"password": hashed})
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Customer]:
+        customer = self.user_cache.get(user_id)
+        if customer is not None:
+            return customer
+        customer = await self.database.get_customer_by_id(user_id)
+        if customer is not None:
+            self.user_cache.put(user_id, customer)
+        return customer
+
+    async def get_orders_by_user(
+        self,
+        customer: Customer,
+        cursor: Optional[str] = None,
+        statuses: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+    ) -> OrdersPage:
+        orders_db, next_cursor = await self.database.get_orders_page(
+            customer,
+            limit or self.orders_page_size,
+            OrderCursor.decode(cursor) if cursor else None,
+            statuses,
+        )
+        return OrdersPage(
+            orders=[from_trusted_document(Order, order) for order in orders_db],
+            next_cursor=next_cursor.encode() if next_cursor else None,
+        )
+
+    async def confirm_solution(
+        self, customer: Customer, order_id: str, solution_id: str
+    ) -> None:
+        order_db, solution_bd = await asyncio.gather(
+            self.database.get_order_by_id(customer, order_id),
+            self.database.get_solution_by_id(solution_id),
+        )
+        if solution_bd is None or solution_bd.pop("order") != order_id:
+            raise SolutionNotFoundException
+        # Водителя могли занять решением другого заказа
+        drivers = await self.database.get_drivers_by_ids([solution_bd["driver"]["id"]])
+        if not drivers or drivers[0].status == DriverStatuses.IS_BUSY:
+            raise SolutionNotFoundException
+        order = from_trusted_document(Order, order_db)
+        solution = from_trusted_document(Solution, {**solution_bd, "order": order})
+        order.set_solution_params(
+            driver=solution.driver, cost=solution.cost, time=solution.time
+        )
+        order.update_status(OrderStatuses.WAIT_CONTRACT_SIGNING)
+        order.driver.update_status(DriverStatuses.IS_BUSY)
+        try:
+            async with self.database.unit_of_work() as uow:
+                uow.book_driver(order.driver)
+                uow.update_order_status(customer, order)
+                uow.update_order_solution_params(customer, order)
+                uow.delete_solutions_by_order(order)
+        except DriverIsBusyException as e:
+            raise SolutionNotFoundException from e
+        logger.info(f"{customer} confirmed {solution}")
+
+    async def create_agreement(self, customer: Customer, order_id: str) -> str:
+        order = from_trusted_document(
+            Order, await self.database.get_order_by_id(customer, order_id)
+        )
+        return (
+            f"Я, {customer.name} "
+            f"{customer.middle_name} "
+            f"{customer.second_name}, "
+            f"согласен с условиями {order.id}"
+        )
+
+    async def confirm_agreement(self, customer: Customer, order_id: str) -> None:
+        order = from_trusted_document(
+            Order, await self.database.get_order_by_id(customer, order_id)
+        )
+        order.update_status(OrderStatuses.WAIT_PAYMENTS)
+        await self.database.update_order_status(customer, order)
+
+    async def show_payments(self, customer: Customer, order_id: str) -> str:
+        order = from_trusted_document(
+            Order, await self.database.get_order_by_id(customer, order_id)
+        )
+        return f"Оплатить заказ с номером {order.id} за {order.cost} рублей?"
+
+    async def confirm_payments(self, customer: Customer, order_id: str) -> None:
+        order = from_trusted_document(
+            Order, await self.database.get_order_by_id(customer, order_id)
+        )
+        order.update_status(OrderStatuses.IN_PROGRESS)
+        async with self.database.unit_of_work() as uow:
+            uow.update_order_status(customer, order)
+            uow.update_order_expected_date(customer, order)
+
+    async def accomplish_order(self, customer: Customer, order_id: str) -> None:
+        order = from_trusted_document(
+            Order, await self.database.get_order_by_id(customer, order_id)
+        )
+        order.update_status(OrderStatuses.READY)
+        order.driver.update_status(DriverStatuses.IS_WAITING)
+        async with self.database.unit_of_work() as uow:
+            uow.update_order_status(customer, order)
+            uow.update_ready_date(customer, order)
+            uow.update_driver_status(order.driver)
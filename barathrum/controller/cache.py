@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Optional, Tuple
+
+from barathrum.models.entities import Customer
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+
+class UserCache:
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, Tuple[float, Customer]] = OrderedDict()
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Optional[Customer]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            expires_at, customer = entry
+            if expires_at <= self.clock():
+                del self._entries[user_id]
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._stats.hits += 1
+            return customer
+
+    def put(self, user_id: str, customer: Customer) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (self.clock() + self.ttl, customer)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._stats.invalidations += 1
+
+    def forget_orders(self, user_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and "orders" in entry[1].__dict__:
+                del self._entries[user_id]
+                self._stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return replace(self._stats, size=len(self._entries))
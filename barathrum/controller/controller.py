@@ -1,10 +1,32 @@
 import logging
+import logging.config
+import os
 from barathrum.config import LOGGING_CONFIG
-from typing import List
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
 
-from bcrypt import checkpw, gensalt, hashpw
-
-from barathrum.controller.db.mongo import CustomerExistsException, MongoBase
+from barathrum.controller.cache import UserCache
+from barathrum.controller.db.pagination import OrderCursor
+from barathrum.controller.db.storage import (
+    CustomerExistsException,
+    DriverIsBusyException,
+    Storage,
+)
+from barathrum.controller.passwords import (
+    PasswordHasher,
+    PasswordHasherBusyException,
+    create_password_hasher,
+)
+from barathrum.controller.scoring import (
+    BASE_COST,
+    CARGO_BASE,
+    QUALIFICATION_BASE,
+    RankedDrivers,
+    ScoringEngine,
+    drivers_fingerprint,
+)
+from barathrum.models.codec import from_trusted_document
 from barathrum.models.entities import (
     Cargo,
     Customer,
@@ -16,29 +38,117 @@ from barathrum.models.entities import (
 )
 
 logging.config.dictConfig(LOGGING_CONFIG)
-logger = logging.getLogger('barathrum')
+logger = logging.getLogger("barathrum")
 
 
 class WrongPasswordException(Exception):
     pass
 
 
+class SolutionNotFoundException(Exception):
+    pass
+
+
+@dataclass
+class OrdersPage:
+    orders: List[Order]
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class SolutionStats:
+    generated: int = 0
+    reused: int = 0
+
+
+def solutions_are_recent(solutions: List[dict], ttl: float) -> bool:
+    if not solutions:
+        return False
+    oldest = datetime.now() - timedelta(seconds=ttl)
+    return all(
+        datetime.fromisoformat(solution["created_at"]) > oldest
+        for solution in solutions
+    )
+
+
+def solutions_are_fresh(solutions: List[dict], fingerprint: str, ttl: float) -> bool:
+    return solutions_are_recent(solutions, ttl) and all(
+        solution.get("pool_fingerprint") == fingerprint for solution in solutions
+    )
+
+
+def solution_driver_ids(solutions: List[dict]) -> List[str]:
+    return [solution["driver"]["id"] for solution in solutions]
+
+
+def candidate_drivers(drivers: List[Driver]) -> List[Driver]:
+    new_candidates = []
+    for driver in drivers:
+        if driver.status != DriverStatuses.IS_CANDIDATE:
+            driver.update_status(DriverStatuses.IS_CANDIDATE)
+            new_candidates.append(driver)
+    return new_candidates
+
+
+def build_solutions(
+    order: Order, drivers: List[Driver], ranked: RankedDrivers
+) -> List[Solution]:
+    costs = dict(zip(ranked.ids, ranked.costs))
+    fingerprint = drivers_fingerprint(drivers)
+    return [
+        Solution(
+            order=order,
+            driver=driver,
+            cost=costs[str(driver.id)],
+            pool_fingerprint=fingerprint,
+        )
+        for driver in drivers
+    ]
+
+
 class Controller:
-    database: MongoBase
+    database: Storage
+    user_cache: UserCache
+    scoring_engine: ScoringEngine
+    password_hasher: PasswordHasher
 
-    def __init__(self, database: MongoBase):
+    def __init__(
+        self,
+        database: Storage,
+        user_cache: Optional[UserCache] = None,
+        scoring_engine: Optional[ScoringEngine] = None,
+        password_hasher: Optional[PasswordHasher] = None,
+    ):
         self.database = database
+        if user_cache is None:
+            user_cache = UserCache(
+                max_size=int(os.environ.get("USER_CACHE_SIZE", 1024)),
+                ttl=float(os.environ.get("USER_CACHE_TTL", 60)),
+            )
+        self.user_cache = user_cache
+        if scoring_engine is None:
+            scoring_engine = ScoringEngine(k=int(os.environ.get("SOLUTIONS_LIMIT", 10)))
+        self.scoring_engine = scoring_engine
+        if password_hasher is None:
+            password_hasher = create_password_hasher()
+        self.password_hasher = password_hasher
+        self.solutions_ttl = float(os.environ.get("SOLUTIONS_TTL", 300))
+        self.solution_stats = SolutionStats()
+        self.orders_page_size = int(os.environ.get("ORDERS_PAGE_SIZE", 20))
+        self.database.change_listeners.append(self._on_database_change)
+
+    def _on_database_change(self, collection_name: str, entity_id: str) -> None:
+        if collection_name == Customer.__name__.lower():
+            self.user_cache.invalidate(entity_id)
+        elif collection_name == Order.__name__.lower():
+            self.user_cache.forget_orders(entity_id)
 
     @staticmethod
     def _calculate_cost(driver: Driver, cargo: Cargo) -> float:
-        base_cost = 400
-        qualification_base = 300
-        cargo_base = 300
-        logger.info("Calculated driver cost with ")
         cost = (
-            base_cost
-            + qualification_base * driver.get_qualification_rate()
-            + cargo_base * cargo.get_cargo_type_rate()
+            BASE_COST
+            + QUALIFICATION_BASE * driver.get_qualification_rate()
+            + CARGO_BASE * cargo.get_cargo_type_rate()
         )
         return cost
 
@@ -48,36 +158,63 @@ class Controller:
         order.update_status(OrderStatuses.WAIT_DECISION)
         self.database.upload_order_for_customer(customer, order)
 
-    def make_solutions_by_order_id(self, customer: Customer, order_id: str) -> None:
-        drivers = self.database.get_vacant_drivers()
-        order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
-        solutions = []
-        if not drivers:
-            logger.info("Did not find any drivers")
-            return
-        for driver in drivers:
-            solutions.append(
-                Solution(
-                    order=order,
-                    driver=driver,
-                    cost=self._calculate_cost(driver, order.cargo),
+    def make_solutions_by_order_id(self, customer: Customer, order_id: str) -> bool:
+        with self.database.transaction():
+            existing = self.database.get_solutions_by_order_id(order_id)
+            if self._solutions_are_reusable(existing):
+                self.solution_stats.reused += 1
+                logger.info(
+                    f"Reused solutions for order {order_id}, "
+                    f"{self.solution_stats.reused} regenerations avoided"
                 )
-            )
-            if driver.status != DriverStatuses.IS_CANDIDATE:
-                logger.info(f"Setting driver with id={driver.id} as candidate")
-                driver.update_status(DriverStatuses.IS_CANDIDATE)
-                self.database.update_driver_status(driver)
-        self.database.upload_solutions(solutions)
-        order.update_status(OrderStatuses.WAIT_DECISION)
-        self.database.update_order_status(customer, order)
+                return False
+            pool = self.database.get_vacant_driver_pool()
+            order_db = self.database.get_order_by_id(customer, order_id)
+            order = from_trusted_document(Order, order_db)
+            self.solution_stats.generated += 1
+            ranked = self.scoring_engine.rank(pool, order.cargo)
+            solutions, new_candidates = self._build_solutions(order, ranked)
+            with self.database.unit_of_work() as uow:
+                if existing:
+                    uow.delete_solutions_by_order(order)
+                if new_candidates:
+                    logger.info(f"Setting {len(new_candidates)} drivers as candidates")
+                    uow.update_drivers_status(
+                        new_candidates, DriverStatuses.IS_CANDIDATE
+                    )
+                if solutions:
+                    uow.upload_solutions(solutions)
+                if solutions and order.status != OrderStatuses.WAIT_DECISION:
+                    order.update_status(OrderStatuses.WAIT_DECISION)
+                    uow.update_order_status(customer, order)
+        return True
+
+    def _solutions_are_reusable(self, solutions: List[dict]) -> bool:
+        # Решения устаревают, только когда меняется кто-то из их водителей,
+        # поэтому весь пул свободных водителей для проверки не читаем
+        if not solutions_are_recent(solutions, self.solutions_ttl):
+            return False
+        drivers = self.database.get_drivers_by_ids(solution_driver_ids(solutions))
+        return solutions_are_fresh(
+            solutions, drivers_fingerprint(drivers), self.solutions_ttl
+        )
+
+    def _build_solutions(
+        self, order: Order, ranked: RankedDrivers
+    ) -> Tuple[List[Solution], List[Driver]]:
+        if not ranked.ids:
+            logger.info("Did not find any drivers")
+            return [], []
+        drivers = self.database.get_drivers_by_ids(ranked.ids)
+        new_candidates = candidate_drivers(drivers)
+        return build_solutions(order, drivers, ranked), new_candidates
 
     def extract_solutions_from_bd(self, order_id: str) -> List[dict]:
         solutions = self.database.get_solutions_by_order_id(order_id)
         return solutions
 
     def sign_up_user(self, data: dict) -> bool:
-        data["password"] = hashpw(data["password"].encode("utf-8"), gensalt())
+        data["password"] = self.password_hasher.hash(data["password"])
         customer = Customer(**data)
         try:
             self.database.upload_customer(customer)
@@ -89,48 +226,99 @@ class Controller:
 
     def login_user(self, data: dict) -> Customer:
         customer = self.database.get_customer_by_email(data["email"])
-        if checkpw(
-            data["password"].encode("utf-8"), customer.password.encode("utf-8")
-        ):
+        if customer is None:
+            raise WrongPasswordException
+        if self.password_hasher.verify(data["password"], customer.password):
             logger.info(f"{customer} is authenticated")
+            customer = self._rehash_password(customer, data["password"])
+            self.user_cache.put(str(customer.id), customer)
             return customer
         raise WrongPasswordException
 
+    def _rehash_password(self, customer: Customer, password: str) -> Customer:
+        if not self.password_hasher.needs_rehash(customer.password):
+            return customer
+        try:
+            hashed = self.password_hasher.hash(password)
+        except PasswordHasherBusyException:
+            logger.info(f"Postponed password rehash for {customer}")
+            return customer
+        with self.database.transaction():
+            # Пока считался bcrypt, пароль могли сменить: тогда новый хеш не пишем
+            current = self.database.get_customer_by_id(str(customer.id))
+            if current is None or current.password != customer.password:
+                return customer
+            self.database.update_entity(customer, "password", hashed)
+        logger.info(f"Rehashed password for {customer}")
+        return customer.copy(update={"password": hashed})
+
     def get_user_by_id(self, user_id: str) -> Customer:
+        customer = self.user_cache.get(user_id)
+        if customer is not None:
+            return customer
         customer = self.database.get_customer_by_id(user_id)
         logger.info(f"Found user {customer}")
+        if customer is not None:
+            self.user_cache.put(user_id, customer)
         return customer
 
-    def get_orders_by_user(self, customer: Customer) -> List[Order]:
+    def get_orders_by_user(
+        self,
+        customer: Customer,
+        cursor: Optional[str] = None,
+        statuses: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+    ) -> OrdersPage:
+        orders_db, next_cursor = self.database.get_orders_page(
+            customer,
+            limit or self.orders_page_size,
+            OrderCursor.decode(cursor) if cursor else None,
+            statuses,
+        )
         orders = []
-        orders_db = self.database.get_orders_by_customer(customer)
         for order in orders_db:
             logger.info(f"Found order {order} for customer {customer}")
-            orders.append(Order(**order))
-        return orders
+            orders.append(from_trusted_document(Order, order))
+        return OrdersPage(
+            orders=orders, next_cursor=next_cursor.encode() if next_cursor else None
+        )
 
     def confirm_solution(
         self, customer: Customer, order_id: str, solution_id: str
     ) -> None:
-        order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
-        solution_bd = self.database.get_solution_by_id(solution_id)
-        solution_bd.pop("order")
-        solution = Solution(order=order, **solution_bd)
-        order.set_solution_params(
-            driver=solution.driver, cost=solution.cost, time=solution.time
-        )
-        order.update_status(OrderStatuses.WAIT_CONTRACT_SIGNING)
-        order.driver.update_status(DriverStatuses.IS_BUSY)
-        self.database.update_driver_status(order.driver)
-        self.database.update_order_status(customer, order)
-        self.database.update_order_solution_params(customer, order)
-        self.database.delete_solutions_by_order(order)
+        with self.database.transaction():
+            solution_bd = self._available_solution(order_id, solution_id)
+            order_db = self.database.get_order_by_id(customer, order_id)
+            order = from_trusted_document(Order, order_db)
+            solution = from_trusted_document(Solution, {**solution_bd, "order": order})
+            order.set_solution_params(
+                driver=solution.driver, cost=solution.cost, time=solution.time
+            )
+            order.update_status(OrderStatuses.WAIT_CONTRACT_SIGNING)
+            order.driver.update_status(DriverStatuses.IS_BUSY)
+            try:
+                with self.database.unit_of_work() as uow:
+                    uow.book_driver(order.driver)
+                    uow.update_order_status(customer, order)
+                    uow.update_order_solution_params(customer, order)
+                    uow.delete_solutions_by_order(order)
+            except DriverIsBusyException as e:
+                raise SolutionNotFoundException from e
         logger.info(f"{customer} confirmed {solution}")
 
+    def _available_solution(self, order_id: str, solution_id: str) -> dict:
+        solution_bd = self.database.get_solution_by_id(solution_id)
+        if solution_bd is None or solution_bd.pop("order") != order_id:
+            raise SolutionNotFoundException
+        # Водителя могли занять решением другого заказа
+        drivers = self.database.get_drivers_by_ids([solution_bd["driver"]["id"]])
+        if not drivers or drivers[0].status == DriverStatuses.IS_BUSY:
+            raise SolutionNotFoundException
+        return solution_bd
+
     def create_agreement(self, customer: Customer, order_id: str) -> str:
         order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
+        order = from_trusted_document(Order, order_db)
         agreement_text = (
             f"Я, {customer.name} "
             f"{customer.middle_name} "
@@ -141,29 +329,34 @@ class Controller:
         return agreement_text
 
     def confirm_agreement(self, customer: Customer, order_id: str) -> None:
-        order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
-        order.update_status(OrderStatuses.WAIT_PAYMENTS)
-        self.database.update_order_status(customer, order)
+        with self.database.transaction():
+            order_db = self.database.get_order_by_id(customer, order_id)
+            order = from_trusted_document(Order, order_db)
+            order.update_status(OrderStatuses.WAIT_PAYMENTS)
+            self.database.update_order_status(customer, order)
         logger.info(f"{customer} confirmed agreement order_id={order_id}")
 
     def show_payments(self, customer: Customer, order_id: str) -> str:
         order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
+        order = from_trusted_document(Order, order_db)
         return f"Оплатить заказ с номером {order.id} за {order.cost} рублей?"
 
     def confirm_payments(self, customer: Customer, order_id: str) -> None:
-        order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
-        order.update_status(OrderStatuses.IN_PROGRESS)
-        self.database.update_order_status(customer, order)
-        self.database.update_order_expected_date(customer, order)
+        with self.database.transaction():
+            order_db = self.database.get_order_by_id(customer, order_id)
+            order = from_trusted_document(Order, order_db)
+            order.update_status(OrderStatuses.IN_PROGRESS)
+            with self.database.unit_of_work() as uow:
+                uow.update_order_status(customer, order)
+                uow.update_order_expected_date(customer, order)
 
     def accomplish_order(self, customer: Customer, order_id: str) -> None:
-        order_db = self.database.get_order_by_id(customer, order_id)
-        order = Order(**order_db)
-        order.update_status(OrderStatuses.READY)
-        order.driver.update_status(DriverStatuses.IS_WAITING)
-        self.database.update_order_status(customer, order)
-        self.database.update_ready_date(customer, order)
-        self.database.update_driver_status(order.driver)
+        with self.database.transaction():
+            order_db = self.database.get_order_by_id(customer, order_id)
+            order = from_trusted_document(Order, order_db)
+            order.update_status(OrderStatuses.READY)
+            order.driver.update_status(DriverStatuses.IS_WAITING)
+            with self.database.unit_of_work() as uow:
+                uow.update_order_status(customer, order)
+                uow.update_ready_date(customer, order)
+                uow.update_driver_status(order.driver)
@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Callable, Generic, Optional, TypeVar
+
+from pymongo import monitoring
+
+Client = TypeVar("Client")
+
+COMPRESSORS = ("zstd", "snappy", "zlib")
+
+_CLIENT_OPTIONS = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "serverSelectionTimeoutMS": ("MONGO_SERVER_SELECTION_TIMEOUT_MS", int),
+    "connectTimeoutMS": ("MONGO_CONNECT_TIMEOUT_MS", int),
+}
+
+
+def mongo_compressors(value: str) -> Optional[str]:
+    compressors = [
+        compressor.strip()
+        for compressor in value.split(",")
+        if compressor.strip() in COMPRESSORS
+    ]
+    return ",".join(compressors) or None
+
+
+def mongo_client_options() -> dict:
+    options = {}
+    for option, (variable, parse) in _CLIENT_OPTIONS.items():
+        value = os.environ.get(variable)
+        if value:
+            options[option] = parse(value)
+    compressors = mongo_compressors(os.environ.get("MONGO_COMPRESSORS", ""))
+    if compressors is not None:
+        options["compressors"] = compressors
+    return options
+
+
+@dataclass
+class PoolStats:
+    connections: int
+    checked_out: int
+    waiters: int
+    checkouts: int
+    failed_checkouts: int
+    average_wait: float
+    max_wait: float
+    clears: int
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._connections = 0
+            self._checked_out = 0
+            self._waiters = 0
+            self._checkouts = 0
+            self._failed_checkouts = 0
+            self._wait_seconds = 0.0
+            self._max_wait = 0.0
+            self._clears = 0
+
+    def _finish_wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return 0.0 if started is None else self._clock() - started
+
+    def connection_check_out_started(self, event):
+        self._local.started = self._clock()
+        with self._lock:
+            self._waiters += 1
+
+    def connection_checked_out(self, event):
+        wait = self._finish_wait()
+        with self._lock:
+            self._waiters = max(self._waiters - 1, 0)
+            self._checked_out += 1
+            self._checkouts += 1
+            self._wait_seconds += wait
+            self._max_wait = max(self._max_wait, wait)
+
+    def connection_check_out_failed(self, event):
+        wait = self._finish_wait()
+        with self._lock:
+            self._waiters = max(self._waiters - 1, 0)
+            self._failed_checkouts += 1
+            self._wait_seconds += wait
+            self._max_wait = max(self._max_wait, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._checked_out = max(self._checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._connections = max(self._connections - 1, 0)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            attempts = self._checkouts + self._failed_checkouts
+            return PoolStats(
+                connections=self._connections,
+                checked_out=self._checked_out,
+                waiters=self._waiters,
+                checkouts=self._checkouts,
+                failed_checkouts=self._failed_checkouts,
+                average_wait=self._wait_seconds / attempts if attempts else 0.0,
+                max_wait=self._max_wait,
+                clears=self._clears,
+            )
+
+
+_process_local_clients: "weakref.WeakSet[ProcessLocalClient]" = weakref.WeakSet()
+
+
+class ProcessLocalClient(Generic[Client]):
+    def __init__(
+        self,
+        factory: Callable[[], Client],
+        on_connect: Optional[Callable[[], None]] = None,
+    ):
+        self._factory = factory
+        self._on_connect = on_connect
+        self._lock = threading.Lock()
+        self._client: Optional[Client] = None
+        self._pid: Optional[int] = None
+        _process_local_clients.add(self)
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None and self._pid == os.getpid()
+
+    def get(self) -> Client:
+        if self.connected:
+            return self._client
+        with self._lock:
+            if self.connected:
+                return self._client
+            self._client = self._factory()
+            self._pid = os.getpid()
+        if self._on_connect is not None:
+            self._on_connect()
+        return self._client
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+
+
+def _reset_clients_after_fork() -> None:
+    for client in list(_process_local_clients):
+        client.after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients_after_fork)
@@ -0,0 +1,155 @@
+import logging
+import logging.config
+import sys
+from argparse import ArgumentParser
+from datetime import datetime
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+from pymongo import monitoring
+
+from barathrum.config import LOGGING_CONFIG
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.db.mongo_orders import create_mongo_base
+from barathrum.controller.db.pagination import OrderCursor
+from barathrum.models.entities import (
+    Customer,
+    Driver,
+    DriverQualification,
+    DriverStatuses,
+)
+
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger("barathrum")
+
+# Встроенные заказы можно посчитать по статусам только развернув всех клиентов
+EXPECTED_SCANS = {("count_orders_by_status", Customer.__name__.lower())}
+EXPLAINABLE_COMMANDS = {
+    "find": ("filter", "sort", "projection", "limit"),
+    "aggregate": ("pipeline", "cursor"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.commands: List[dict] = []
+
+    def started(self, event):
+        fields = EXPLAINABLE_COMMANDS.get(event.command_name)
+        if fields is None:
+            return
+        command = {event.command_name: event.command[event.command_name]}
+        for field in fields:
+            if field in event.command:
+                command[field] = event.command[field]
+        self.commands.append(command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def query_methods(database: MongoBase) -> Dict[str, Callable[[], object]]:
+    customer = Customer(name="", second_name="", email="", phone="", password="")
+    driver = Driver(
+        name="", second_name="", qualification=DriverQualification.LOW, experience=2
+    )
+    missing_id = str(uuid4())
+    return {
+        "get_customer_by_id": lambda: database.get_customer_by_id(missing_id),
+        "get_customer_by_email": lambda: database.get_customer_by_email(missing_id),
+        "get_customer_by_phone": lambda: database.get_customer_by_phone(missing_id),
+        "get_order_by_id": lambda: database.get_order_by_id(customer, missing_id),
+        "get_orders_page": lambda: database.get_orders_page(
+            customer, 10, OrderCursor(created_at="", id=missing_id), ["status"]
+        ),
+        "update_order_fields": lambda: database.update_order_fields(
+            customer, missing_id, {"status": ""}
+        ),
+        "get_vacant_drivers": database.get_vacant_drivers,
+        "get_vacant_driver_pool": database.get_vacant_driver_pool,
+        "get_drivers_by_ids": lambda: database.get_drivers_by_ids([missing_id]),
+        "get_driver_by_id": lambda: database.get_driver_by_id(missing_id),
+        "update_drivers_status": lambda: database.update_drivers_status(
+            [driver], DriverStatuses.IS_CANDIDATE
+        ),
+        "get_solutions_by_order_id": lambda: database.get_solutions_by_order_id(
+            missing_id
+        ),
+        "get_solution_by_id": lambda: database.get_solution_by_id(missing_id),
+        "get_solution_job": lambda: database.get_solution_job(missing_id),
+        "requeue_stale_solution_jobs": lambda: database.requeue_stale_solution_jobs(
+            datetime.min
+        ),
+        "count_drivers_by_status": database.count_drivers_by_status,
+        "count_orders_by_status": database.count_orders_by_status,
+    }
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+def winning_plans(explanation: dict) -> List[dict]:
+    if "queryPlanner" in explanation:
+        return [explanation["queryPlanner"]["winningPlan"]]
+    return [
+        stage["$cursor"]["queryPlanner"]["winningPlan"]
+        for stage in explanation.get("stages", [])
+        if "$cursor" in stage
+    ]
+
+
+def find_collection_scans(database: MongoBase, recorder: CommandRecorder) -> dict:
+    scans = {}
+    for name, method in query_methods(database).items():
+        recorder.commands.clear()
+        method()
+        for command in list(recorder.commands):
+            explanation = database.client[database.DATABASE_NAME].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            stages = [
+                stage
+                for plan in winning_plans(explanation)
+                for stage in _plan_stages(plan)
+            ]
+            logger.info(f"{name}: {command} -> {stages}")
+            collection = next(iter(command.values()))
+            if "COLLSCAN" in stages and (name, collection) not in EXPECTED_SCANS:
+                scans.setdefault(name, []).append(command)
+    return scans
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Explain every MongoBase query and fail on collection scans"
+    )
+    parser.add_argument(
+        "--no-ensure",
+        action="store_true",
+        help="do not create missing indexes before checking",
+    )
+    args = parser.parse_args()
+    recorder = CommandRecorder()
+    database = create_mongo_base(event_listeners=[recorder])
+    if not args.no_ensure:
+        database.ensure_indexes()
+    scans = find_collection_scans(database, recorder)
+    for name, commands in scans.items():
+        logger.error(f"{name} does a collection scan: {commands}")
+    sys.exit(1 if scans else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from typing import Dict, Optional, Tuple
+
+Projection = Optional[Tuple[Tuple[str, int], ...]]
+
+
+def projection_key(projection: Optional[dict]) -> Projection:
+    if projection is None:
+        return None
+    return tuple(sorted(projection.items()))
+
+
+def covers(stored: Projection, requested: Projection) -> bool:
+    if stored is None or stored == requested:
+        return True
+    if requested is None:
+        return False
+    stored_fields = {field: value for field, value in stored if field != "_id"}
+    requested_fields = {field: value for field, value in requested if field != "_id"}
+    if any(value not in (0, 1) for value in requested_fields.values()):
+        return False
+    if any(value not in (0, 1) for value in stored_fields.values()):
+        return False
+    stored_included = all(stored_fields.values())
+    requested_included = all(requested_fields.values())
+    if stored_included:
+        return requested_included and requested_fields.keys() <= stored_fields.keys()
+    if requested_included:
+        return not requested_fields.keys() & stored_fields.keys()
+    return stored_fields.keys() <= requested_fields.keys()
+
+
+class IdentityMap:
+    def __init__(self):
+        self.documents: Dict[Tuple[str, str, str], Dict[Projection, dict]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        collection_name: str,
+        field: str,
+        value: str,
+        projection: Optional[dict] = None,
+    ) -> Optional[dict]:
+        requested = projection_key(projection)
+        projections = self.documents.get((collection_name, field, value), {})
+        document = projections.get(requested)
+        if document is None:
+            document = next(
+                (
+                    stored_document
+                    for stored, stored_document in projections.items()
+                    if covers(stored, requested)
+                ),
+                None,
+            )
+        if document is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return document
+
+    def add(
+        self,
+        collection_name: str,
+        field: str,
+        value: str,
+        document: dict,
+        projection: Optional[dict] = None,
+    ):
+        self.documents.setdefault((collection_name, field, value), {})[
+            projection_key(projection)
+        ] = document
+
+    def forget(self, collection_name: str, entity_id: str) -> None:
+        self.documents = {
+            key: projections
+            for key, projections in self.documents.items()
+            if key[0] != collection_name
+            or all(document.get("id") != entity_id for document in projections.values())
+        }
+
+    def clear(self) -> None:
+        self.documents = {}
@@ -0,0 +1,155 @@
+import logging
+from typing import Any, Dict, Generator, List, Tuple
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+from barathrum.models.entities import (
+    Customer,
+    Driver,
+    Order,
+    Solution,
+    SolutionJob,
+)
+
+logger = logging.getLogger("barathrum")
+
+INDEX_CONFLICT_CODES = {85, 86}
+
+
+def _index(*fields: str, **options) -> IndexModel:
+    return IndexModel(
+        [(field, ASCENDING) for field in fields], background=True, **options
+    )
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    Customer.__name__.lower(): [
+        _index("id", unique=True),
+        _index("email", unique=True),
+        _index("phone", unique=True),
+    ],
+    Driver.__name__.lower(): [
+        _index("id", unique=True),
+        _index("status"),
+    ],
+    Solution.__name__.lower(): [
+        _index("id", unique=True),
+        _index("order"),
+    ],
+    Order.__name__.lower(): [
+        _index("id", unique=True, sparse=True),
+        _index("customer_id", "created_at", "id"),
+        _index("status"),
+    ],
+    SolutionJob.__name__.lower(): [
+        _index("id", unique=True),
+        _index("status", "created_at"),
+        _index("order", "status"),
+        # Одна активная задача на заказ. `$in` в partialFilterExpression
+        # поддерживается только с MongoDB 6.0, поэтому активные задачи помечены полем
+        _index("order", unique=True, partialFilterExpression={"active": True}),
+    ],
+    "migration": [
+        _index("id", unique=True),
+    ],
+}
+
+
+def conflicting_indexes(
+    indexes: List[IndexModel], existing: Dict[str, dict]
+) -> List[str]:
+    conflicting = []
+    for index in indexes:
+        document = index.document
+        current = existing.get(document["name"])
+        if current is None:
+            continue
+        options = {
+            option: value
+            for option, value in document.items()
+            if option not in ("key", "name", "background")
+        }
+        if any(current.get(option) != value for option, value in options.items()):
+            conflicting.append(document["name"])
+    return conflicting
+
+
+def duplicates_pipeline(index: IndexModel) -> List[dict]:
+    document = index.document
+    fields = [field for field, _ in document["key"].items()]
+    pipeline = [
+        {
+            "$group": {
+                "_id": {field.replace(".", "_"): f"${field}" for field in fields},
+                "count": {"$sum": 1},
+            }
+        },
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1},
+    ]
+    if "partialFilterExpression" in document:
+        pipeline.insert(0, {"$match": document["partialFilterExpression"]})
+    return pipeline
+
+
+def index_options(information: dict) -> dict:
+    return {
+        option: value
+        for option, value in information.items()
+        if option not in ("key", "v", "ns")
+    }
+
+
+def replacement_steps(
+    collection_name: str, indexes: List[IndexModel], existing: Dict[str, dict]
+) -> Generator[Tuple[str, Any], Any, List[str]]:
+    # План замены индексов без ввода-вывода: шаги выполняют синхронный
+    # replace_indexes и MotorBase, ответ каждого шага возвращается через send
+    kept = []
+    for index in indexes:
+        name = index.document["name"]
+        if name not in conflicting_indexes([index], existing):
+            continue
+        if index.document.get("unique") and (
+            yield "aggregate",
+            duplicates_pipeline(index),
+        ):
+            logger.error(
+                f"Keeping index {collection_name}.{name}: "
+                "duplicate values prevent a unique rebuild"
+            )
+            kept.append(index)
+            continue
+        logger.info(f"Rebuilding index {collection_name}.{name}")
+        yield "drop_index", name
+        try:
+            yield "create_indexes", [index]
+        except OperationFailure:
+            # Дубликат мог появиться уже после проверки: возвращаем старый индекс,
+            # чтобы запросы по этому полю не остались без индекса
+            current = existing[name]
+            yield "create_indexes", [
+                IndexModel(current["key"], name=name, **index_options(current))
+            ]
+            raise
+    return (yield "create_indexes", [index for index in indexes if index not in kept])
+
+
+def replace_indexes(collection: Collection, indexes: List[IndexModel]) -> List[str]:
+    steps = replacement_steps(collection.name, indexes, collection.index_information())
+    reply, error = None, None
+    while True:
+        try:
+            command, argument = steps.throw(error) if error else steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if command == "aggregate":
+                reply = list(collection.aggregate(argument))
+            else:
+                reply = getattr(collection, command)(argument)
+            error = None
+        except OperationFailure as e:
+            reply, error = None, e
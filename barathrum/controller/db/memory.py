@@ -0,0 +1,483 @@
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from barathrum.controller.db.client import PoolMonitor
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.memory_jobs import MemorySolutionJobQueue
+from barathrum.controller.db.memory_tables import (
+    CUSTOMERS,
+    DRIVERS,
+    ORDERS,
+    SOLUTION_JOBS,
+    SOLUTIONS,
+    HashIndex,
+    Table,
+    copy_document,
+    delete_result,
+    includes,
+    project,
+    update_result,
+)
+from barathrum.controller.db.operations import OperationCounter
+from barathrum.controller.db.pagination import OrderCursor, split_page
+from barathrum.controller.db.storage import (
+    CUSTOMER_PROJECTION,
+    VACANT_DRIVER_STATUSES,
+    CustomerExistsException,
+    DriverIsBusyException,
+)
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.controller.scoring import DriverPool
+from barathrum.models.codec import (
+    from_trusted_document,
+    solution_to_document,
+    to_document,
+    to_documents,
+)
+from barathrum.models.entities import (
+    BaseModel,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    Solution,
+)
+
+
+class MemoryBase(MemorySolutionJobQueue):
+    def __init__(self):
+        self.operations = OperationCounter()
+        self.pool = PoolMonitor()
+        self.identity_map_provider: Callable[[], Optional[IdentityMap]] = lambda: None
+        self.change_listeners: List[Callable[[str, str], None]] = []
+        self._lock = threading.RLock()
+        self.tables = {
+            CUSTOMERS: Table(
+                CUSTOMERS,
+                HashIndex("email", unique=True),
+                HashIndex("phone", unique=True),
+            ),
+            ORDERS: Table(ORDERS, HashIndex("customer_id"), HashIndex("status")),
+            DRIVERS: Table(DRIVERS, HashIndex("status")),
+            SOLUTIONS: Table(SOLUTIONS, HashIndex("order")),
+            SOLUTION_JOBS: Table(
+                SOLUTION_JOBS, HashIndex("order"), HashIndex("status")
+            ),
+        }
+        self._customer_orders: Dict[str, List[Tuple[str, str]]] = {}
+
+    def _read(self) -> None:
+        self.operations.count("find")
+
+    def _write(self, command_name: str = "update") -> None:
+        self.operations.count(command_name)
+
+    def _forget(self, collection_name: str, entity_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(collection_name, entity_id)
+
+    def _forget_orders(self, customer_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(Order.__name__.lower(), customer_id)
+
+    def unit_of_work(self) -> UnitOfWork:
+        return UnitOfWork(self)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def flush_unit_of_work(self, uow: UnitOfWork) -> None:
+        with self._lock:
+            self.book_drivers(uow.booked_drivers)
+            for driver_id, status in uow.driver_statuses.items():
+                self.tables[DRIVERS].update(driver_id, {"status": status})
+            for (customer_id, order_id), fields in uow.order_fields.items():
+                self._update_order(customer_id, order_id, fields)
+            for order_id in uow.deleted_solution_orders:
+                self._delete_solutions(order_id)
+            for solution in uow.inserted_solutions:
+                self.tables[SOLUTIONS].insert(solution_to_document(solution))
+            self._write()
+        for customer_id, _ in uow.order_fields:
+            self._forget_orders(customer_id)
+
+    def book_drivers(self, driver_ids: List[str]) -> None:
+        busy = DriverStatuses.IS_BUSY.value
+        for driver_id in driver_ids:
+            driver = self.tables[DRIVERS].get(driver_id)
+            if driver is None or driver["status"] == busy:
+                raise DriverIsBusyException(driver_id)
+        for driver_id in driver_ids:
+            self.tables[DRIVERS].update(driver_id, {"status": busy})
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        return {name: list(table.indexes) for name, table in self.tables.items()}
+
+    def _insert_order(self, customer_id: str, order: dict) -> None:
+        order_db = {**order, "customer_id": customer_id}
+        self.tables[ORDERS].insert(order_db)
+        bisect.insort(
+            self._customer_orders.setdefault(customer_id, []),
+            (order_db["created_at"], order_db["id"]),
+        )
+
+    def _delete_customer_orders(self, customer_id: str) -> int:
+        orders = self._customer_orders.pop(customer_id, [])
+        for _, order_id in orders:
+            self.tables[ORDERS].delete(order_id)
+        return len(orders)
+
+    def _insert(self, collection_name: str, document: dict) -> None:
+        if collection_name == CUSTOMERS:
+            orders = document.pop("orders", None) or []
+            self.tables[CUSTOMERS].insert(document)
+            for order in orders:
+                self._insert_order(document["id"], order)
+        else:
+            self.tables[collection_name].insert(document)
+
+    def upload_entity(self, entity: BaseModel) -> InsertOneResult:
+        document = to_document(entity)
+        collection_name = entity.__class__.__name__.lower()
+        with self._lock:
+            self._insert(collection_name, document)
+        self._write("insert")
+        self._forget(collection_name, document["id"])
+        return InsertOneResult(document["id"], True)
+
+    def upload_entities(self, entities: List[BaseModel]) -> InsertManyResult:
+        documents = [solution_to_document(entity) for entity in entities]
+        collection_name = entities[0].__class__.__name__.lower()
+        with self._lock:
+            for document in documents:
+                self._insert(collection_name, document)
+        self._write("insert")
+        return InsertManyResult([document["id"] for document in documents], True)
+
+    def delete_entity(self, entity: BaseModel) -> DeleteResult:
+        entity_id = str(entity.id)
+        collection_name = entity.__class__.__name__.lower()
+        with self._lock:
+            if collection_name == ORDERS:
+                deleted = self._delete_order(entity_id)
+            else:
+                deleted = self.tables[collection_name].delete(entity_id)
+            if collection_name == CUSTOMERS and deleted is not None:
+                self._delete_customer_orders(entity_id)
+        self._write("delete")
+        self._forget(collection_name, entity_id)
+        return delete_result(0 if deleted is None else 1)
+
+    def _delete_order(self, order_id: str) -> Optional[dict]:
+        order = self.tables[ORDERS].delete(order_id)
+        if order is not None:
+            orders = self._customer_orders.get(order.get("customer_id"), [])
+            key = (order["created_at"], order_id)
+            position = bisect.bisect_left(orders, key)
+            if position < len(orders) and orders[position] == key:
+                del orders[position]
+        return order
+
+    def _result(
+        self, collection_name: str, document: dict, projection: Optional[dict] = None
+    ) -> dict:
+        if collection_name == CUSTOMERS and includes(projection, "orders"):
+            document = {**document, "orders": self._orders(document["id"])}
+        result = project(document, projection)
+        if collection_name == ORDERS:
+            result.pop("customer_id", None)
+        return result
+
+    def get_one_result_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> dict:
+        collection_name = entity.__name__.lower()
+        self._read()
+        with self._lock:
+            documents = self.tables[collection_name].find(field, f"{value}")
+            if not documents:
+                return None
+            return self._result(collection_name, documents[0], projection)
+
+    def get_results_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> List[dict]:
+        collection_name = entity.__name__.lower()
+        self._read()
+        with self._lock:
+            return [
+                self._result(collection_name, document, projection)
+                for document in self.tables[collection_name].find(field, f"{value}")
+            ]
+
+    def update_entity(
+        self, entity: BaseModel, field: str, value: Union[str, float, int, List]
+    ) -> UpdateResult:
+        collection_name = entity.__class__.__name__.lower()
+        entity_id = str(entity.id)
+        with self._lock:
+            if collection_name == CUSTOMERS and field == "orders":
+                matched = self._replace_orders(entity_id, value)
+            else:
+                matched = self.tables[collection_name].update(
+                    entity_id, {field: copy_document(value)}
+                )
+        self._write()
+        self._forget(collection_name, entity_id)
+        return update_result(int(matched))
+
+    def _replace_orders(self, customer_id: str, orders: List[dict]) -> bool:
+        if self.tables[CUSTOMERS].get(customer_id) is None:
+            return False
+        self._delete_customer_orders(customer_id)
+        for order in orders:
+            self._insert_order(customer_id, copy_document(order))
+        return True
+
+    def _update_order(self, customer_id: str, order_id: str, fields: dict) -> bool:
+        order = self.tables[ORDERS].get(order_id)
+        if order is None or order["customer_id"] != customer_id:
+            return False
+        return self.tables[ORDERS].update(order_id, copy_document(fields))
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        with self._lock:
+            matched = self._update_order(str(customer.id), order_id, fields)
+        self._write()
+        self._forget_orders(str(customer.id))
+        return update_result(int(matched))
+
+    def upload_order_for_customer(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        customer_id = str(customer.id)
+        with self._lock:
+            matched = self.tables[CUSTOMERS].get(customer_id) is not None
+            if matched:
+                self._insert_order(customer_id, to_document(order))
+        self._write()
+        self._forget_orders(customer_id)
+        return update_result(int(matched))
+
+    def upload_orders_for_customer(
+        self, customer: Customer, orders: List[Order]
+    ) -> UpdateResult:
+        return self.update_entity(customer, "orders", to_documents(orders))
+
+    def upload_orders_for_customer_json(
+        self, customer: Customer, orders: List
+    ) -> UpdateResult:
+        return self.update_entity(customer, "orders", orders)
+
+    def delete_order(self, order: Order) -> DeleteResult:
+        return self.delete_entity(order)
+
+    def _orders(self, customer_id: str) -> List[dict]:
+        orders = self.tables[ORDERS]
+        return [
+            self._result(ORDERS, orders.get(order_id))
+            for _, order_id in self._customer_orders.get(customer_id, [])
+        ]
+
+    def get_order_by_id(self, customer: Customer, order_id: str) -> Union[dict, None]:
+        self._read()
+        with self._lock:
+            order = self.tables[ORDERS].get(order_id)
+            if order is None or order["customer_id"] != str(customer.id):
+                return None
+            return self._result(ORDERS, order)
+
+    def get_orders_by_customer(self, customer) -> List[dict]:
+        self._read()
+        with self._lock:
+            return self._orders(str(customer.id))
+
+    def get_orders_page(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[OrderCursor]]:
+        self._read()
+        with self._lock:
+            keys = self._customer_orders.get(str(customer.id), [])
+            end = (
+                len(keys)
+                if cursor is None
+                else bisect.bisect_left(keys, cursor.sort_key())
+            )
+            page = []
+            for _, order_id in reversed(keys[:end]):
+                order = self.tables[ORDERS].get(order_id)
+                if statuses and order["status"] not in statuses:
+                    continue
+                page.append(self._result(ORDERS, order))
+                if len(page) > limit:
+                    break
+        return split_page(page, limit)
+
+    def _customer_from_document(self, result: Optional[dict]) -> Optional[Customer]:
+        if result is None:
+            return None
+        customer = from_trusted_document(Customer, result)
+        customer.defer_orders(
+            lambda: [
+                from_trusted_document(Order, order)
+                for order in self.get_orders_by_customer(customer)
+            ]
+        )
+        return customer
+
+    def upload_customer(self, customer: Customer) -> InsertOneResult:
+        try:
+            return self.upload_entity(customer)
+        except DuplicateKeyError as e:
+            raise CustomerExistsException from e
+
+    def get_customer_by_email(self, email: str) -> Union[Customer, None]:
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "email", email, CUSTOMER_PROJECTION)
+        )
+
+    def get_customer_by_phone(self, phone: str) -> Union[Customer, None]:
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "phone", phone, CUSTOMER_PROJECTION)
+        )
+
+    def delete_customer(self, customer: Customer) -> DeleteResult:
+        return self.delete_entity(customer)
+
+    def get_customer_by_id(self, user_id: str):
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "id", user_id, CUSTOMER_PROJECTION)
+        )
+
+    def update_order_status(self, customer: Customer, order: Order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"status": order.status.value}
+        )
+
+    def _vacant_driver_documents(self, limit: Optional[int] = None) -> List[dict]:
+        drivers = self.tables[DRIVERS]
+        documents = []
+        for status in VACANT_DRIVER_STATUSES:
+            documents += drivers.find("status", status)
+        return documents[:limit]
+
+    def get_vacant_drivers(self) -> List[Driver]:
+        self._read()
+        with self._lock:
+            documents = self._vacant_driver_documents(10)
+            return [from_trusted_document(Driver, document) for document in documents]
+
+    def get_vacant_driver_pool(self) -> DriverPool:
+        self._read()
+        with self._lock:
+            return DriverPool.from_documents(self._vacant_driver_documents())
+
+    def get_drivers_by_ids(self, driver_ids: List[str]) -> List[Driver]:
+        self._read()
+        with self._lock:
+            documents = [
+                self.tables[DRIVERS].get(driver_id) for driver_id in driver_ids
+            ]
+            return [
+                from_trusted_document(Driver, copy_document(document))
+                for document in documents
+                if document is not None
+            ]
+
+    def upload_solutions(self, solutions: List[Solution]) -> InsertManyResult:
+        return self.upload_entities(solutions)
+
+    def update_driver_status(self, driver: Driver) -> UpdateResult:
+        return self.update_entity(driver, "status", driver.status.value)
+
+    def update_drivers_status(
+        self, drivers: List[Driver], status: DriverStatuses
+    ) -> UpdateResult:
+        with self._lock:
+            matched = sum(
+                self.tables[DRIVERS].update(str(driver.id), {"status": status.value})
+                for driver in drivers
+            )
+        self._write()
+        return update_result(matched)
+
+    def get_solutions_by_order_id(self, order_id: str) -> List[dict]:
+        return self.get_results_by_field(Solution, "order", order_id)
+
+    def get_solution_by_id(self, solution_id: str) -> dict:
+        return self.get_one_result_by_field(Solution, "id", solution_id)
+
+    def get_driver_by_id(self, driver_id: str) -> dict:
+        return self.get_one_result_by_field(Driver, "id", driver_id)
+
+    def update_order_solution_params(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        return self.update_order_fields(
+            customer,
+            str(order.id),
+            {
+                "driver": to_document(order.driver),
+                "cost": order.cost,
+                "time": order.time,
+            },
+        )
+
+    def _delete_solutions(self, order_id: str) -> int:
+        solutions = self.tables[SOLUTIONS]
+        deleted = solutions.find("order", order_id)
+        for solution in deleted:
+            solutions.delete(solution["id"])
+        return len(deleted)
+
+    def delete_solutions_by_order(self, order: Order) -> DeleteResult:
+        with self._lock:
+            deleted = self._delete_solutions(str(order.id))
+        self._write("delete")
+        return delete_result(deleted)
+
+    def update_order_expected_date(self, customer, order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"expected_date": order.expected_date}
+        )
+
+    def update_ready_date(self, customer, order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"ready_date": order.ready_date}
+        )
+
+    def count_drivers_by_status(self) -> Dict[str, int]:
+        self._read()
+        with self._lock:
+            return self.tables[DRIVERS].indexes["status"].counts()
+
+    def count_orders_by_status(self) -> Dict[str, int]:
+        self._read()
+        with self._lock:
+            return self.tables[ORDERS].indexes["status"].counts()
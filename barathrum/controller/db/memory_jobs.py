@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from pymongo.results import UpdateResult
+
+from barathrum.controller.db.memory_tables import (
+    SOLUTION_JOBS,
+    copy_document,
+    update_result,
+)
+from barathrum.controller.db.storage import ACTIVE_SOLUTION_JOB_STATUSES
+from barathrum.models.codec import to_document
+from barathrum.models.entities import Customer, SolutionJob, SolutionJobStatuses
+
+
+class MemorySolutionJobQueue:
+    def _jobs_with_statuses(self, statuses: Iterable[str]) -> List[dict]:
+        jobs = self.tables[SOLUTION_JOBS]
+        return [job for status in statuses for job in jobs.find("status", status)]
+
+    def enqueue_solution_job(self, customer: Customer, order_id: str) -> dict:
+        self._write("findAndModify")
+        with self._lock:
+            jobs = self.tables[SOLUTION_JOBS]
+            for job in jobs.find("order", order_id):
+                if job["status"] in ACTIVE_SOLUTION_JOB_STATUSES:
+                    return copy_document(job)
+            job = to_document(SolutionJob(order=order_id, customer=str(customer.id)))
+            jobs.insert(job)
+            return copy_document(job)
+
+    def claim_solution_job(self, worker: str) -> Optional[dict]:
+        self._write("findAndModify")
+        with self._lock:
+            pending = self._jobs_with_statuses([SolutionJobStatuses.PENDING.value])
+            if not pending:
+                return None
+            job = min(pending, key=lambda document: document["created_at"])
+            self.tables[SOLUTION_JOBS].update(
+                job["id"],
+                {
+                    "status": SolutionJobStatuses.RUNNING.value,
+                    "started_at": datetime.now().isoformat(),
+                    "worker": worker,
+                },
+            )
+            return copy_document(job)
+
+    def finish_solution_job(
+        self, job_id: str, status: SolutionJobStatuses, error: Optional[str] = None
+    ) -> UpdateResult:
+        with self._lock:
+            matched = self.tables[SOLUTION_JOBS].update(
+                job_id,
+                {
+                    "status": status.value,
+                    "finished_at": datetime.now().isoformat(),
+                    "error": error,
+                },
+            )
+        self._write()
+        return update_result(int(matched))
+
+    def requeue_stale_solution_jobs(self, started_before: datetime) -> UpdateResult:
+        with self._lock:
+            stale = [
+                job
+                for job in self._jobs_with_statuses([SolutionJobStatuses.RUNNING.value])
+                if job["started_at"] < started_before.isoformat()
+            ]
+            for job in stale:
+                self.tables[SOLUTION_JOBS].update(
+                    job["id"],
+                    {
+                        "status": SolutionJobStatuses.PENDING.value,
+                        "started_at": None,
+                        "worker": None,
+                    },
+                )
+        self._write()
+        return update_result(len(stale))
+
+    def get_solution_job(self, job_id: str) -> Optional[dict]:
+        return self.get_one_result_by_field(SolutionJob, "id", job_id)
+
+    def count_solution_jobs(self, status: SolutionJobStatuses) -> int:
+        self._read()
+        with self._lock:
+            return self.tables[SOLUTION_JOBS].indexes["status"].count(status.value)
@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import DeleteResult, UpdateResult
+
+from barathrum.models.entities import Customer, Driver, Order, Solution, SolutionJob
+
+CUSTOMERS = Customer.__name__.lower()
+ORDERS = Order.__name__.lower()
+DRIVERS = Driver.__name__.lower()
+SOLUTIONS = Solution.__name__.lower()
+SOLUTION_JOBS = SolutionJob.__name__.lower()
+
+
+def copy_document(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+    return value
+
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    return {
+        field: copy_document(value)
+        for field, value in document.items()
+        if includes(projection, field)
+    }
+
+
+def includes(projection: Optional[dict], field: str) -> bool:
+    if not projection:
+        return True
+    if any(value for name, value in projection.items() if name != "_id"):
+        return bool(projection.get(field))
+    return field not in projection
+
+
+def update_result(matched: int) -> UpdateResult:
+    return UpdateResult({"n": matched, "nModified": matched, "ok": 1.0}, True)
+
+
+def delete_result(deleted: int) -> DeleteResult:
+    return DeleteResult({"n": deleted, "ok": 1.0}, True)
+
+
+class HashIndex:
+    def __init__(self, field: str, unique: bool = False):
+        self.field = field
+        self.unique = unique
+        self._ids: Dict[Any, Dict[str, None]] = {}
+
+    def ids(self, value: Any) -> List[str]:
+        return list(self._ids.get(value, ()))
+
+    def count(self, value: Any) -> int:
+        return len(self._ids.get(value, ()))
+
+    def counts(self) -> Dict[Any, int]:
+        return {value: len(ids) for value, ids in self._ids.items() if ids}
+
+    def conflicts(self, document: dict) -> bool:
+        value = document.get(self.field)
+        return (
+            self.unique
+            and value is not None
+            and any(key != document["id"] for key in self._ids.get(value, ()))
+        )
+
+    def add(self, document: dict) -> None:
+        self._ids.setdefault(document.get(self.field), {})[document["id"]] = None
+
+    def remove(self, document: dict) -> None:
+        value = document.get(self.field)
+        ids = self._ids.get(value)
+        if ids is not None:
+            ids.pop(document["id"], None)
+            if not ids:
+                del self._ids[value]
+
+
+class Table:
+    def __init__(self, name: str, *indexes: HashIndex):
+        self.name = name
+        self.documents: Dict[str, dict] = {}
+        self.indexes = {index.field: index for index in indexes}
+
+    def get(self, document_id: str) -> Optional[dict]:
+        return self.documents.get(document_id)
+
+    def find(self, field: str, value: Any) -> List[dict]:
+        if field == "id":
+            document = self.documents.get(value)
+            return [] if document is None else [document]
+        index = self.indexes.get(field)
+        if index is not None:
+            return [self.documents[document_id] for document_id in index.ids(value)]
+        return [
+            document
+            for document in self.documents.values()
+            if document.get(field) == value
+        ]
+
+    def insert(self, document: dict) -> None:
+        if document["id"] in self.documents:
+            raise DuplicateKeyError(f"{self.name}.id {document['id']} exists")
+        for index in self.indexes.values():
+            if index.conflicts(document):
+                raise DuplicateKeyError(
+                    f"{self.name}.{index.field} {document[index.field]} exists"
+                )
+        self.documents[document["id"]] = document
+        for index in self.indexes.values():
+            index.add(document)
+
+    def update(self, document_id: str, fields: dict) -> bool:
+        document = self.documents.get(document_id)
+        if document is None:
+            return False
+        changed = [index for field, index in self.indexes.items() if field in fields]
+        updated = {**document, **fields}
+        for index in changed:
+            if index.conflicts(updated):
+                raise DuplicateKeyError(
+                    f"{self.name}.{index.field} {updated[index.field]} exists"
+                )
+        for index in changed:
+            index.remove(document)
+        document.update(fields)
+        for index in changed:
+            index.add(document)
+        return True
+
+    def delete(self, document_id: str) -> Optional[dict]:
+        document = self.documents.pop(document_id, None)
+        if document is not None:
+            for index in self.indexes.values():
+                index.remove(document)
+        return document
@@ -0,0 +1,32 @@
+import logging
+import logging.config
+from argparse import ArgumentParser
+
+from barathrum.config import LOGGING_CONFIG
+from barathrum.controller.db.mongo_orders import OrderCollectionMongoBase
+
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger("barathrum")
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Move embedded customer orders into the order collection"
+    )
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore the saved checkpoint and rescan all customers",
+    )
+    args = parser.parse_args()
+    database = OrderCollectionMongoBase()
+    database.ensure_indexes()
+    migrated = database.migrate_embedded_orders(
+        batch_size=args.batch_size, restart=args.restart
+    )
+    logger.info(f"Migration finished, moved {migrated} orders")
+
+
+if __name__ == "__main__":
+    main()
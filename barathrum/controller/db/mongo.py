@@ -1,11 +1,13 @@
+import logging
 import os
+from contextlib import contextmanager
 from os.path import dirname, join
-from typing import List, Type, Union
+from threading import Thread
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
 
 from dotenv import load_dotenv
-from orjson import orjson
-from pymongo import MongoClient
-from pymongo.errors import OperationFailure
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
 from pymongo.results import (
     DeleteResult,
     InsertManyResult,
@@ -13,54 +15,185 @@ from pymongo.results import (
     UpdateResult,
 )
 
-from barathrum.models.entities import (
-    BaseModel,
-    Customer,
-    Driver,
-    DriverStatuses,
-    Order,
-    Solution,
+from barathrum.controller.db.client import (
+    PoolMonitor,
+    ProcessLocalClient,
+    mongo_client_options,
 )
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.indexes import (
+    INDEX_CONFLICT_CODES,
+    INDEXES,
+    replace_indexes,
+)
+from barathrum.controller.db.mongo_drivers import MongoDriverStore
+from barathrum.controller.db.mongo_jobs import MongoSolutionJobQueue
+from barathrum.controller.db.mongo_requests import (
+    embedded_order_update_requests,
+    find_order,
+    unit_of_work_requests,
+)
+from barathrum.controller.db.operations import OperationCounter
+from barathrum.controller.db.pagination import (
+    OrderCursor,
+    embedded_orders_pipeline,
+    split_page,
+)
+from barathrum.controller.db.storage import CUSTOMER_PROJECTION, CustomerExistsException
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.models.codec import (
+    from_trusted_document,
+    solution_to_document,
+    to_document,
+    to_documents,
+)
+from barathrum.models.entities import BaseModel, Customer, Order
 
 dotenv_path = join(dirname(__file__), "envs.env")
 load_dotenv(dotenv_path)
+logger = logging.getLogger("barathrum")
 
 
 # TODO: Надо сделать операции с БД транзакционными
 
+CUSTOMER_ORDERS_PROJECTION = {"_id": 0, "id": 1, "orders": 1}
+ORDERS_STORAGE_EMBEDDED = "embedded"
+ORDERS_STORAGE_COLLECTION = "collection"
 
-class CustomerExistsException(Exception):
-    pass
 
+def mongo_uri() -> str:
+    return (
+        f"mongodb://{os.environ.get('MONGO_USER')}:"
+        f"{os.environ.get('MONGO_PASSWORD')}"
+        f"@{os.environ.get('MONGO_HOST', 'barathrum')}:"
+        f"{os.environ.get('MONGO_PORT', '27017')}/"
+    )
 
-class MongoBase:
-    client: MongoClient
 
+class MongoBase(MongoDriverStore, MongoSolutionJobQueue):
     DATABASE_NAME = "barathrum"
 
-    def __init__(self):
-        self.client = MongoClient(
-            f"mongodb://{os.environ.get('MONGO_USER')}:"
-            f"{os.environ.get('MONGO_PASSWORD')}"
-            f"@{os.environ.get('MONGO_HOST', 'barathrum')}:27017/"
+    def __init__(
+        self,
+        transactions: bool = False,
+        ensure_indexes: bool = False,
+        **client_options,
+    ):
+        self.operations = OperationCounter()
+        self.pool = PoolMonitor()
+        self.transactions = transactions
+        self.identity_map_provider: Callable[[], Optional[IdentityMap]] = lambda: None
+        self.change_listeners: List[Callable[[str, str], None]] = []
+        self.client_options = {
+            **mongo_client_options(),
+            **client_options,
+            "event_listeners": [
+                self.operations,
+                self.pool,
+                *client_options.get("event_listeners", []),
+            ],
+        }
+        self._client = ProcessLocalClient(
+            self._connect,
+            self.ensure_indexes_in_background if ensure_indexes else None,
         )
 
+    def _connect(self) -> MongoClient:
+        self.pool.reset()
+        return MongoClient(mongo_uri(), **self.client_options)
+
+    @property
+    def client(self) -> MongoClient:
+        return self._client.get()
+
+    def unit_of_work(self) -> UnitOfWork:
+        return UnitOfWork(self)
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        # Чтения MongoBase не привязаны к сессии, поэтому переход заказа защищён
+        # только тем, что все его записи уходят одним UnitOfWork
+        yield
+
+    def _forget(self, collection_name: str, entity_id: str) -> None:
+        identity_map = self.identity_map_provider()
+        if identity_map is not None:
+            identity_map.forget(collection_name, entity_id)
+        for listener in self.change_listeners:
+            listener(collection_name, entity_id)
+
+    def _forget_orders(self, customer_id: str) -> None:
+        identity_map = self.identity_map_provider()
+        if identity_map is not None:
+            identity_map.forget(Customer.__name__.lower(), customer_id)
+        for listener in self.change_listeners:
+            listener(Order.__name__.lower(), customer_id)
+
+    def _order_update_requests(
+        self, customer_id: str, order_id: str, fields: dict
+    ) -> List[Tuple[str, UpdateOne]]:
+        return embedded_order_update_requests(customer_id, order_id, fields)
+
+    def flush_unit_of_work(self, uow: UnitOfWork) -> None:
+        requests = unit_of_work_requests(uow, self._order_update_requests)
+        for customer_id, _ in uow.order_fields:
+            self._forget_orders(customer_id)
+
+        def write(session=None):
+            self.book_drivers(uow.booked_drivers, session=session)
+            for collection_name, collection_requests in requests.items():
+                self.client[self.DATABASE_NAME][collection_name].bulk_write(
+                    collection_requests, session=session
+                )
+
+        try:
+            if self.transactions:
+                with self.client.start_session() as session:
+                    session.with_transaction(write)
+            else:
+                write()
+        except OperationFailure as e:
+            raise e
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        created = {}
+        for collection_name, indexes in INDEXES.items():
+            collection = self.client[self.DATABASE_NAME][collection_name]
+            try:
+                created[collection_name] = collection.create_indexes(indexes)
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise e
+                created[collection_name] = replace_indexes(collection, indexes)
+        logger.info(f"Ensured indexes {created}")
+        return created
+
+    def ensure_indexes_in_background(self) -> Thread:
+        def ensure():
+            try:
+                self.ensure_indexes()
+            except PyMongoError as e:
+                logger.error(f"Could not ensure indexes: {e}")
+
+        thread = Thread(target=ensure, name="ensure-indexes", daemon=True)
+        thread.start()
+        return thread
+
     def upload_entity(self, entity: BaseModel) -> InsertOneResult:
         try:
-            entity_dict = orjson.loads(entity.json())
+            entity_dict = to_document(entity)
             collection_name = entity.__class__.__name__.lower()
             result = self.client[self.DATABASE_NAME][collection_name].insert_one(
                 entity_dict
             )
         except OperationFailure as e:
             raise e
+        self._forget(collection_name, entity_dict["id"])
         return result
 
     def upload_entities(self, entities: List[BaseModel]) -> InsertManyResult:
         try:
-            entity_dict = [orjson.loads(entity.json()) for entity in entities]
-            for entity in entity_dict:
-                entity["order"] = entity["order"]["id"]
+            entity_dict = [solution_to_document(entity) for entity in entities]
             collection_name = entities[0].__class__.__name__.lower()
             result = self.client[self.DATABASE_NAME][collection_name].insert_many(
                 entity_dict
@@ -71,34 +204,52 @@ class MongoBase:
 
     def delete_entity(self, entity: BaseModel) -> DeleteResult:
         try:
-            entity_dict = orjson.loads(entity.json())
-            entity_id = str(entity_dict["id"])
+            entity_id = str(entity.id)
             collection_name = entity.__class__.__name__.lower()
             result = self.client[self.DATABASE_NAME][collection_name].delete_one(
                 {"id": entity_id}
             )
         except OperationFailure as e:
             raise e
+        self._forget(collection_name, entity_id)
         return result
 
     def get_one_result_by_field(
-        self, entity: Type[BaseModel], field: str, value: Union[str, float, int]
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
     ) -> dict:
+        collection_name = entity.__name__.lower()
+        identity_map = None
+        if entity is Customer and field == "id":
+            identity_map = self.identity_map_provider()
+        if identity_map is not None:
+            result = identity_map.get(collection_name, field, f"{value}", projection)
+            if result is not None:
+                return result
         try:
-            result = self.client[self.DATABASE_NAME][entity.__name__.lower()].find_one(
-                {field: f"{value}"}
+            result = self.client[self.DATABASE_NAME][collection_name].find_one(
+                {field: f"{value}"}, projection
             )
         except OperationFailure as e:
             raise e
+        if identity_map is not None and result is not None:
+            identity_map.add(collection_name, field, f"{value}", result, projection)
         return result
 
     def get_results_by_field(
-        self, entity: Type[BaseModel], field: str, value: Union[str, float, int]
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
     ) -> List[dict]:
         result = []
         try:
             cursor = self.client[self.DATABASE_NAME][entity.__name__.lower()].find(
-                {field: f"{value}"}
+                {field: f"{value}"}, projection
             )
         except OperationFailure as e:
             raise e
@@ -112,18 +263,19 @@ class MongoBase:
         field: str,
         values: List[Union[str, float, int]],
         limit: int = None,
+        projection: Optional[dict] = None,
     ) -> List[dict]:
         result = []
         query = [{f"{field}": value} for value in values]
         try:
             if limit is None:
                 cursor = self.client[self.DATABASE_NAME][entity.__name__.lower()].find(
-                    {"$or": query}
+                    {"$or": query}, projection
                 )
             else:
                 cursor = (
                     self.client[self.DATABASE_NAME][entity.__name__.lower()]
-                    .find({"$or": query})
+                    .find({"$or": query}, projection)
                     .limit(limit)
                 )
         except OperationFailure as e:
@@ -141,19 +293,43 @@ class MongoBase:
             ].update_one({"id": str(entity.id)}, {"$set": {f"{field}": value}})
         except OperationFailure as e:
             raise e
+        self._forget(entity.__class__.__name__.lower(), str(entity.id))
+        return result
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        update = {f"orders.$.{field}": value for field, value in fields.items()}
+        try:
+            result = self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].update_one(
+                {"id": str(customer.id), "orders.id": order_id}, {"$set": update}
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(str(customer.id))
         return result
 
     def upload_order_for_customer(
         self, customer: Customer, order: Order
     ) -> UpdateResult:
-        orders = self.get_orders_by_customer(customer)
-        orders.append(orjson.loads(order.json()))
-        return self.update_entity(customer, "orders", orders)
+        try:
+            result = self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].update_one(
+                {"id": str(customer.id)},
+                {"$push": {"orders": to_document(order)}},
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(str(customer.id))
+        return result
 
     def upload_orders_for_customer(
         self, customer: Customer, orders: List[Order]
     ) -> UpdateResult:
-        orders_to_db = [orjson.loads(obj.json()) for obj in orders]
+        orders_to_db = to_documents(orders)
         return self.update_entity(customer, "orders", orders_to_db)
 
     def upload_orders_for_customer_json(
@@ -165,17 +341,33 @@ class MongoBase:
         return self.delete_entity(order)
 
     def get_order_by_id(self, customer: Customer, order_id: str) -> Union[dict, None]:
-        result = None
-        orders_db = self.get_orders_by_customer(customer)
-        for order in orders_db:
-            if order["id"] == order_id:
-                result = order
-        if result is None:
-            return result
-        return result
+        identity_map = self.identity_map_provider()
+        if identity_map is not None:
+            customer_db = identity_map.get(
+                Customer.__name__.lower(),
+                "id",
+                str(customer.id),
+                CUSTOMER_ORDERS_PROJECTION,
+            )
+            if customer_db is not None:
+                return find_order(customer_db["orders"] or [], order_id)
+        try:
+            result = self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].find_one(
+                {"id": str(customer.id)},
+                {"_id": 0, "orders": {"$elemMatch": {"id": order_id}}},
+            )
+        except OperationFailure as e:
+            raise e
+        if result is None or not result.get("orders"):
+            return None
+        return result["orders"][0]
 
     def get_orders_by_customer(self, customer) -> List[dict]:
-        result = self.get_one_result_by_field(Customer, "id", customer.id)
+        result = self.get_one_result_by_field(
+            Customer, "id", customer.id, CUSTOMER_ORDERS_PROJECTION
+        )
         orders_db = result["orders"]
         orders = []
         if not orders_db:
@@ -187,99 +379,113 @@ class MongoBase:
             raise e
         return orders
 
-    def upload_customer(self, customer: Customer) -> InsertOneResult:
-        if (
-            self.get_customer_by_email(customer.email) is not None
-            or self.get_customer_by_phone(customer.phone) is not None
-        ):
-            raise CustomerExistsException
-        return self.upload_entity(customer)
+    def _page_order_documents(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor],
+        statuses: Optional[List[str]],
+    ) -> List[dict]:
+        try:
+            result = list(
+                self.client[self.DATABASE_NAME][Customer.__name__.lower()].aggregate(
+                    embedded_orders_pipeline(str(customer.id), limit, cursor, statuses)
+                )
+            )
+        except OperationFailure as e:
+            raise e
+        return result
 
-    def get_customer_by_email(self, email: str) -> Union[Customer, None]:
-        result = self.get_one_result_by_field(Customer, "email", email)
+    def get_orders_page(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[OrderCursor]]:
+        return split_page(
+            self._page_order_documents(customer, limit, cursor, statuses), limit
+        )
+
+    def _customer_from_document(self, result: Optional[dict]) -> Optional[Customer]:
         if result is None:
             return None
-        return Customer(**result)
+        customer = from_trusted_document(Customer, result)
+        customer.defer_orders(
+            lambda: [
+                from_trusted_document(Order, order)
+                for order in self.get_orders_by_customer(customer)
+            ]
+        )
+        return customer
+
+    def upload_customer(self, customer: Customer) -> InsertOneResult:
+        try:
+            return self.upload_entity(customer)
+        except DuplicateKeyError as e:
+            raise CustomerExistsException from e
+
+    def get_customer_by_email(self, email: str) -> Union[Customer, None]:
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "email", email, CUSTOMER_PROJECTION)
+        )
 
     def get_customer_by_phone(self, phone: str) -> Union[Customer, None]:
-        result = self.get_one_result_by_field(Customer, "phone", phone)
-        if result is None:
-            return None
-        return Customer(**result)
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "phone", phone, CUSTOMER_PROJECTION)
+        )
 
     def delete_customer(self, customer: Customer) -> DeleteResult:
         return self.delete_entity(customer)
 
     def get_customer_by_id(self, user_id: str):
-        result = self.get_one_result_by_field(Customer, "id", user_id)
-        if result is None:
-            return None
-        return Customer(**result)
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "id", user_id, CUSTOMER_PROJECTION)
+        )
 
     def update_order_status(self, customer: Customer, order: Order) -> UpdateResult:
-        orders = self.get_orders_by_customer(customer)
-        for order_db in orders:
-            if order_db["id"] == str(order.id):
-                order_db["status"] = order.status.value
-        return self.update_entity(customer, "orders", orders)
-
-    def get_vacant_drivers(self) -> List[Driver]:
-        results = self.get_results_by_field_query_or(
-            Driver,
-            "status",
-            [DriverStatuses.IS_WAITING.value, DriverStatuses.IS_CANDIDATE.value],
-            10,
+        return self.update_order_fields(
+            customer, str(order.id), {"status": order.status.value}
         )
-        drivers = []
-        for result in results:
-            drivers.append(Driver(**result))
-        return drivers
-
-    def upload_solutions(self, solutions: List[Solution]) -> InsertManyResult:
-        return self.upload_entities(solutions)
-
-    def update_driver_status(self, driver: Driver) -> UpdateResult:
-        return self.update_entity(driver, "status", driver.status.value)
-
-    def get_solutions_by_order_id(self, order_id: str) -> List[dict]:
-        return self.get_results_by_field(Solution, "order", order_id)
-
-    def get_solution_by_id(self, solution_id: str) -> dict:
-        return self.get_one_result_by_field(Solution, "id", solution_id)
-
-    def get_driver_by_id(self, driver_id: str) -> dict:
-        return self.get_one_result_by_field(Driver, "id", driver_id)
 
     def update_order_solution_params(
         self, customer: Customer, order: Order
     ) -> UpdateResult:
-        orders = self.get_orders_by_customer(customer)
-        for order_db in orders:
-            if order_db["id"] == str(order.id):
-                order_db["driver"] = self.get_driver_by_id(str(order.driver.id))
-                order_db["cost"] = order.cost
-                order_db["time"] = order.time
-        return self.update_entity(customer, "orders", orders)
-
-    def delete_solutions_by_order(self, order: Order) -> DeleteResult:
-        try:
-            result = self.client[self.DATABASE_NAME][
-                Solution.__name__.lower()
-            ].delete_many({"order": str(order.id)})
-        except OperationFailure as e:
-            raise e
-        return result
+        return self.update_order_fields(
+            customer,
+            str(order.id),
+            {
+                "driver": to_document(order.driver),
+                "cost": order.cost,
+                "time": order.time,
+            },
+        )
 
     def update_order_expected_date(self, customer, order) -> UpdateResult:
-        orders = self.get_orders_by_customer(customer)
-        for order_db in orders:
-            if order_db["id"] == str(order.id):
-                order_db["expected_date"] = order.expected_date
-        return self.update_entity(customer, "orders", orders)
+        return self.update_order_fields(
+            customer, str(order.id), {"expected_date": order.expected_date}
+        )
 
     def update_ready_date(self, customer, order) -> UpdateResult:
-        orders = self.get_orders_by_customer(customer)
-        for order_db in orders:
-            if order_db["id"] == str(order.id):
-                order_db["ready_date"] = order.ready_date
-        return self.update_entity(customer, "orders", orders)
+        return self.update_order_fields(
+            customer, str(order.id), {"ready_date": order.ready_date}
+        )
+
+    def _count_by_status(self, collection_name: str, pipeline: List[dict]) -> dict:
+        try:
+            cursor = self.client[self.DATABASE_NAME][collection_name].aggregate(
+                [*pipeline, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+            )
+        except OperationFailure as e:
+            raise e
+        return {result["_id"]: result["count"] for result in cursor}
+
+    def count_orders_by_status(self) -> Dict[str, int]:
+        return self._count_by_status(
+            Customer.__name__.lower(),
+            [
+                {"$project": {"_id": 0, "orders.status": 1}},
+                {"$unwind": "$orders"},
+                {"$replaceRoot": {"newRoot": "$orders"}},
+            ],
+        )
@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import UpdateResult
+
+from barathrum.controller.db.storage import ACTIVE_SOLUTION_JOB_STATUSES
+from barathrum.models.codec import to_document
+from barathrum.models.entities import Customer, SolutionJob, SolutionJobStatuses
+
+
+class MongoSolutionJobQueue:
+    @property
+    def solution_jobs(self) -> Collection:
+        return self.client[self.DATABASE_NAME][SolutionJob.__name__.lower()]
+
+    def enqueue_solution_job(self, customer: Customer, order_id: str) -> dict:
+        job = to_document(SolutionJob(order=order_id, customer=str(customer.id)))
+        try:
+            return self._upsert_solution_job(order_id, job)
+        except DuplicateKeyError:
+            # Параллельный upsert уже создал активную задачу по этому заказу,
+            # повторный запрос её найдёт
+            return self._upsert_solution_job(order_id, job)
+
+    def _upsert_solution_job(self, order_id: str, job: dict) -> dict:
+        try:
+            result = self.solution_jobs.find_one_and_update(
+                {"order": order_id, "status": {"$in": ACTIVE_SOLUTION_JOB_STATUSES}},
+                {"$setOnInsert": {**job, "active": True}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    def claim_solution_job(self, worker: str) -> Optional[dict]:
+        try:
+            result = self.solution_jobs.find_one_and_update(
+                {"status": SolutionJobStatuses.PENDING.value},
+                {
+                    "$set": {
+                        "status": SolutionJobStatuses.RUNNING.value,
+                        "started_at": datetime.now().isoformat(),
+                        "worker": worker,
+                    }
+                },
+                sort=[("created_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER,
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    def finish_solution_job(
+        self, job_id: str, status: SolutionJobStatuses, error: Optional[str] = None
+    ) -> UpdateResult:
+        try:
+            result = self.solution_jobs.update_one(
+                {"id": job_id},
+                {
+                    "$set": {
+                        "status": status.value,
+                        "finished_at": datetime.now().isoformat(),
+                        "error": error,
+                    },
+                    "$unset": {"active": ""},
+                },
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    def requeue_stale_solution_jobs(self, started_before: datetime) -> UpdateResult:
+        try:
+            result = self.solution_jobs.update_many(
+                {
+                    "status": SolutionJobStatuses.RUNNING.value,
+                    "started_at": {"$lt": started_before.isoformat()},
+                },
+                {
+                    "$set": {
+                        "status": SolutionJobStatuses.PENDING.value,
+                        "started_at": None,
+                        "worker": None,
+                    }
+                },
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    def get_solution_job(self, job_id: str) -> Optional[dict]:
+        return self.get_one_result_by_field(SolutionJob, "id", job_id)
+
+    def count_solution_jobs(self, status: SolutionJobStatuses) -> int:
+        try:
+            result = self.solution_jobs.count_documents({"status": status.value})
+        except OperationFailure as e:
+            raise e
+        return result
@@ -0,0 +1,298 @@
+import logging
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+from pymongo import ASCENDING, InsertOne, ReplaceOne, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from barathrum.controller.db.mongo import (
+    ORDERS_STORAGE_COLLECTION,
+    ORDERS_STORAGE_EMBEDDED,
+    MongoBase,
+)
+from barathrum.controller.db.pagination import ORDERS_SORT, OrderCursor, orders_filter
+from barathrum.models.codec import to_document, to_documents
+from barathrum.models.entities import Customer, Order
+
+logger = logging.getLogger("barathrum")
+
+
+class OrderCollectionMongoBase(MongoBase):
+    ORDERS_MIGRATION_ID = "orders_to_collection"
+
+    def __init__(self, embedded_fallback: bool = True, **client_options):
+        super().__init__(**client_options)
+        self.embedded_fallback = embedded_fallback
+
+    def _order_update_requests(
+        self, customer_id: str, order_id: str, fields: dict
+    ) -> List[Tuple[str, UpdateOne]]:
+        requests = [
+            (
+                Order.__name__.lower(),
+                UpdateOne(
+                    {"id": order_id, "customer_id": customer_id}, {"$set": fields}
+                ),
+            )
+        ]
+        if self.embedded_fallback:
+            requests += super()._order_update_requests(customer_id, order_id, fields)
+        return requests
+
+    @property
+    def orders(self) -> Collection:
+        return self.client[self.DATABASE_NAME][Order.__name__.lower()]
+
+    @staticmethod
+    def _order_to_db(customer: Customer, order: dict) -> dict:
+        order_db = dict(order)
+        order_db["customer_id"] = str(customer.id)
+        return order_db
+
+    def upload_order_for_customer(
+        self, customer: Customer, order: Order
+    ) -> InsertOneResult:
+        try:
+            result = self.orders.insert_one(
+                self._order_to_db(customer, to_document(order))
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(str(customer.id))
+        return result
+
+    def upload_orders_for_customer(
+        self, customer: Customer, orders: List[Order]
+    ) -> Optional[BulkWriteResult]:
+        return self.upload_orders_for_customer_json(customer, to_documents(orders))
+
+    def upload_orders_for_customer_json(
+        self, customer: Customer, orders: List
+    ) -> Optional[BulkWriteResult]:
+        customer_id = str(customer.id)
+        documents = [self._order_to_db(customer, order) for order in orders]
+        requests = [
+            ReplaceOne(
+                {"id": document["id"], "customer_id": customer_id},
+                document,
+                upsert=True,
+            )
+            if "id" in document
+            else InsertOne(document)
+            for document in documents
+        ]
+        order_ids = [document["id"] for document in documents if "id" in document]
+
+        def write(session=None):
+            # Сначала пишем новые заказы и только потом удаляем старые: без
+            # транзакции сбой посередине не оставит клиента без заказов
+            old = self.orders.find(
+                {"customer_id": customer_id}, {"_id": 1}, session=session
+            )
+            old_ids = [document["_id"] for document in old]
+            result = (
+                self.orders.bulk_write(requests, session=session) if requests else None
+            )
+            self.orders.delete_many(
+                {"_id": {"$in": old_ids}, "id": {"$nin": order_ids}}, session=session
+            )
+            return result
+
+        try:
+            if self.transactions:
+                with self.client.start_session() as session:
+                    result = session.with_transaction(write)
+            else:
+                result = write()
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(customer_id)
+        return result
+
+    def get_order_by_id(self, customer: Customer, order_id: str) -> Union[dict, None]:
+        try:
+            result = self.orders.find_one(
+                {"id": order_id, "customer_id": str(customer.id)},
+                {"_id": 0, "customer_id": 0},
+            )
+        except OperationFailure as e:
+            raise e
+        if result is None and self.embedded_fallback:
+            return super().get_order_by_id(customer, order_id)
+        return result
+
+    def get_orders_by_customer(self, customer) -> List[dict]:
+        try:
+            cursor = self.orders.find(
+                {"customer_id": str(customer.id)}, {"_id": 0, "customer_id": 0}
+            )
+            orders = list(cursor)
+        except OperationFailure as e:
+            raise e
+        if self.embedded_fallback:
+            orders = super().get_orders_by_customer(customer) + orders
+        return orders
+
+    def _page_order_documents(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor],
+        statuses: Optional[List[str]],
+    ) -> List[dict]:
+        try:
+            result = list(
+                self.orders.find(
+                    {
+                        "customer_id": str(customer.id),
+                        **orders_filter(cursor, statuses),
+                    },
+                    {"_id": 0, "customer_id": 0},
+                )
+                .sort(ORDERS_SORT)
+                .limit(limit + 1)
+            )
+        except OperationFailure as e:
+            raise e
+        if self.embedded_fallback:
+            result += super()._page_order_documents(customer, limit, cursor, statuses)
+        return result
+
+    def count_orders_by_status(self) -> Dict[str, int]:
+        counts = self._count_by_status(
+            Order.__name__.lower(), [{"$sort": {"status": ASCENDING}}]
+        )
+        if self.embedded_fallback:
+            for status, count in super().count_orders_by_status().items():
+                counts[status] = counts.get(status, 0) + count
+        return counts
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        try:
+            result = self.orders.update_one(
+                {"id": order_id, "customer_id": str(customer.id)}, {"$set": fields}
+            )
+        except OperationFailure as e:
+            raise e
+        if result.matched_count == 0 and self.embedded_fallback:
+            return super().update_order_fields(customer, order_id, fields)
+        self._forget_orders(str(customer.id))
+        return result
+
+    def delete_customer(self, customer: Customer) -> DeleteResult:
+        try:
+            self.orders.delete_many({"customer_id": str(customer.id)})
+        except OperationFailure as e:
+            raise e
+        return super().delete_customer(customer)
+
+    def migrate_embedded_orders(
+        self, batch_size: int = 100, restart: bool = False
+    ) -> int:
+        migrations = self.client[self.DATABASE_NAME]["migration"]
+        customers = self.client[self.DATABASE_NAME][Customer.__name__.lower()]
+        if restart:
+            migrations.delete_one({"id": self.ORDERS_MIGRATION_ID})
+        checkpoint = migrations.find_one({"id": self.ORDERS_MIGRATION_ID}) or {}
+        last_customer = checkpoint.get("last_customer")
+        migrated = 0
+        while True:
+            query = {"orders.0": {"$exists": True}}
+            if last_customer is not None:
+                query["_id"] = {"$gt": last_customer}
+            batch = list(
+                customers.find(query, {"id": 1, "orders": 1})
+                .sort("_id", ASCENDING)
+                .limit(batch_size)
+            )
+            if not batch:
+                break
+            for customer_db in batch:
+                migrated += self._migrate_customer_orders(customer_db)
+                last_customer = customer_db["_id"]
+            migrations.update_one(
+                {"id": self.ORDERS_MIGRATION_ID},
+                {"$set": {"last_customer": last_customer}},
+                upsert=True,
+            )
+            logger.info(f"Migrated {migrated} orders, last customer {last_customer}")
+        return migrated
+
+    def _migrate_customer_orders(self, customer_db: dict) -> int:
+        orders = [order for order in customer_db["orders"] if "id" in order]
+        if len(orders) != len(customer_db["orders"]):
+            logger.warning(f"Customer {customer_db['id']} has orders without id")
+        order_ids = [order["id"] for order in orders]
+        while orders:
+            self._copy_customer_orders(customer_db, orders)
+            orders = self._stale_copied_orders(customer_db, order_ids)
+            if orders:
+                logger.info(
+                    f"Orders of customer {customer_db['id']} changed during"
+                    f" migration, copying {len(orders)} again"
+                )
+        return len(order_ids)
+
+    def _copy_customer_orders(self, customer_db: dict, orders: List[dict]) -> None:
+        try:
+            self.orders.bulk_write(
+                [
+                    ReplaceOne(
+                        {"id": order["id"]},
+                        {**order, "customer_id": customer_db["id"]},
+                        upsert=True,
+                    )
+                    for order in orders
+                ],
+                ordered=False,
+            )
+            # Удаляем из клиента только те заказы, которые не изменились после
+            # копирования: обновлённые через embedded_fallback копируются заново
+            self.client[self.DATABASE_NAME][Customer.__name__.lower()].update_one(
+                {"_id": customer_db["_id"]},
+                {"$pull": {"orders": {"$in": orders}}},
+            )
+        except OperationFailure as e:
+            raise e
+
+    def _stale_copied_orders(
+        self, customer_db: dict, order_ids: List[str]
+    ) -> List[dict]:
+        try:
+            current = self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].find_one({"_id": customer_db["_id"]}, {"orders": 1})
+        except OperationFailure as e:
+            raise e
+        return [
+            order
+            for order in (current or {}).get("orders", [])
+            if order.get("id") in order_ids
+        ]
+
+
+def create_mongo_base(**client_options) -> MongoBase:
+    storage = os.environ.get("MONGO_ORDERS_STORAGE", ORDERS_STORAGE_EMBEDDED)
+    transactions = os.environ.get("MONGO_TRANSACTIONS", "0") == "1"
+    if storage == ORDERS_STORAGE_COLLECTION:
+        database = OrderCollectionMongoBase(
+            embedded_fallback=os.environ.get("MONGO_ORDERS_EMBEDDED_FALLBACK", "1")
+            == "1",
+            transactions=transactions,
+            ensure_indexes=True,
+            **client_options,
+        )
+    else:
+        database = MongoBase(
+            transactions=transactions, ensure_indexes=True, **client_options
+        )
+    return database
@@ -0,0 +1,59 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import DeleteMany, InsertOne, UpdateMany, UpdateOne
+
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.models.codec import solution_to_document
+from barathrum.models.entities import Customer, Driver, DriverStatuses, Solution
+
+
+def find_order(orders: List[dict], order_id: str) -> Optional[dict]:
+    for order in orders:
+        if order.get("id") == order_id:
+            return order
+    return None
+
+
+def embedded_order_update_requests(
+    customer_id: str, order_id: str, fields: dict
+) -> List[Tuple[str, UpdateOne]]:
+    update = {f"orders.$.{field}": value for field, value in fields.items()}
+    return [
+        (
+            Customer.__name__.lower(),
+            UpdateOne({"id": customer_id, "orders.id": order_id}, {"$set": update}),
+        )
+    ]
+
+
+def driver_booking(driver_id: str) -> Tuple[dict, dict]:
+    busy = DriverStatuses.IS_BUSY.value
+    return {"id": driver_id, "status": {"$ne": busy}}, {"$set": {"status": busy}}
+
+
+def unit_of_work_requests(
+    uow: UnitOfWork,
+    order_update_requests: Callable[[str, str, dict], List[Tuple[str, UpdateOne]]],
+) -> Dict[str, list]:
+    requests = {}
+    statuses = {}
+    for driver_id, status in uow.driver_statuses.items():
+        statuses.setdefault(status, []).append(driver_id)
+    for status, driver_ids in statuses.items():
+        requests.setdefault(Driver.__name__.lower(), []).append(
+            UpdateMany({"id": {"$in": driver_ids}}, {"$set": {"status": status}})
+        )
+    for (customer_id, order_id), fields in uow.order_fields.items():
+        for collection_name, request in order_update_requests(
+            customer_id, order_id, fields
+        ):
+            requests.setdefault(collection_name, []).append(request)
+    if uow.deleted_solution_orders:
+        requests[Solution.__name__.lower()] = [
+            DeleteMany({"order": {"$in": uow.deleted_solution_orders}})
+        ]
+    for solution in uow.inserted_solutions:
+        requests.setdefault(Solution.__name__.lower(), []).append(
+            InsertOne(solution_to_document(solution))
+        )
+    return requests
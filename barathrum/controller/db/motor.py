@@ -0,0 +1,419 @@
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple, Type, Union
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from barathrum.controller.db.client import (
+    PoolMonitor,
+    ProcessLocalClient,
+    mongo_client_options,
+)
+from barathrum.controller.db.indexes import (
+    INDEX_CONFLICT_CODES,
+    INDEXES,
+    replacement_steps,
+)
+from barathrum.controller.db.mongo import (
+    CUSTOMER_ORDERS_PROJECTION,
+    ORDERS_STORAGE_COLLECTION,
+    ORDERS_STORAGE_EMBEDDED,
+    MongoBase,
+    mongo_uri,
+)
+from barathrum.controller.db.mongo_requests import (
+    embedded_order_update_requests,
+    unit_of_work_requests,
+)
+from barathrum.controller.db.motor_drivers import MotorDriverStore
+from barathrum.controller.db.pagination import (
+    OrderCursor,
+    embedded_orders_pipeline,
+    split_page,
+)
+from barathrum.controller.db.storage import CUSTOMER_PROJECTION, CustomerExistsException
+from barathrum.controller.db.unit_of_work import AsyncUnitOfWork
+from barathrum.models.codec import (
+    from_trusted_document,
+    solution_to_document,
+    to_document,
+    to_documents,
+)
+from barathrum.models.entities import BaseModel, Customer, Order
+
+logger = logging.getLogger("barathrum")
+
+
+def _orders_are_awaited() -> List[Order]:
+    raise RuntimeError(
+        "Customer orders are not loaded, use `await get_orders_by_customer()`"
+    )
+
+
+def customer_from_document(result: Optional[dict]) -> Optional[Customer]:
+    if result is None:
+        return None
+    customer = from_trusted_document(Customer, result)
+    customer.defer_orders(_orders_are_awaited)
+    return customer
+
+
+class MotorBase(MotorDriverStore):
+    DATABASE_NAME = MongoBase.DATABASE_NAME
+
+    def __init__(self, **client_options):
+        self.pool = PoolMonitor()
+        self.client_options = {
+            **mongo_client_options(),
+            **client_options,
+            "event_listeners": [
+                self.pool,
+                *client_options.get("event_listeners", []),
+            ],
+        }
+        self._client = ProcessLocalClient(self._connect)
+        self.change_listeners: List[Callable[[str, str], None]] = []
+
+    def _connect(self) -> AsyncIOMotorClient:
+        self.pool.reset()
+        return AsyncIOMotorClient(mongo_uri(), **self.client_options)
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        return self._client.get()
+
+    def unit_of_work(self) -> AsyncUnitOfWork:
+        return AsyncUnitOfWork(self)
+
+    def _forget(self, collection_name: str, entity_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(collection_name, entity_id)
+
+    def _forget_orders(self, customer_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(Order.__name__.lower(), customer_id)
+
+    async def flush_unit_of_work(self, uow: AsyncUnitOfWork) -> None:
+        requests = unit_of_work_requests(uow, embedded_order_update_requests)
+        for customer_id, _ in uow.order_fields:
+            self._forget_orders(customer_id)
+        try:
+            await self.book_drivers(uow.booked_drivers)
+            for collection_name, collection_requests in requests.items():
+                await self.client[self.DATABASE_NAME][collection_name].bulk_write(
+                    collection_requests
+                )
+        except OperationFailure as e:
+            raise e
+
+    async def ensure_indexes(self) -> Dict[str, List[str]]:
+        created = {}
+        for collection_name, indexes in INDEXES.items():
+            collection = self.client[self.DATABASE_NAME][collection_name]
+            try:
+                created[collection_name] = await collection.create_indexes(indexes)
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise e
+                created[collection_name] = await self._replace_indexes(
+                    collection, indexes
+                )
+        return created
+
+    @staticmethod
+    async def _replace_indexes(
+        collection: AsyncIOMotorCollection, indexes: List[IndexModel]
+    ) -> List[str]:
+        steps = replacement_steps(
+            collection.name, indexes, await collection.index_information()
+        )
+        reply, error = None, None
+        while True:
+            try:
+                command, argument = steps.throw(error) if error else steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                if command == "aggregate":
+                    reply = await collection.aggregate(argument).to_list(1)
+                else:
+                    reply = await getattr(collection, command)(argument)
+                error = None
+            except OperationFailure as e:
+                reply, error = None, e
+
+    async def upload_entity(self, entity: BaseModel) -> InsertOneResult:
+        try:
+            entity_dict = to_document(entity)
+            collection_name = entity.__class__.__name__.lower()
+            result = await self.client[self.DATABASE_NAME][collection_name].insert_one(
+                entity_dict
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget(collection_name, entity_dict["id"])
+        return result
+
+    async def upload_entities(self, entities: List[BaseModel]) -> InsertManyResult:
+        try:
+            entity_dict = [solution_to_document(entity) for entity in entities]
+            collection_name = entities[0].__class__.__name__.lower()
+            result = await self.client[self.DATABASE_NAME][collection_name].insert_many(
+                entity_dict
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    async def delete_entity(self, entity: BaseModel) -> DeleteResult:
+        try:
+            entity_id = str(entity.id)
+            collection_name = entity.__class__.__name__.lower()
+            result = await self.client[self.DATABASE_NAME][collection_name].delete_one(
+                {"id": entity_id}
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget(collection_name, entity_id)
+        return result
+
+    async def get_one_result_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> dict:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                entity.__name__.lower()
+            ].find_one({field: f"{value}"}, projection)
+        except OperationFailure as e:
+            raise e
+        return result
+
+    async def get_results_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> List[dict]:
+        try:
+            cursor = self.client[self.DATABASE_NAME][entity.__name__.lower()].find(
+                {field: f"{value}"}, projection
+            )
+            result = await cursor.to_list(length=None)
+        except OperationFailure as e:
+            raise e
+        return result
+
+    async def get_results_by_field_query_or(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        values: List[Union[str, float, int]],
+        limit: int = None,
+        projection: Optional[dict] = None,
+    ) -> List[dict]:
+        query = [{f"{field}": value} for value in values]
+        try:
+            cursor = self.client[self.DATABASE_NAME][entity.__name__.lower()].find(
+                {"$or": query}, projection
+            )
+            if limit is not None:
+                cursor = cursor.limit(limit)
+            result = await cursor.to_list(length=None)
+        except OperationFailure as e:
+            raise e
+        return result
+
+    async def update_entity(
+        self, entity: BaseModel, field: str, value: Union[str, float, int, List]
+    ) -> UpdateResult:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                entity.__class__.__name__.lower()
+            ].update_one({"id": str(entity.id)}, {"$set": {f"{field}": value}})
+        except OperationFailure as e:
+            raise e
+        self._forget(entity.__class__.__name__.lower(), str(entity.id))
+        return result
+
+    async def replace_customer_password(self, customer: Customer, hashed: str) -> bool:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].update_one(
+                {"id": str(customer.id), "password": customer.password},
+                {"$set": {"password": hashed}},
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget(Customer.__name__.lower(), str(customer.id))
+        return result.modified_count == 1
+
+    async def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        update = {f"orders.$.{field}": value for field, value in fields.items()}
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].update_one(
+                {"id": str(customer.id), "orders.id": order_id}, {"$set": update}
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(str(customer.id))
+        return result
+
+    async def upload_order_for_customer(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].update_one(
+                {"id": str(customer.id)},
+                {"$push": {"orders": to_document(order)}},
+            )
+        except OperationFailure as e:
+            raise e
+        self._forget_orders(str(customer.id))
+        return result
+
+    async def upload_orders_for_customer(
+        self, customer: Customer, orders: List[Order]
+    ) -> UpdateResult:
+        orders_to_db = to_documents(orders)
+        return await self.update_entity(customer, "orders", orders_to_db)
+
+    async def upload_orders_for_customer_json(
+        self, customer: Customer, orders: List
+    ) -> UpdateResult:
+        return await self.update_entity(customer, "orders", orders)
+
+    async def delete_order(self, order: Order) -> DeleteResult:
+        return await self.delete_entity(order)
+
+    async def get_order_by_id(
+        self, customer: Customer, order_id: str
+    ) -> Union[dict, None]:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Customer.__name__.lower()
+            ].find_one(
+                {"id": str(customer.id)},
+                {"_id": 0, "orders": {"$elemMatch": {"id": order_id}}},
+            )
+        except OperationFailure as e:
+            raise e
+        if result is None or not result.get("orders"):
+            return None
+        return result["orders"][0]
+
+    async def get_orders_by_customer(self, customer) -> List[dict]:
+        result = await self.get_one_result_by_field(
+            Customer, "id", customer.id, CUSTOMER_ORDERS_PROJECTION
+        )
+        return list(result["orders"] or [])
+
+    async def get_orders_page(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[OrderCursor]]:
+        try:
+            documents = await (
+                self.client[self.DATABASE_NAME][Customer.__name__.lower()]
+                .aggregate(
+                    embedded_orders_pipeline(str(customer.id), limit, cursor, statuses)
+                )
+                .to_list(None)
+            )
+        except OperationFailure as e:
+            raise e
+        return split_page(documents, limit)
+
+    async def upload_customer(self, customer: Customer) -> InsertOneResult:
+        try:
+            return await self.upload_entity(customer)
+        except DuplicateKeyError as e:
+            raise CustomerExistsException from e
+
+    async def get_customer_by_email(self, email: str) -> Union[Customer, None]:
+        return customer_from_document(
+            await self.get_one_result_by_field(
+                Customer, "email", email, CUSTOMER_PROJECTION
+            )
+        )
+
+    async def get_customer_by_phone(self, phone: str) -> Union[Customer, None]:
+        return customer_from_document(
+            await self.get_one_result_by_field(
+                Customer, "phone", phone, CUSTOMER_PROJECTION
+            )
+        )
+
+    async def delete_customer(self, customer: Customer) -> DeleteResult:
+        return await self.delete_entity(customer)
+
+    async def get_customer_by_id(self, user_id: str) -> Union[Customer, None]:
+        return customer_from_document(
+            await self.get_one_result_by_field(
+                Customer, "id", user_id, CUSTOMER_PROJECTION
+            )
+        )
+
+    async def update_order_status(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        return await self.update_order_fields(
+            customer, str(order.id), {"status": order.status.value}
+        )
+
+    async def update_order_solution_params(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        return await self.update_order_fields(
+            customer,
+            str(order.id),
+            {
+                "driver": to_document(order.driver),
+                "cost": order.cost,
+                "time": order.time,
+            },
+        )
+
+    async def update_order_expected_date(self, customer, order) -> UpdateResult:
+        return await self.update_order_fields(
+            customer, str(order.id), {"expected_date": order.expected_date}
+        )
+
+    async def update_ready_date(self, customer, order) -> UpdateResult:
+        return await self.update_order_fields(
+            customer, str(order.id), {"ready_date": order.ready_date}
+        )
+
+
+def create_motor_base(**client_options) -> MotorBase:
+    # MotorBase читает только заказы внутри клиента: в режиме коллекции асинхронное
+    # приложение не увидело бы заказы из коллекции `order`
+    storage = os.environ.get("MONGO_ORDERS_STORAGE", ORDERS_STORAGE_EMBEDDED)
+    if storage == ORDERS_STORAGE_COLLECTION:
+        raise ValueError(
+            f"MotorBase does not support MONGO_ORDERS_STORAGE={storage},"
+            f" use {ORDERS_STORAGE_EMBEDDED} or the Flask application"
+        )
+    return MotorBase(**client_options)
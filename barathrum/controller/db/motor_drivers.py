@@ -0,0 +1,94 @@
+from typing import List
+
+from pymongo.errors import OperationFailure
+from pymongo.results import DeleteResult, InsertManyResult, UpdateResult
+
+from barathrum.controller.db.mongo_requests import driver_booking
+from barathrum.controller.db.storage import (
+    VACANT_DRIVER_STATUSES,
+    DriverIsBusyException,
+)
+from barathrum.controller.scoring import DriverPool
+from barathrum.models.codec import from_trusted_document
+from barathrum.models.entities import Driver, DriverStatuses, Order, Solution
+
+
+class MotorDriverStore:
+    async def get_vacant_drivers(self) -> List[Driver]:
+        results = await self.get_results_by_field_query_or(
+            Driver,
+            "status",
+            [DriverStatuses.IS_WAITING.value, DriverStatuses.IS_CANDIDATE.value],
+            10,
+        )
+        return [from_trusted_document(Driver, result) for result in results]
+
+    async def get_vacant_driver_pool(self) -> DriverPool:
+        try:
+            cursor = self.client[self.DATABASE_NAME][Driver.__name__.lower()].find(
+                {"status": {"$in": VACANT_DRIVER_STATUSES}},
+                {"_id": 0, "id": 1, "qualification": 1, "experience": 1, "status": 1},
+            )
+            documents = await cursor.to_list(length=None)
+        except OperationFailure as e:
+            raise e
+        return DriverPool.from_documents(documents)
+
+    async def get_drivers_by_ids(self, driver_ids: List[str]) -> List[Driver]:
+        try:
+            cursor = self.client[self.DATABASE_NAME][Driver.__name__.lower()].find(
+                {"id": {"$in": driver_ids}}
+            )
+            documents = await cursor.to_list(length=None)
+        except OperationFailure as e:
+            raise e
+        drivers = {
+            document["id"]: from_trusted_document(Driver, document)
+            for document in documents
+        }
+        return [drivers[driver_id] for driver_id in driver_ids if driver_id in drivers]
+
+    async def upload_solutions(self, solutions: List[Solution]) -> InsertManyResult:
+        return await self.upload_entities(solutions)
+
+    async def update_driver_status(self, driver: Driver) -> UpdateResult:
+        return await self.update_entity(driver, "status", driver.status.value)
+
+    async def update_drivers_status(
+        self, drivers: List[Driver], status: DriverStatuses
+    ) -> UpdateResult:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Driver.__name__.lower()
+            ].update_many(
+                {"id": {"$in": [str(driver.id) for driver in drivers]}},
+                {"$set": {"status": status.value}},
+            )
+        except OperationFailure as e:
+            raise e
+        return result
+
+    async def book_drivers(self, driver_ids: List[str]) -> None:
+        collection = self.client[self.DATABASE_NAME][Driver.__name__.lower()]
+        for driver_id in driver_ids:
+            result = await collection.update_one(*driver_booking(driver_id))
+            if result.matched_count == 0:
+                raise DriverIsBusyException(driver_id)
+
+    async def get_solutions_by_order_id(self, order_id: str) -> List[dict]:
+        return await self.get_results_by_field(Solution, "order", order_id)
+
+    async def get_solution_by_id(self, solution_id: str) -> dict:
+        return await self.get_one_result_by_field(Solution, "id", solution_id)
+
+    async def get_driver_by_id(self, driver_id: str) -> dict:
+        return await self.get_one_result_by_field(Driver, "id", driver_id)
+
+    async def delete_solutions_by_order(self, order: Order) -> DeleteResult:
+        try:
+            result = await self.client[self.DATABASE_NAME][
+                Solution.__name__.lower()
+            ].delete_many({"order": str(order.id)})
+        except OperationFailure as e:
+            raise e
+        return result
@@ -0,0 +1,71 @@
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List
+
+from pymongo import monitoring
+
+READ_COMMANDS = {"find", "getMore", "aggregate", "count", "distinct"}
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+
+
+# Области сравниваются по идентичности: вложенные счётчики с равными
+# значениями не должны путаться при stop
+@dataclass(eq=False)
+class OperationCounts:
+    reads: int = 0
+    writes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def round_trips(self) -> int:
+        return self.reads + self.writes
+
+
+class OperationCounter(monitoring.CommandListener):
+    def __init__(self):
+        self._local = threading.local()
+
+    def _active(self) -> List[OperationCounts]:
+        if not hasattr(self._local, "counts"):
+            self._local.counts = []
+        return self._local.counts
+
+    def start(self) -> OperationCounts:
+        counts = OperationCounts()
+        self._active().append(counts)
+        return counts
+
+    def stop(self, counts: OperationCounts) -> OperationCounts:
+        active = self._active()
+        if counts in active:
+            active.remove(counts)
+        return counts
+
+    @contextmanager
+    def scope(self) -> Iterator[OperationCounts]:
+        counts = self.start()
+        try:
+            yield counts
+        finally:
+            self.stop(counts)
+
+    def count(self, command_name: str) -> None:
+        for counts in self._active():
+            if command_name in READ_COMMANDS:
+                counts.reads += 1
+            elif command_name in WRITE_COMMANDS:
+                counts.writes += 1
+
+    def spend(self, duration_micros: int) -> None:
+        for counts in self._active():
+            counts.seconds += duration_micros / 1_000_000
+
+    def started(self, event):
+        self.count(event.command_name)
+
+    def succeeded(self, event):
+        self.spend(event.duration_micros)
+
+    def failed(self, event):
+        self.spend(event.duration_micros)
@@ -0,0 +1,86 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from pymongo import DESCENDING
+
+ORDERS_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class OrderCursor:
+    created_at: str
+    id: str
+
+    @classmethod
+    def from_document(cls, document: dict) -> "OrderCursor":
+        return cls(created_at=document["created_at"], id=document["id"])
+
+    @classmethod
+    def decode(cls, token: str) -> "OrderCursor":
+        try:
+            created_at, _, order_id = (
+                urlsafe_b64decode(token.encode("ascii")).decode("utf-8").partition("|")
+            )
+        except (DecodeError, UnicodeError, ValueError) as e:
+            raise InvalidCursorException(token) from e
+        if not created_at or not order_id:
+            raise InvalidCursorException(token)
+        return cls(created_at=created_at, id=order_id)
+
+    def encode(self) -> str:
+        return urlsafe_b64encode(f"{self.created_at}|{self.id}".encode("utf-8")).decode(
+            "ascii"
+        )
+
+    def sort_key(self) -> Tuple[str, str]:
+        return self.created_at, self.id
+
+
+def orders_filter(
+    cursor: Optional[OrderCursor] = None, statuses: Optional[List[str]] = None
+) -> dict:
+    query = {}
+    if statuses:
+        query["status"] = {"$in": statuses}
+    if cursor is not None:
+        query["$or"] = [
+            {"created_at": {"$lt": cursor.created_at}},
+            {"created_at": cursor.created_at, "id": {"$lt": cursor.id}},
+        ]
+    return query
+
+
+def embedded_orders_pipeline(
+    customer_id: str,
+    limit: int,
+    cursor: Optional[OrderCursor] = None,
+    statuses: Optional[List[str]] = None,
+) -> List[dict]:
+    return [
+        {"$match": {"id": customer_id}},
+        {"$unwind": "$orders"},
+        {"$replaceRoot": {"newRoot": "$orders"}},
+        {"$match": orders_filter(cursor, statuses)},
+        {"$sort": dict(ORDERS_SORT)},
+        {"$limit": limit + 1},
+    ]
+
+
+def split_page(
+    documents: List[dict], limit: int
+) -> Tuple[List[dict], Optional[OrderCursor]]:
+    documents = sorted(
+        documents,
+        key=lambda document: OrderCursor.from_document(document).sort_key(),
+        reverse=True,
+    )
+    if len(documents) <= limit:
+        return documents, None
+    page = documents[:limit]
+    return page, OrderCursor.from_document(page[-1])
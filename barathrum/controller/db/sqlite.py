@@ -0,0 +1,493 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+from pymongo.results import (
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from barathrum.controller.db.client import PoolMonitor
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.memory_tables import (
+    delete_result,
+    includes,
+    project,
+    update_result,
+)
+from barathrum.controller.db.operations import OperationCounter
+from barathrum.controller.db.pagination import OrderCursor, split_page
+from barathrum.controller.db.sqlite_drivers import SqliteDriverStore
+from barathrum.controller.db.sqlite_jobs import SqliteSolutionJobQueue
+from barathrum.controller.db.sqlite_schema import (
+    CUSTOMER_COLUMNS,
+    DOCUMENTS,
+    INSERT_CUSTOMER,
+    INSERT_DRIVER,
+    INSERT_JOB,
+    INSERT_ORDER,
+    INSERT_SOLUTION,
+    SCHEMA,
+    SEARCHABLE,
+    SELECT_ORDERS,
+    TABLES,
+    UPDATABLE,
+    column_value,
+    driver_parameters,
+    is_duplicate_customer,
+    job_parameters,
+    order_columns,
+    order_document,
+    order_parameters,
+    solution_parameters,
+)
+from barathrum.controller.db.storage import CUSTOMER_PROJECTION, CustomerExistsException
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.models.codec import (
+    from_trusted_document,
+    solution_to_document,
+    to_document,
+    to_documents,
+)
+from barathrum.models.entities import (
+    BaseModel,
+    Customer,
+    Driver,
+    Order,
+    Solution,
+    SolutionJob,
+)
+
+logger = logging.getLogger("barathrum")
+
+
+class SqliteBase(SqliteDriverStore, SqliteSolutionJobQueue):
+    def __init__(self, path: str = "barathrum.sqlite3", timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self.operations = OperationCounter()
+        self.pool = PoolMonitor()
+        self.identity_map_provider: Callable[[], Optional[IdentityMap]] = lambda: None
+        self.change_listeners: List[Callable[[str, str], None]] = []
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        self.pool.connection_created(None)
+        with self._schema_lock:
+            if not self._schema_ready:
+                connection.executescript(SCHEMA)
+                self._schema_ready = True
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connection = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+            self.pool.connection_closed(None)
+        self._local.connection = None
+        self._local.pid = None
+
+    def _execute(
+        self, sql: str, parameters: tuple = (), command: str = "find"
+    ) -> sqlite3.Cursor:
+        self.operations.count(command)
+        started = time.perf_counter()
+        try:
+            return self.connection.execute(sql, parameters)
+        finally:
+            self.operations.spend(int((time.perf_counter() - started) * 1_000_000))
+
+    def _execute_many(
+        self, sql: str, parameters: List[tuple], command: str
+    ) -> sqlite3.Cursor:
+        self.operations.count(command)
+        started = time.perf_counter()
+        try:
+            return self.connection.executemany(sql, parameters)
+        finally:
+            self.operations.spend(int((time.perf_counter() - started) * 1_000_000))
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self.connection
+        if connection.in_transaction:
+            yield connection
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _forget(self, collection_name: str, entity_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(collection_name, entity_id)
+
+    def _forget_orders(self, customer_id: str) -> None:
+        for listener in self.change_listeners:
+            listener(Order.__name__.lower(), customer_id)
+
+    def unit_of_work(self) -> UnitOfWork:
+        return UnitOfWork(self)
+
+    def flush_unit_of_work(self, uow: UnitOfWork) -> None:
+        with self.transaction():
+            self.book_drivers(uow.booked_drivers)
+            if uow.driver_statuses:
+                self._execute_many(
+                    "UPDATE drivers SET status = ? WHERE id = ?",
+                    [
+                        (status, driver_id)
+                        for driver_id, status in uow.driver_statuses.items()
+                    ],
+                    "update",
+                )
+            for (customer_id, order_id), fields in uow.order_fields.items():
+                self._update_order(customer_id, order_id, fields)
+            if uow.deleted_solution_orders:
+                self._execute_many(
+                    "DELETE FROM solutions WHERE order_id = ?",
+                    [(order_id,) for order_id in uow.deleted_solution_orders],
+                    "delete",
+                )
+            if uow.inserted_solutions:
+                self._insert_solutions(
+                    [solution_to_document(s) for s in uow.inserted_solutions]
+                )
+        for customer_id, _ in uow.order_fields:
+            self._forget_orders(customer_id)
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        self.connection.executescript(SCHEMA)
+        indexes = {}
+        for row in self.connection.execute(
+            "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index'"
+        ):
+            indexes.setdefault(row["tbl_name"], []).append(row["name"])
+        logger.info(f"Ensured indexes {indexes}")
+        return indexes
+
+    def _insert_orders(self, customer_id: str, orders: List[dict]) -> None:
+        self._execute_many(
+            INSERT_ORDER,
+            [order_parameters(customer_id, order) for order in orders],
+            "insert",
+        )
+
+    def _insert_solutions(self, solutions: List[dict]) -> None:
+        self._execute_many(
+            INSERT_SOLUTION,
+            [solution_parameters(solution) for solution in solutions],
+            "insert",
+        )
+
+    def _insert(self, entity_type: type, documents: List[dict]) -> None:
+        with self.transaction():
+            if entity_type is Customer:
+                self._execute_many(
+                    INSERT_CUSTOMER,
+                    [
+                        tuple(document[column] for column in CUSTOMER_COLUMNS)
+                        for document in documents
+                    ],
+                    "insert",
+                )
+                for document in documents:
+                    if document.get("orders"):
+                        self._insert_orders(document["id"], document["orders"])
+            elif entity_type is Driver:
+                self._execute_many(
+                    INSERT_DRIVER,
+                    [driver_parameters(document) for document in documents],
+                    "insert",
+                )
+            elif entity_type is Solution:
+                self._insert_solutions(documents)
+            elif entity_type is SolutionJob:
+                self._execute_many(
+                    INSERT_JOB,
+                    [job_parameters(document) for document in documents],
+                    "insert",
+                )
+            else:
+                raise TypeError(f"Can not store {entity_type.__name__} on its own")
+
+    def upload_entity(self, entity: BaseModel) -> InsertOneResult:
+        document = to_document(entity)
+        self._insert(type(entity), [document])
+        self._forget(entity.__class__.__name__.lower(), document["id"])
+        return InsertOneResult(document["id"], True)
+
+    def upload_entities(self, entities: List[BaseModel]) -> InsertManyResult:
+        documents = [solution_to_document(entity) for entity in entities]
+        self._insert(type(entities[0]), documents)
+        return InsertManyResult([document["id"] for document in documents], True)
+
+    def delete_entity(self, entity: BaseModel) -> DeleteResult:
+        entity_id = str(entity.id)
+        with self.transaction():
+            cursor = self._execute(
+                f"DELETE FROM {TABLES[type(entity)]} WHERE id = ?",
+                (entity_id,),
+                "delete",
+            )
+        self._forget(entity.__class__.__name__.lower(), entity_id)
+        return delete_result(cursor.rowcount)
+
+    def _result(
+        self, entity: Type[BaseModel], row: sqlite3.Row, projection: Optional[dict]
+    ) -> dict:
+        document = DOCUMENTS[entity](row)
+        if entity is Customer and includes(projection, "orders"):
+            document["orders"] = self._orders(document["id"])
+        return project(document, projection) if projection else document
+
+    def _select(self, entity: Type[BaseModel], field: str) -> str:
+        select, alias, columns = SEARCHABLE[entity]
+        if field not in columns:
+            raise ValueError(f"Can not search {entity.__name__} by {field}")
+        return f"{select} WHERE {alias}.{columns[field]} = ?"
+
+    def get_one_result_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> dict:
+        row = self._execute(
+            f"{self._select(entity, field)} LIMIT 1", (f"{value}",)
+        ).fetchone()
+        return None if row is None else self._result(entity, row, projection)
+
+    def get_results_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> List[dict]:
+        alias = SEARCHABLE[entity][1]
+        rows = self._execute(
+            f"{self._select(entity, field)} ORDER BY {alias}.rowid", (f"{value}",)
+        ).fetchall()
+        return [self._result(entity, row, projection) for row in rows]
+
+    def update_entity(
+        self, entity: BaseModel, field: str, value: Union[str, float, int, List]
+    ) -> UpdateResult:
+        entity_type = type(entity)
+        entity_id = str(entity.id)
+        with self.transaction():
+            if entity_type is Customer and field == "orders":
+                matched = self._replace_orders(entity_id, value)
+            elif field in UPDATABLE.get(entity_type, ()):
+                matched = self._execute(
+                    f"UPDATE {TABLES[entity_type]} SET {field} = ? WHERE id = ?",
+                    (column_value(value), entity_id),
+                    "update",
+                ).rowcount
+            else:
+                raise ValueError(f"Can not update {entity_type.__name__}.{field}")
+        self._forget(entity.__class__.__name__.lower(), entity_id)
+        return update_result(matched)
+
+    def _replace_orders(self, customer_id: str, orders: List[dict]) -> int:
+        exists = self._execute(
+            "SELECT 1 FROM customers WHERE id = ?", (customer_id,)
+        ).fetchone()
+        if exists is None:
+            return 0
+        self._execute(
+            "DELETE FROM orders WHERE customer_id = ?", (customer_id,), "delete"
+        )
+        if orders:
+            self._insert_orders(customer_id, orders)
+        return 1
+
+    def _update_order(self, customer_id: str, order_id: str, fields: dict) -> int:
+        columns = order_columns(fields)
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        return self._execute(
+            f"UPDATE orders SET {assignments} WHERE id = ? AND customer_id = ?",
+            (*columns.values(), order_id, customer_id),
+            "update",
+        ).rowcount
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        with self.transaction():
+            matched = self._update_order(str(customer.id), order_id, fields)
+        self._forget_orders(str(customer.id))
+        return update_result(matched)
+
+    def upload_order_for_customer(
+        self, customer: Customer, order: Order
+    ) -> InsertOneResult:
+        document = to_document(order)
+        with self.transaction():
+            self._insert_orders(str(customer.id), [document])
+        self._forget_orders(str(customer.id))
+        return InsertOneResult(document["id"], True)
+
+    def upload_orders_for_customer(
+        self, customer: Customer, orders: List[Order]
+    ) -> UpdateResult:
+        return self.update_entity(customer, "orders", to_documents(orders))
+
+    def upload_orders_for_customer_json(
+        self, customer: Customer, orders: List
+    ) -> UpdateResult:
+        return self.update_entity(customer, "orders", orders)
+
+    def delete_order(self, order: Order) -> DeleteResult:
+        return self.delete_entity(order)
+
+    def _orders(self, customer_id: str) -> List[dict]:
+        rows = self._execute(
+            f"{SELECT_ORDERS} WHERE o.customer_id = ? ORDER BY o.created_at, o.id",
+            (customer_id,),
+        ).fetchall()
+        return [order_document(row) for row in rows]
+
+    def get_order_by_id(self, customer: Customer, order_id: str) -> Union[dict, None]:
+        row = self._execute(
+            f"{SELECT_ORDERS} WHERE o.id = ? AND o.customer_id = ?",
+            (order_id, str(customer.id)),
+        ).fetchone()
+        return None if row is None else order_document(row)
+
+    def get_orders_by_customer(self, customer) -> List[dict]:
+        return self._orders(str(customer.id))
+
+    def get_orders_page(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[OrderCursor]]:
+        conditions = ["o.customer_id = ?"]
+        parameters: List[Any] = [str(customer.id)]
+        if statuses:
+            conditions.append(f"o.status IN ({', '.join('?' * len(statuses))})")
+            parameters += statuses
+        if cursor is not None:
+            conditions.append("(o.created_at < ? OR (o.created_at = ? AND o.id < ?))")
+            parameters += [cursor.created_at, cursor.created_at, cursor.id]
+        rows = self._execute(
+            f"{SELECT_ORDERS} WHERE {' AND '.join(conditions)}"
+            " ORDER BY o.created_at DESC, o.id DESC LIMIT ?",
+            (*parameters, limit + 1),
+        ).fetchall()
+        return split_page([order_document(row) for row in rows], limit)
+
+    def _customer_from_document(self, result: Optional[dict]) -> Optional[Customer]:
+        if result is None:
+            return None
+        customer = from_trusted_document(Customer, result)
+        customer.defer_orders(
+            lambda: [
+                from_trusted_document(Order, order)
+                for order in self.get_orders_by_customer(customer)
+            ]
+        )
+        return customer
+
+    def upload_customer(self, customer: Customer) -> InsertOneResult:
+        try:
+            return self.upload_entity(customer)
+        except sqlite3.IntegrityError as e:
+            if not is_duplicate_customer(e):
+                raise e
+            raise CustomerExistsException from e
+
+    def get_customer_by_email(self, email: str) -> Union[Customer, None]:
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "email", email, CUSTOMER_PROJECTION)
+        )
+
+    def get_customer_by_phone(self, phone: str) -> Union[Customer, None]:
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "phone", phone, CUSTOMER_PROJECTION)
+        )
+
+    def delete_customer(self, customer: Customer) -> DeleteResult:
+        return self.delete_entity(customer)
+
+    def get_customer_by_id(self, user_id: str):
+        return self._customer_from_document(
+            self.get_one_result_by_field(Customer, "id", user_id, CUSTOMER_PROJECTION)
+        )
+
+    def update_order_status(self, customer: Customer, order: Order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"status": order.status.value}
+        )
+
+    def update_order_solution_params(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        return self.update_order_fields(
+            customer,
+            str(order.id),
+            {
+                "driver": to_document(order.driver),
+                "cost": order.cost,
+                "time": order.time,
+            },
+        )
+
+    def update_order_expected_date(self, customer, order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"expected_date": order.expected_date}
+        )
+
+    def update_ready_date(self, customer, order) -> UpdateResult:
+        return self.update_order_fields(
+            customer, str(order.id), {"ready_date": order.ready_date}
+        )
+
+    def _count_by_status(self, table: str) -> Dict[str, int]:
+        rows = self._execute(
+            f"SELECT status, COUNT(*) AS count FROM {table} GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["count"] for row in rows}
+
+    def count_orders_by_status(self) -> Dict[str, int]:
+        return self._count_by_status("orders")
+
+
+def create_sqlite_base() -> SqliteBase:
+    return SqliteBase(
+        path=os.environ.get("SQLITE_PATH", "barathrum.sqlite3"),
+        timeout=float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5)),
+    )
@@ -0,0 +1,91 @@
+from typing import Dict, List
+
+from pymongo.results import DeleteResult, InsertManyResult, UpdateResult
+
+from barathrum.controller.db.memory_tables import delete_result, update_result
+from barathrum.controller.db.storage import (
+    VACANT_DRIVER_STATUSES,
+    DriverIsBusyException,
+)
+from barathrum.controller.db.sqlite_schema import SELECT_DRIVERS, driver_document
+from barathrum.controller.scoring import DriverPool
+from barathrum.models.codec import from_trusted_document
+from barathrum.models.entities import Driver, DriverStatuses, Order, Solution
+
+
+class SqliteDriverStore:
+    def get_vacant_drivers(self) -> List[Driver]:
+        rows = self._execute(
+            f"{SELECT_DRIVERS} WHERE d.status IN (?, ?) LIMIT 10",
+            tuple(VACANT_DRIVER_STATUSES),
+        ).fetchall()
+        return [from_trusted_document(Driver, driver_document(row)) for row in rows]
+
+    def get_vacant_driver_pool(self) -> DriverPool:
+        rows = self._execute(
+            "SELECT id, qualification, experience, status FROM drivers"
+            " WHERE status IN (?, ?)",
+            tuple(VACANT_DRIVER_STATUSES),
+        ).fetchall()
+        return DriverPool.from_documents([dict(row) for row in rows])
+
+    def get_drivers_by_ids(self, driver_ids: List[str]) -> List[Driver]:
+        if not driver_ids:
+            return []
+        rows = self._execute(
+            f"{SELECT_DRIVERS} WHERE d.id IN ({', '.join('?' * len(driver_ids))})",
+            tuple(driver_ids),
+        ).fetchall()
+        drivers = {
+            row["id"]: from_trusted_document(Driver, driver_document(row))
+            for row in rows
+        }
+        return [drivers[driver_id] for driver_id in driver_ids if driver_id in drivers]
+
+    def upload_solutions(self, solutions: List[Solution]) -> InsertManyResult:
+        return self.upload_entities(solutions)
+
+    def update_driver_status(self, driver: Driver) -> UpdateResult:
+        return self.update_entity(driver, "status", driver.status.value)
+
+    def update_drivers_status(
+        self, drivers: List[Driver], status: DriverStatuses
+    ) -> UpdateResult:
+        with self.transaction():
+            cursor = self._execute_many(
+                "UPDATE drivers SET status = ? WHERE id = ?",
+                [(status.value, str(driver.id)) for driver in drivers],
+                "update",
+            )
+        return update_result(cursor.rowcount)
+
+    def book_drivers(self, driver_ids: List[str]) -> None:
+        busy = DriverStatuses.IS_BUSY.value
+        with self.transaction():
+            for driver_id in driver_ids:
+                cursor = self._execute(
+                    "UPDATE drivers SET status = ? WHERE id = ? AND status != ?",
+                    (busy, driver_id, busy),
+                    "update",
+                )
+                if cursor.rowcount == 0:
+                    raise DriverIsBusyException(driver_id)
+
+    def get_solutions_by_order_id(self, order_id: str) -> List[dict]:
+        return self.get_results_by_field(Solution, "order", order_id)
+
+    def get_solution_by_id(self, solution_id: str) -> dict:
+        return self.get_one_result_by_field(Solution, "id", solution_id)
+
+    def get_driver_by_id(self, driver_id: str) -> dict:
+        return self.get_one_result_by_field(Driver, "id", driver_id)
+
+    def delete_solutions_by_order(self, order: Order) -> DeleteResult:
+        with self.transaction():
+            cursor = self._execute(
+                "DELETE FROM solutions WHERE order_id = ?", (str(order.id),), "delete"
+            )
+        return delete_result(cursor.rowcount)
+
+    def count_drivers_by_status(self) -> Dict[str, int]:
+        return self._count_by_status("drivers")
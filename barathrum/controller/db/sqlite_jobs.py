@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Optional
+
+from pymongo.results import UpdateResult
+
+from barathrum.controller.db.memory_tables import update_result
+from barathrum.controller.db.storage import ACTIVE_SOLUTION_JOB_STATUSES
+from barathrum.controller.db.sqlite_schema import (
+    INSERT_JOB,
+    SELECT_JOBS,
+    job_document,
+    job_parameters,
+)
+from barathrum.models.codec import to_document
+from barathrum.models.entities import Customer, SolutionJob, SolutionJobStatuses
+
+
+class SqliteSolutionJobQueue:
+    def _job(self, job_id: str) -> Optional[dict]:
+        row = self._execute(f"{SELECT_JOBS} WHERE j.id = ?", (job_id,)).fetchone()
+        return None if row is None else job_document(row)
+
+    def enqueue_solution_job(self, customer: Customer, order_id: str) -> dict:
+        with self.transaction():
+            row = self._execute(
+                f"{SELECT_JOBS} WHERE j.order_id = ? AND j.status IN (?, ?) LIMIT 1",
+                (order_id, *ACTIVE_SOLUTION_JOB_STATUSES),
+            ).fetchone()
+            if row is not None:
+                return job_document(row)
+            job = to_document(SolutionJob(order=order_id, customer=str(customer.id)))
+            self._execute(INSERT_JOB, job_parameters(job), "insert")
+        return job
+
+    def claim_solution_job(self, worker: str) -> Optional[dict]:
+        with self.transaction():
+            row = self._execute(
+                "SELECT id FROM solution_jobs WHERE status = ?"
+                " ORDER BY created_at LIMIT 1",
+                (SolutionJobStatuses.PENDING.value,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._execute(
+                "UPDATE solution_jobs SET status = ?, started_at = ?, worker = ?"
+                " WHERE id = ?",
+                (
+                    SolutionJobStatuses.RUNNING.value,
+                    datetime.now().isoformat(),
+                    worker,
+                    row["id"],
+                ),
+                "update",
+            )
+            return self._job(row["id"])
+
+    def finish_solution_job(
+        self, job_id: str, status: SolutionJobStatuses, error: Optional[str] = None
+    ) -> UpdateResult:
+        with self.transaction():
+            cursor = self._execute(
+                "UPDATE solution_jobs SET status = ?, finished_at = ?, error = ?"
+                " WHERE id = ?",
+                (status.value, datetime.now().isoformat(), error, job_id),
+                "update",
+            )
+        return update_result(cursor.rowcount)
+
+    def requeue_stale_solution_jobs(self, started_before: datetime) -> UpdateResult:
+        with self.transaction():
+            cursor = self._execute(
+                "UPDATE solution_jobs SET status = ?, started_at = NULL, worker = NULL"
+                " WHERE status = ? AND started_at < ?",
+                (
+                    SolutionJobStatuses.PENDING.value,
+                    SolutionJobStatuses.RUNNING.value,
+                    started_before.isoformat(),
+                ),
+                "update",
+            )
+        return update_result(cursor.rowcount)
+
+    def get_solution_job(self, job_id: str) -> Optional[dict]:
+        return self._job(job_id)
+
+    def count_solution_jobs(self, status: SolutionJobStatuses) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM solution_jobs WHERE status = ?", (status.value,)
+        ).fetchone()[0]
@@ -0,0 +1,343 @@
+import sqlite3
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+from barathrum.models.entities import Customer, Driver, Order, Solution, SolutionJob
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    name TEXT NOT NULL,
+    second_name TEXT NOT NULL,
+    middle_name TEXT,
+    email TEXT NOT NULL UNIQUE,
+    phone TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drivers (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    name TEXT NOT NULL,
+    second_name TEXT NOT NULL,
+    middle_name TEXT,
+    qualification TEXT NOT NULL,
+    experience INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS drivers_status ON drivers (status);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    customer_id TEXT NOT NULL REFERENCES customers (id) ON DELETE CASCADE,
+    created_at TEXT NOT NULL,
+    address_from TEXT NOT NULL,
+    address_to TEXT NOT NULL,
+    cargo_id TEXT NOT NULL,
+    cargo_created_at TEXT NOT NULL,
+    cargo_type TEXT NOT NULL,
+    width REAL NOT NULL,
+    length REAL NOT NULL,
+    height REAL NOT NULL,
+    weight REAL NOT NULL,
+    status TEXT NOT NULL,
+    driver_id TEXT,
+    driver_created_at TEXT,
+    driver_name TEXT,
+    driver_second_name TEXT,
+    driver_middle_name TEXT,
+    driver_qualification TEXT,
+    driver_experience INTEGER,
+    driver_status TEXT,
+    end_date TEXT,
+    cost REAL,
+    time INTEGER,
+    expected_date TEXT,
+    ready_date TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_customer_created
+    ON orders (customer_id, created_at, id);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status);
+CREATE TABLE IF NOT EXISTS solutions (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    driver_id TEXT NOT NULL,
+    driver_created_at TEXT NOT NULL,
+    driver_name TEXT NOT NULL,
+    driver_second_name TEXT NOT NULL,
+    driver_middle_name TEXT,
+    driver_qualification TEXT NOT NULL,
+    driver_experience INTEGER NOT NULL,
+    driver_status TEXT NOT NULL,
+    cost REAL NOT NULL,
+    time INTEGER NOT NULL,
+    pool_fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS solutions_order ON solutions (order_id);
+CREATE TABLE IF NOT EXISTS solution_jobs (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    customer_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    worker TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS solution_jobs_status_created
+    ON solution_jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS solution_jobs_order_status
+    ON solution_jobs (order_id, status);
+"""
+
+CUSTOMER_COLUMNS = (
+    "id",
+    "created_at",
+    "name",
+    "second_name",
+    "middle_name",
+    "email",
+    "phone",
+    "password",
+)
+DRIVER_COLUMNS = (
+    "id",
+    "created_at",
+    "name",
+    "second_name",
+    "middle_name",
+    "qualification",
+    "experience",
+    "status",
+)
+# Заказы и решения хранят копию водителя, как документы в MongoDB: последующие
+# изменения водителя не меняют уже назначенный заказ и выданные решения
+DRIVER_SNAPSHOT_COLUMNS = tuple(f"driver_{column}" for column in DRIVER_COLUMNS)
+CARGO_COLUMNS = ("cargo_type", "width", "length", "height", "weight")
+ORDER_COLUMNS = (
+    "id",
+    "customer_id",
+    "created_at",
+    "address_from",
+    "address_to",
+    "cargo_id",
+    "cargo_created_at",
+    *CARGO_COLUMNS,
+    "status",
+    *DRIVER_SNAPSHOT_COLUMNS,
+    "end_date",
+    "cost",
+    "time",
+    "expected_date",
+    "ready_date",
+)
+ORDER_FIELDS = (
+    "address_from",
+    "address_to",
+    "status",
+    "end_date",
+    "cost",
+    "time",
+    "expected_date",
+    "ready_date",
+)
+SOLUTION_COLUMNS = (
+    "id",
+    "created_at",
+    "order_id",
+    *DRIVER_SNAPSHOT_COLUMNS,
+    "cost",
+    "time",
+    "pool_fingerprint",
+)
+JOB_COLUMNS = (
+    "id",
+    "created_at",
+    "order_id",
+    "customer_id",
+    "status",
+    "started_at",
+    "finished_at",
+    "worker",
+    "error",
+)
+JOB_FIELDS = {"order": "order_id", "customer": "customer_id"}
+CUSTOMER_UNIQUE_COLUMNS = ("customers.email", "customers.phone")
+
+SELECT_CUSTOMERS = f"SELECT {', '.join(CUSTOMER_COLUMNS)} FROM customers AS c"
+SELECT_DRIVERS = f"SELECT {', '.join(DRIVER_COLUMNS)} FROM drivers AS d"
+SELECT_ORDERS = f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders AS o"
+SELECT_SOLUTIONS = f"SELECT {', '.join(SOLUTION_COLUMNS)} FROM solutions AS s"
+SELECT_JOBS = f"SELECT {', '.join(JOB_COLUMNS)} FROM solution_jobs AS j"
+
+INSERT_CUSTOMER = (
+    f"INSERT INTO customers ({', '.join(CUSTOMER_COLUMNS)})"
+    f" VALUES ({', '.join('?' * len(CUSTOMER_COLUMNS))})"
+)
+INSERT_DRIVER = (
+    f"INSERT INTO drivers ({', '.join(DRIVER_COLUMNS)})"
+    f" VALUES ({', '.join('?' * len(DRIVER_COLUMNS))})"
+)
+INSERT_ORDER = (
+    f"INSERT INTO orders ({', '.join(ORDER_COLUMNS)})"
+    f" VALUES ({', '.join('?' * len(ORDER_COLUMNS))})"
+)
+INSERT_SOLUTION = (
+    f"INSERT INTO solutions ({', '.join(SOLUTION_COLUMNS)})"
+    f" VALUES ({', '.join('?' * len(SOLUTION_COLUMNS))})"
+)
+INSERT_JOB = (
+    f"INSERT INTO solution_jobs ({', '.join(JOB_COLUMNS)})"
+    f" VALUES ({', '.join('?' * len(JOB_COLUMNS))})"
+)
+
+
+def column_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def driver_parameters(document: dict) -> tuple:
+    return tuple(column_value(document.get(column)) for column in DRIVER_COLUMNS)
+
+
+def driver_document(row: sqlite3.Row, prefix: str = "") -> dict:
+    return {column: row[prefix + column] for column in DRIVER_COLUMNS}
+
+
+def driver_snapshot(document: Optional[dict]) -> dict:
+    document = document or {}
+    return {
+        f"driver_{column}": column_value(document.get(column))
+        for column in DRIVER_COLUMNS
+    }
+
+
+def customer_document(row: sqlite3.Row) -> dict:
+    return {column: row[column] for column in CUSTOMER_COLUMNS}
+
+
+def order_parameters(customer_id: str, document: dict) -> tuple:
+    values = {
+        **document,
+        **document["cargo"],
+        "id": document["id"],
+        "created_at": document["created_at"],
+        "cargo_id": document["cargo"]["id"],
+        "cargo_created_at": document["cargo"]["created_at"],
+        "customer_id": customer_id,
+        **driver_snapshot(document.get("driver")),
+    }
+    return tuple(column_value(values.get(column)) for column in ORDER_COLUMNS)
+
+
+def order_document(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "cargo": {
+            "id": row["cargo_id"],
+            "created_at": row["cargo_created_at"],
+            **{column: row[column] for column in CARGO_COLUMNS},
+        },
+        "driver": driver_document(row, "driver_") if row["driver_id"] else None,
+        **{field: row[field] for field in ORDER_FIELDS},
+    }
+
+
+def is_duplicate_customer(error: sqlite3.IntegrityError) -> bool:
+    message = str(error)
+    return message.startswith("UNIQUE constraint failed:") and any(
+        message.endswith(column) for column in CUSTOMER_UNIQUE_COLUMNS
+    )
+
+
+def solution_parameters(document: dict) -> tuple:
+    values = {
+        **document,
+        "order_id": document["order"],
+        **driver_snapshot(document["driver"]),
+    }
+    return tuple(column_value(values.get(column)) for column in SOLUTION_COLUMNS)
+
+
+def solution_document(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "order": row["order_id"],
+        "driver": driver_document(row, "driver_"),
+        "cost": row["cost"],
+        "time": row["time"],
+        "pool_fingerprint": row["pool_fingerprint"],
+    }
+
+
+def job_parameters(document: dict) -> tuple:
+    values = {
+        **document,
+        "order_id": document["order"],
+        "customer_id": document["customer"],
+    }
+    return tuple(column_value(values.get(column)) for column in JOB_COLUMNS)
+
+
+def job_document(row: sqlite3.Row) -> dict:
+    document = {column: row[column] for column in JOB_COLUMNS}
+    document["order"] = document.pop("order_id")
+    document["customer"] = document.pop("customer_id")
+    return document
+
+
+def order_columns(fields: dict) -> Dict[str, Any]:
+    columns = {}
+    for field, value in fields.items():
+        if field == "driver":
+            columns.update(driver_snapshot(value))
+        elif field == "cargo":
+            columns.update({column: value[column] for column in CARGO_COLUMNS})
+            columns["cargo_id"] = value["id"]
+            columns["cargo_created_at"] = column_value(value["created_at"])
+        elif field in ORDER_FIELDS:
+            columns[field] = column_value(value)
+        else:
+            raise ValueError(f"Unknown order field {field}")
+    return columns
+
+
+# Колонки, по которым разрешён поиск через get_one_result_by_field
+SEARCHABLE = {
+    Customer: (SELECT_CUSTOMERS, "c", {"id": "id", "email": "email", "phone": "phone"}),
+    Driver: (SELECT_DRIVERS, "d", {"id": "id", "status": "status"}),
+    Order: (SELECT_ORDERS, "o", {"id": "id", "status": "status"}),
+    Solution: (SELECT_SOLUTIONS, "s", {"id": "id", "order": "order_id"}),
+    SolutionJob: (
+        SELECT_JOBS,
+        "j",
+        {"id": "id", "order": "order_id", "status": "status"},
+    ),
+}
+DOCUMENTS: Dict[type, Callable[[sqlite3.Row], dict]] = {
+    Customer: customer_document,
+    Driver: lambda row: driver_document(row),
+    Order: order_document,
+    Solution: solution_document,
+    SolutionJob: job_document,
+}
+TABLES = {
+    Customer: "customers",
+    Driver: "drivers",
+    Order: "orders",
+    Solution: "solutions",
+    SolutionJob: "solution_jobs",
+}
+UPDATABLE = {
+    Customer: {"name", "second_name", "middle_name", "email", "phone", "password"},
+    Driver: {"name", "second_name", "middle_name", "qualification", "experience"}
+    | {"status"},
+}
@@ -0,0 +1,255 @@
+import os
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Type,
+    Union,
+)
+
+from pymongo.results import (
+    BulkWriteResult,
+    DeleteResult,
+    InsertManyResult,
+    InsertOneResult,
+    UpdateResult,
+)
+
+from barathrum.controller.db.client import PoolMonitor
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.operations import OperationCounter
+from barathrum.controller.db.pagination import OrderCursor
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.controller.scoring import DriverPool
+from barathrum.models.entities import (
+    BaseModel,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    Solution,
+    SolutionJobStatuses,
+)
+
+STORAGE_MONGO = "mongo"
+STORAGE_MEMORY = "memory"
+STORAGE_SQLITE = "sqlite"
+
+VACANT_DRIVER_STATUSES = [
+    DriverStatuses.IS_WAITING.value,
+    DriverStatuses.IS_CANDIDATE.value,
+]
+ACTIVE_SOLUTION_JOB_STATUSES = [
+    SolutionJobStatuses.PENDING.value,
+    SolutionJobStatuses.RUNNING.value,
+]
+CUSTOMER_PROJECTION = {"orders": 0}
+
+
+class CustomerExistsException(Exception):
+    pass
+
+
+class DriverIsBusyException(Exception):
+    pass
+
+
+class Storage(Protocol):
+    operations: OperationCounter
+    pool: PoolMonitor
+    identity_map_provider: Callable[[], Optional[IdentityMap]]
+    change_listeners: List[Callable[[str, str], None]]
+
+    def unit_of_work(self) -> UnitOfWork:
+        ...
+
+    def transaction(self) -> ContextManager[Any]:
+        ...
+
+    def flush_unit_of_work(self, uow: UnitOfWork) -> None:
+        ...
+
+    def ensure_indexes(self) -> Dict[str, List[str]]:
+        ...
+
+    def upload_entity(self, entity: BaseModel) -> InsertOneResult:
+        ...
+
+    def upload_entities(self, entities: List[BaseModel]) -> InsertManyResult:
+        ...
+
+    def delete_entity(self, entity: BaseModel) -> DeleteResult:
+        ...
+
+    def get_one_result_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> dict:
+        ...
+
+    def get_results_by_field(
+        self,
+        entity: Type[BaseModel],
+        field: str,
+        value: Union[str, float, int],
+        projection: Optional[dict] = None,
+    ) -> List[dict]:
+        ...
+
+    def update_entity(
+        self, entity: BaseModel, field: str, value: Union[str, float, int, List]
+    ) -> UpdateResult:
+        ...
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> UpdateResult:
+        ...
+
+    def upload_order_for_customer(
+        self, customer: Customer, order: Order
+    ) -> Union[UpdateResult, InsertOneResult]:
+        ...
+
+    def upload_orders_for_customer(
+        self, customer: Customer, orders: List[Order]
+    ) -> Union[UpdateResult, BulkWriteResult, None]:
+        ...
+
+    def upload_orders_for_customer_json(
+        self, customer: Customer, orders: List
+    ) -> Union[UpdateResult, BulkWriteResult, None]:
+        ...
+
+    def get_order_by_id(self, customer: Customer, order_id: str) -> Union[dict, None]:
+        ...
+
+    def get_orders_by_customer(self, customer) -> List[dict]:
+        ...
+
+    def get_orders_page(
+        self,
+        customer: Customer,
+        limit: int,
+        cursor: Optional[OrderCursor] = None,
+        statuses: Optional[List[str]] = None,
+    ) -> Tuple[List[dict], Optional[OrderCursor]]:
+        ...
+
+    def upload_customer(self, customer: Customer) -> InsertOneResult:
+        ...
+
+    def get_customer_by_email(self, email: str) -> Union[Customer, None]:
+        ...
+
+    def get_customer_by_phone(self, phone: str) -> Union[Customer, None]:
+        ...
+
+    def get_customer_by_id(self, user_id: str) -> Union[Customer, None]:
+        ...
+
+    def delete_customer(self, customer: Customer) -> DeleteResult:
+        ...
+
+    def update_order_status(self, customer: Customer, order: Order) -> UpdateResult:
+        ...
+
+    def get_vacant_drivers(self) -> List[Driver]:
+        ...
+
+    def get_vacant_driver_pool(self) -> DriverPool:
+        ...
+
+    def get_drivers_by_ids(self, driver_ids: List[str]) -> List[Driver]:
+        ...
+
+    def upload_solutions(self, solutions: List[Solution]) -> InsertManyResult:
+        ...
+
+    def update_driver_status(self, driver: Driver) -> UpdateResult:
+        ...
+
+    def update_drivers_status(
+        self, drivers: List[Driver], status: DriverStatuses
+    ) -> UpdateResult:
+        ...
+
+    def book_drivers(self, driver_ids: List[str]) -> None:
+        ...
+
+    def get_solutions_by_order_id(self, order_id: str) -> List[dict]:
+        ...
+
+    def get_solution_by_id(self, solution_id: str) -> dict:
+        ...
+
+    def get_driver_by_id(self, driver_id: str) -> dict:
+        ...
+
+    def update_order_solution_params(
+        self, customer: Customer, order: Order
+    ) -> UpdateResult:
+        ...
+
+    def delete_solutions_by_order(self, order: Order) -> DeleteResult:
+        ...
+
+    def update_order_expected_date(self, customer, order) -> UpdateResult:
+        ...
+
+    def update_ready_date(self, customer, order) -> UpdateResult:
+        ...
+
+    def enqueue_solution_job(self, customer: Customer, order_id: str) -> dict:
+        ...
+
+    def claim_solution_job(self, worker: str) -> Optional[dict]:
+        ...
+
+    def finish_solution_job(
+        self, job_id: str, status: SolutionJobStatuses, error: Optional[str] = None
+    ) -> UpdateResult:
+        ...
+
+    def requeue_stale_solution_jobs(self, started_before: datetime) -> UpdateResult:
+        ...
+
+    def get_solution_job(self, job_id: str) -> Optional[dict]:
+        ...
+
+    def count_solution_jobs(self, status: SolutionJobStatuses) -> int:
+        ...
+
+    def count_drivers_by_status(self) -> Dict[str, int]:
+        ...
+
+    def count_orders_by_status(self) -> Dict[str, int]:
+        ...
+
+
+def create_storage(storage: Optional[str] = None, **client_options) -> Storage:
+    # Хранилища импортируются здесь: они сами импортируют этот модуль, а выбранный
+    # STORAGE=memory или sqlite не должен тянуть за собой MongoBase
+    storage = storage or os.environ.get("STORAGE", STORAGE_MONGO)
+    if storage == STORAGE_MEMORY:
+        from barathrum.controller.db.memory import MemoryBase
+
+        return MemoryBase()
+    if storage == STORAGE_SQLITE:
+        from barathrum.controller.db.sqlite import create_sqlite_base
+
+        return create_sqlite_base()
+    if storage != STORAGE_MONGO:
+        raise ValueError(f"Unknown storage {storage}")
+    from barathrum.controller.db.mongo_orders import create_mongo_base
+
+    return create_mongo_base(**client_options)
@@ -0,0 +1,123 @@
+import logging
+from typing import Dict, List, Tuple
+
+
+from barathrum.models.codec import to_document
+from barathrum.models.entities import (
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    Solution,
+)
+
+logger = logging.getLogger("barathrum")
+
+
+class UnitOfWork:
+    def __init__(self, database):
+        self.database = database
+        self.order_fields: Dict[Tuple[str, str], dict] = {}
+        self.driver_statuses: Dict[str, str] = {}
+        self.booked_drivers: List[str] = []
+        self.deleted_solution_orders: List[str] = []
+        self.inserted_solutions: List[Solution] = []
+
+    def __enter__(self) -> "UnitOfWork":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            logger.info(f"Discarding unit of work after {exc_type.__name__}")
+            self.clear()
+
+    def is_empty(self) -> bool:
+        return not (
+            self.order_fields
+            or self.driver_statuses
+            or self.booked_drivers
+            or self.deleted_solution_orders
+            or self.inserted_solutions
+        )
+
+    def clear(self) -> None:
+        self.order_fields = {}
+        self.driver_statuses = {}
+        self.booked_drivers = []
+        self.deleted_solution_orders = []
+        self.inserted_solutions = []
+
+    def flush(self) -> None:
+        if not self.is_empty():
+            self.database.flush_unit_of_work(self)
+        self.clear()
+
+    def update_order_fields(
+        self, customer: Customer, order_id: str, fields: dict
+    ) -> None:
+        self.order_fields.setdefault((str(customer.id), order_id), {}).update(fields)
+
+    def update_order_status(self, customer: Customer, order: Order) -> None:
+        self.update_order_fields(
+            customer, str(order.id), {"status": order.status.value}
+        )
+
+    def update_order_solution_params(self, customer: Customer, order: Order) -> None:
+        self.update_order_fields(
+            customer,
+            str(order.id),
+            {
+                "driver": to_document(order.driver),
+                "cost": order.cost,
+                "time": order.time,
+            },
+        )
+
+    def update_order_expected_date(self, customer: Customer, order: Order) -> None:
+        self.update_order_fields(
+            customer, str(order.id), {"expected_date": order.expected_date}
+        )
+
+    def update_ready_date(self, customer: Customer, order: Order) -> None:
+        self.update_order_fields(
+            customer, str(order.id), {"ready_date": order.ready_date}
+        )
+
+    def update_driver_status(self, driver: Driver) -> None:
+        self.driver_statuses[str(driver.id)] = driver.status.value
+
+    def update_drivers_status(
+        self, drivers: List[Driver], status: DriverStatuses
+    ) -> None:
+        for driver in drivers:
+            self.driver_statuses[str(driver.id)] = status.value
+
+    def book_driver(self, driver: Driver) -> None:
+        # Хранилище занимает водителя условным обновлением и бросает
+        # DriverIsBusyException, если его уже занял другой заказ
+        self.booked_drivers.append(str(driver.id))
+
+    def delete_solutions_by_order(self, order: Order) -> None:
+        self.deleted_solution_orders.append(str(order.id))
+
+    def upload_solutions(self, solutions: List[Solution]) -> None:
+        self.inserted_solutions += solutions
+
+
+class AsyncUnitOfWork(UnitOfWork):
+    async def __aenter__(self) -> "AsyncUnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            await self.flush()
+        else:
+            logger.info(f"Discarding unit of work after {exc_type.__name__}")
+            self.clear()
+
+    async def flush(self) -> None:
+        if not self.is_empty():
+            await self.database.flush_unit_of_work(self)
+        self.clear()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable
+
+from bcrypt import checkpw, gensalt, hashpw
+
+
+class PasswordHasherBusyException(Exception):
+    pass
+
+
+@dataclass
+class PasswordHasherStats:
+    hashed: int = 0
+    verified: int = 0
+    rejected: int = 0
+    pending: int = 0
+    hash_seconds: float = 0.0
+
+    @property
+    def average_hash_time(self) -> float:
+        operations = self.hashed + self.verified
+        return self.hash_seconds / operations if operations else 0.0
+
+
+def hash_rounds(hashed: str) -> int:
+    return int(hashed.split("$")[2])
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        rounds: int = 12,
+        workers: int = 2,
+        max_pending: int = 16,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._stats = PasswordHasherStats()
+        self._lock = threading.Lock()
+
+    def submit(self, function: Callable[..., Any], *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats.rejected += 1
+            raise PasswordHasherBusyException
+        with self._lock:
+            self._stats.pending += 1
+        try:
+            future = self._executor.submit(self._timed, function, *args)
+        except RuntimeError:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self) -> None:
+        with self._lock:
+            self._stats.pending -= 1
+        self._slots.release()
+
+    def _timed(self, function: Callable[..., Any], *args) -> Any:
+        started = self._clock()
+        try:
+            return function(*args)
+        finally:
+            elapsed = self._clock() - started
+            with self._lock:
+                self._stats.hash_seconds += elapsed
+
+    def _hash(self, password: str) -> str:
+        hashed = hashpw(password.encode("utf-8"), gensalt(self.rounds)).decode("utf-8")
+        with self._lock:
+            self._stats.hashed += 1
+        return hashed
+
+    def _verify(self, password: str, hashed: str) -> bool:
+        verified = checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+        with self._lock:
+            self._stats.verified += 1
+        return verified
+
+    def hash(self, password: str) -> str:
+        return self.submit(self._hash, password).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.submit(self._verify, password, hashed).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(self._hash, password))
+
+    async def verify_async(self, password: str, hashed: str) -> bool:
+        return await asyncio.wrap_future(self.submit(self._verify, password, hashed))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    def stats(self) -> PasswordHasherStats:
+        with self._lock:
+            return replace(self._stats)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def create_password_hasher() -> PasswordHasher:
+    workers = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    return PasswordHasher(
+        rounds=int(os.environ.get("BCRYPT_ROUNDS", 12)),
+        workers=workers,
+        max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", workers * 8)),
+    )
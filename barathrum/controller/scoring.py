@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from hashlib import sha1
+from typing import List
+
+import numpy as np
+
+from barathrum.models.entities import Cargo, Driver, DriverStatuses
+
+BASE_COST = 400
+QUALIFICATION_BASE = 300
+CARGO_BASE = 300
+MAX_EXPERIENCE = 60
+
+QUALIFICATION_RATES = Driver._qualification_rate_map
+
+
+def drivers_fingerprint(drivers: List[Driver]) -> str:
+    states = sorted(
+        f"{driver.id}:{DriverStatuses(driver.status).value}" for driver in drivers
+    )
+    return sha1("\n".join(states).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class DriverPool:
+    ids: np.ndarray
+    qualification_rates: np.ndarray
+    experience: np.ndarray
+    is_candidate: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_documents(cls, documents: List[dict]) -> "DriverPool":
+        count = len(documents)
+        return cls(
+            ids=np.array([document["id"] for document in documents], dtype=object),
+            qualification_rates=np.fromiter(
+                (
+                    QUALIFICATION_RATES[document["qualification"]]
+                    for document in documents
+                ),
+                dtype=np.float64,
+                count=count,
+            ),
+            experience=np.fromiter(
+                (document["experience"] for document in documents),
+                dtype=np.float64,
+                count=count,
+            ),
+            is_candidate=np.fromiter(
+                (
+                    document["status"] == DriverStatuses.IS_CANDIDATE.value
+                    for document in documents
+                ),
+                dtype=bool,
+                count=count,
+            ),
+        )
+
+
+@dataclass
+class RankedDrivers:
+    ids: List[str]
+    costs: List[float]
+    scores: List[float]
+
+
+class ScoringEngine:
+    def __init__(self, k: int = 10, candidate_penalty: float = 0.9):
+        self.k = k
+        self.candidate_penalty = candidate_penalty
+
+    @staticmethod
+    def costs(pool: DriverPool, cargo: Cargo) -> np.ndarray:
+        return (
+            BASE_COST
+            + QUALIFICATION_BASE * pool.qualification_rates
+            + CARGO_BASE * cargo.get_cargo_type_rate()
+        )
+
+    def scores(self, pool: DriverPool, costs: np.ndarray) -> np.ndarray:
+        value = pool.qualification_rates + pool.experience / MAX_EXPERIENCE
+        scores = value / costs
+        return np.where(pool.is_candidate, scores * self.candidate_penalty, scores)
+
+    def rank(self, pool: DriverPool, cargo: Cargo) -> RankedDrivers:
+        if not len(pool) or self.k <= 0:
+            return RankedDrivers(ids=[], costs=[], scores=[])
+        costs = self.costs(pool, cargo)
+        scores = self.scores(pool, costs)
+        k = min(self.k, len(pool))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return RankedDrivers(
+            ids=pool.ids[best].tolist(),
+            costs=costs[best].tolist(),
+            scores=scores[best].tolist(),
+        )
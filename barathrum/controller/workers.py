@@ -0,0 +1,190 @@
+import logging
+import logging.config
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from barathrum.config import LOGGING_CONFIG
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.storage import create_storage
+from barathrum.models.entities import Customer, SolutionJobStatuses
+
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger("barathrum")
+
+
+@dataclass
+class WorkerStats:
+    workers: int
+    queue_depth: int
+    running: int
+    completed: int
+    failed: int
+    average_wait: float
+    average_run: float
+    utilization: float
+
+
+class SolutionWorkerPool:
+    def __init__(
+        self,
+        controller: Controller,
+        workers: int = 2,
+        poll_interval: float = 1.0,
+        stale_after: float = 300.0,
+        requeue_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.controller = controller
+        self.database = controller.database
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.requeue_interval = requeue_interval
+        self._clock = clock
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._started_at = clock()
+        self._next_requeue = clock()
+        self._completed = 0
+        self._failed = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def start(self) -> None:
+        self._stopping.clear()
+        self._started_at = self._clock()
+        self._next_requeue = self._clock()
+        self.requeue_stale_jobs()
+        for number in range(self.workers):
+            thread = threading.Thread(
+                target=self._work,
+                args=(f"{os.getpid()}-{number}",),
+                name=f"solution-worker-{number}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, customer: Customer, order_id: str) -> dict:
+        job = self.database.enqueue_solution_job(customer, order_id)
+        self.notify()
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        return self.database.get_solution_job(job_id)
+
+    def requeue_stale_jobs(self) -> int:
+        # Задачу упавшего воркера возвращаем в очередь не только при запуске,
+        # иначе она висела бы «Выполняется» до следующего рестарта
+        with self._lock:
+            if self._clock() < self._next_requeue:
+                return 0
+            self._next_requeue = self._clock() + self.requeue_interval
+        requeued = self.database.requeue_stale_solution_jobs(
+            datetime.now() - timedelta(seconds=self.stale_after)
+        )
+        if requeued.modified_count:
+            logger.info(f"Requeued {requeued.modified_count} stale solution jobs")
+        return requeued.modified_count
+
+    def run_pending(self, worker: str = "inline") -> bool:
+        job = self.database.claim_solution_job(worker)
+        if job is None:
+            return False
+        started = self._clock()
+        status = SolutionJobStatuses.DONE
+        error = None
+        try:
+            customer = self.controller.get_user_by_id(job["customer"])
+            self.controller.make_solutions_by_order_id(customer, job["order"])
+        except Exception as e:
+            logger.exception(f"Solution job {job['id']} failed")
+            status = SolutionJobStatuses.FAILED
+            error = str(e)
+        self.database.finish_solution_job(job["id"], status, error)
+        wait = datetime.fromisoformat(job["started_at"]) - datetime.fromisoformat(
+            job["created_at"]
+        )
+        run = self._clock() - started
+        with self._lock:
+            if status == SolutionJobStatuses.DONE:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._wait_seconds += wait.total_seconds()
+            self._run_seconds += run
+        logger.info(
+            f"Solution job {job['id']} for order {job['order']}: {status.value}, "
+            f"waited {wait.total_seconds():.3f}s, ran {run:.3f}s"
+        )
+        return True
+
+    def _work(self, name: str) -> None:
+        while not self._stopping.is_set():
+            try:
+                self.requeue_stale_jobs()
+                if self.run_pending(name):
+                    continue
+            except Exception:
+                logger.exception(f"Solution worker {name} could not claim a job")
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval)
+
+    def stats(self) -> WorkerStats:
+        queue_depth = self.database.count_solution_jobs(SolutionJobStatuses.PENDING)
+        running = self.database.count_solution_jobs(SolutionJobStatuses.RUNNING)
+        with self._lock:
+            finished = self._completed + self._failed
+            capacity = (self._clock() - self._started_at) * max(self.workers, 1)
+            return WorkerStats(
+                workers=self.workers,
+                queue_depth=queue_depth,
+                running=running,
+                completed=self._completed,
+                failed=self._failed,
+                average_wait=self._wait_seconds / finished if finished else 0.0,
+                average_run=self._run_seconds / finished if finished else 0.0,
+                utilization=self._run_seconds / capacity if capacity else 0.0,
+            )
+
+
+def create_solution_worker_pool(controller: Controller) -> SolutionWorkerPool:
+    return SolutionWorkerPool(
+        controller,
+        workers=int(os.environ.get("SOLUTION_WORKERS", 2)),
+        poll_interval=float(os.environ.get("SOLUTION_WORKERS_POLL_INTERVAL", 1)),
+        stale_after=float(os.environ.get("SOLUTION_JOBS_STALE_AFTER", 300)),
+        requeue_interval=float(os.environ.get("SOLUTION_JOBS_REQUEUE_INTERVAL", 60)),
+    )
+
+
+def main() -> None:
+    pool = create_solution_worker_pool(Controller(create_storage()))
+    pool.start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"Solution workers: {pool.stats()}")
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
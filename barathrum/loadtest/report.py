@@ -0,0 +1,203 @@
+import json
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+MIN_LATENCY_REGRESSION = 0.001
+
+
+@dataclass
+class Sample:
+    route: str
+    status: int
+    seconds: float
+    ok: bool = True
+    reads: Optional[int] = None
+    writes: Optional[int] = None
+
+
+@dataclass
+class RouteStats:
+    count: int
+    errors: int
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    reads_per_request: Optional[float] = None
+    writes_per_request: Optional[float] = None
+
+
+@dataclass
+class LoadTestReport:
+    users: int
+    iterations: int
+    elapsed: float
+    requests: int
+    errors: int
+    throughput: float
+    journeys: int
+    failed_journeys: int
+    routes: Dict[str, RouteStats] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LoadTestReport":
+        routes = {route: RouteStats(**stats) for route, stats in data["routes"].items()}
+        return cls(**{**data, "routes": routes})
+
+
+def percentile(values: List[float], rank: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(rank / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def _per_request(values: List[Optional[int]]) -> Optional[float]:
+    counted = [value for value in values if value is not None]
+    if not counted:
+        return None
+    return sum(counted) / len(counted)
+
+
+def route_stats(samples: List[Sample]) -> RouteStats:
+    seconds = [sample.seconds for sample in samples]
+    return RouteStats(
+        count=len(samples),
+        errors=sum(not sample.ok for sample in samples),
+        mean=sum(seconds) / len(seconds) if seconds else 0.0,
+        p50=percentile(seconds, 50),
+        p95=percentile(seconds, 95),
+        p99=percentile(seconds, 99),
+        reads_per_request=_per_request([sample.reads for sample in samples]),
+        writes_per_request=_per_request([sample.writes for sample in samples]),
+    )
+
+
+def build_report(
+    samples: List[Sample],
+    elapsed: float,
+    users: int,
+    iterations: int,
+    journeys: int,
+    failed_journeys: int,
+) -> LoadTestReport:
+    by_route: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_route.setdefault(sample.route, []).append(sample)
+    return LoadTestReport(
+        users=users,
+        iterations=iterations,
+        elapsed=elapsed,
+        requests=len(samples),
+        errors=sum(not sample.ok for sample in samples),
+        throughput=len(samples) / elapsed if elapsed else 0.0,
+        journeys=journeys,
+        failed_journeys=failed_journeys,
+        routes={
+            route: route_stats(route_samples)
+            for route, route_samples in sorted(by_route.items())
+        },
+    )
+
+
+def compare_reports(
+    baseline: LoadTestReport, current: LoadTestReport, threshold: float
+) -> List[str]:
+    regressions = []
+    if current.throughput < baseline.throughput * (1 - threshold):
+        regressions.append(
+            f"throughput {current.throughput:.1f} req/s,"
+            f" baseline {baseline.throughput:.1f} req/s"
+        )
+    if current.failed_journeys > baseline.failed_journeys:
+        regressions.append(
+            f"failed journeys {current.failed_journeys},"
+            f" baseline {baseline.failed_journeys}"
+        )
+    for route, stats in current.routes.items():
+        expected = baseline.routes.get(route)
+        if expected is not None:
+            regressions.extend(_route_regressions(route, expected, stats, threshold))
+    return regressions
+
+
+def _route_regressions(
+    route: str, expected: RouteStats, stats: RouteStats, threshold: float
+) -> List[str]:
+    regressions = []
+    for name in ("p50", "p95", "p99"):
+        value, limit = getattr(stats, name), getattr(expected, name)
+        if value > limit * (1 + threshold) + MIN_LATENCY_REGRESSION:
+            regressions.append(
+                f"{route} {name} {value * 1000:.1f}ms, baseline {limit * 1000:.1f}ms"
+            )
+    if stats.errors > expected.errors:
+        regressions.append(f"{route} errors {stats.errors}, baseline {expected.errors}")
+    for name in ("reads_per_request", "writes_per_request"):
+        value, limit = getattr(stats, name), getattr(expected, name)
+        if value is not None and limit is not None and value > limit + 0.5:
+            regressions.append(f"{route} {name} {value:.1f}, baseline {limit:.1f}")
+    return regressions
+
+
+def _per_request_text(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def format_report(report: LoadTestReport) -> List[str]:
+    lines = [
+        f"{report.users} users x {report.iterations} journeys in"
+        f" {report.elapsed:.1f}s: {report.requests} requests,"
+        f" {report.throughput:.1f} req/s, {report.errors} errors,"
+        f" {report.failed_journeys}/{report.journeys} journeys failed",
+        f"{'route':<40} {'count':>6} {'err':>4} {'p50':>8} {'p95':>8} {'p99':>8}"
+        f" {'reads':>6} {'writes':>6}",
+    ]
+    for route, stats in report.routes.items():
+        reads = _per_request_text(stats.reads_per_request)
+        writes = _per_request_text(stats.writes_per_request)
+        lines.append(
+            f"{route:<40} {stats.count:>6} {stats.errors:>4}"
+            f" {stats.p50 * 1000:>6.1f}ms {stats.p95 * 1000:>6.1f}ms"
+            f" {stats.p99 * 1000:>6.1f}ms {reads:>6} {writes:>6}"
+        )
+    return lines
+
+
+def format_comparison(reports: Dict[str, LoadTestReport]) -> List[str]:
+    names = list(reports)
+    lines = [
+        " ".join(
+            f"{name}: {report.throughput:.1f} req/s" for name, report in reports.items()
+        ),
+        f"{'route':<40} "
+        + " ".join(f"{name + ' p50':>14} {name + ' p95':>14}" for name in names),
+    ]
+    routes = dict.fromkeys(
+        route for report in reports.values() for route in report.routes
+    )
+    for route in routes:
+        cells = []
+        for name in names:
+            stats = reports[name].routes.get(route)
+            if stats is None:
+                cells.append(f"{'-':>14} {'-':>14}")
+            else:
+                cells.append(f"{stats.p50 * 1000:>12.1f}ms {stats.p95 * 1000:>12.1f}ms")
+        lines.append(f"{route:<40} " + " ".join(cells))
+    return lines
+
+
+def save_report(report: LoadTestReport, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report.to_dict(), file, ensure_ascii=False, indent=2)
+
+
+def load_report(path: str) -> LoadTestReport:
+    with open(path, encoding="utf-8") as file:
+        return LoadTestReport.from_dict(json.load(file))
@@ -0,0 +1,145 @@
+import logging
+import logging.config
+import os
+import sys
+from argparse import ArgumentParser
+from typing import Optional
+from uuid import uuid4
+
+from barathrum.app import create_app
+from barathrum.config import LOGGING_CONFIG
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.storage import STORAGE_MEMORY, create_storage
+from barathrum.controller.passwords import create_password_hasher
+from barathrum.loadtest.report import (
+    LoadTestReport,
+    compare_reports,
+    format_comparison,
+    format_report,
+    load_report,
+    save_report,
+)
+from barathrum.loadtest.scenario import (
+    AppTransport,
+    HttpTransport,
+    run_load_test,
+    seed,
+)
+
+logging.config.dictConfig(LOGGING_CONFIG)
+logger = logging.getLogger("barathrum")
+
+
+def run_in_process(args, run_id: str, storage: Optional[str] = None) -> LoadTestReport:
+    app = create_app(Controller(create_storage(storage)) if storage else None)
+    app.config["SECRET_KEY"] = app.config["SECRET_KEY"] or os.urandom(16)
+    services = app.extensions["barathrum"]
+    seed(
+        services.controller.database,
+        run_id,
+        args.customers,
+        args.drivers,
+        args.orders_per_customer,
+        services.controller.password_hasher,
+    )
+    try:
+        return run_load_test(
+            lambda: AppTransport(app),
+            args.users,
+            args.iterations,
+            run_id=run_id,
+            job_timeout=args.job_timeout,
+        )
+    finally:
+        services.solution_workers.stop()
+
+
+def run_remote(args, run_id: str) -> LoadTestReport:
+    seed(
+        create_storage(),
+        run_id,
+        args.customers,
+        args.drivers,
+        args.orders_per_customer,
+        create_password_hasher(),
+    )
+    return run_load_test(
+        lambda: HttpTransport(args.url),
+        args.users,
+        args.iterations,
+        run_id=run_id,
+        job_timeout=args.job_timeout,
+    )
+
+
+def compare_storages(args, run_id: str) -> int:
+    reports = {}
+    for storage in args.storage:
+        reports[storage] = run_in_process(args, f"{run_id}-{storage}", storage)
+        print(f"[{storage}]")
+        print("\n".join(format_report(reports[storage])))
+    print("\n".join(format_comparison(reports)))
+    return 1 if any(report.failed_journeys for report in reports.values()) else 0
+
+
+def check_arguments(parser: ArgumentParser, args) -> None:
+    if args.url and os.environ.get("STORAGE") == STORAGE_MEMORY:
+        parser.error("in-memory storage can not be seeded for a remote server")
+    if args.url and args.storage:
+        parser.error("--storage only applies to an in-process app")
+    if len(args.storage) > 1 and (args.save or args.baseline):
+        parser.error("--save and --baseline need a single storage")
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Drive virtual users through the whole order lifecycle"
+    )
+    parser.add_argument(
+        "--url",
+        help="test a running server instead of an in-process app",
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--customers", type=int, default=100)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--orders-per-customer", type=int, default=5)
+    parser.add_argument("--job-timeout", type=float, default=30.0)
+    parser.add_argument("--save", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare the report with this file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown against the baseline",
+    )
+    parser.add_argument(
+        "--storage",
+        action="append",
+        default=[],
+        help="run in-process against this storage, repeat to compare storages",
+    )
+    args = parser.parse_args()
+    run_id = uuid4().hex[:8]
+    check_arguments(parser, args)
+    if len(args.storage) > 1:
+        sys.exit(compare_storages(args, run_id))
+    if args.url:
+        report = run_remote(args, run_id)
+    else:
+        report = run_in_process(args, run_id, next(iter(args.storage), None))
+    print("\n".join(format_report(report)))
+    if args.save:
+        save_report(report, args.save)
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline):
+        regressions = compare_reports(
+            load_report(args.baseline), report, args.threshold
+        )
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
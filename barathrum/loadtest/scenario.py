@@ -0,0 +1,328 @@
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.cookiejar import CookieJar
+from typing import Callable, List, Optional, Protocol
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import (
+    HTTPCookieProcessor,
+    HTTPRedirectHandler,
+    Request,
+    build_opener,
+)
+from uuid import uuid4
+
+from flask import Flask
+
+from barathrum.controller.db.storage import Storage
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.loadtest.report import LoadTestReport, Sample, build_report
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverQualification,
+    Order,
+    OrderStatuses,
+)
+
+logger = logging.getLogger("barathrum")
+
+LOAD_TEST_PASSWORD = "load-test-password"
+
+ORDER_FORM = {
+    "address_from": "Москва",
+    "address_to": "Тверь",
+    "cargo_type": "Обычный",
+    "height": "1",
+    "length": "2",
+    "weight": "100",
+    "width": "1",
+}
+
+ORDER_ID_PATTERN = re.compile(r"Заказ номер ([0-9a-f-]+)")
+JOB_STATUS_PATTERN = re.compile(r'data-status-url="([^"]+)"')
+JOB_READY_PATTERN = re.compile(r'data-ready-url="([^"]+)"')
+SOLUTION_ATTEMPTS = 3
+
+
+class JourneyFailedException(Exception):
+    pass
+
+
+@dataclass
+class Response:
+    status: int
+    body: str
+    location: Optional[str] = None
+    reads: Optional[int] = None
+    writes: Optional[int] = None
+
+
+class Transport(Protocol):
+    def request(self, method: str, path: str, data: Optional[dict] = None) -> Response:
+        ...
+
+
+class AppTransport:
+    def __init__(self, app: Flask):
+        self.client = app.test_client()
+        self.operations = app.extensions["barathrum"].controller.database.operations
+
+    def request(self, method: str, path: str, data: Optional[dict] = None) -> Response:
+        with self.operations.scope() as counts:
+            response = self.client.open(path, method=method, data=data)
+        return Response(
+            response.status_code,
+            response.get_data(as_text=True),
+            response.location,
+            counts.reads,
+            counts.writes,
+        )
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpTransport:
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method: str, path: str, data: Optional[dict] = None) -> Response:
+        body = urlencode(data).encode("utf-8") if data is not None else None
+        request = Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return Response(response.status, response.read().decode("utf-8"))
+        except HTTPError as e:
+            return Response(e.code, e.read().decode("utf-8"), e.headers.get("Location"))
+
+
+def seed(
+    database: Storage,
+    run_id: str,
+    customers: int,
+    drivers: int,
+    orders_per_customer: int,
+    password_hasher: PasswordHasher,
+) -> None:
+    qualifications = list(DriverQualification)
+    if drivers:
+        database.upload_entities(
+            [
+                Driver(
+                    name="Водитель",
+                    second_name=f"Нагрузочный-{number}",
+                    qualification=qualifications[number % len(qualifications)],
+                    experience=2 + number % 30,
+                )
+                for number in range(drivers)
+            ]
+        )
+    password = password_hasher.hash(LOAD_TEST_PASSWORD)
+    for number in range(customers):
+        customer = Customer(
+            name="Клиент",
+            second_name=f"Нагрузочный-{number}",
+            email=f"seed-{run_id}-{number}@example.com",
+            phone=f"seed-{run_id}-{number}",
+            password=password,
+        )
+        database.upload_customer(customer)
+        orders = []
+        for _ in range(orders_per_customer):
+            order = Order(cargo=Cargo(**ORDER_FORM), **ORDER_FORM)
+            order.update_status(OrderStatuses.WAIT_DECISION)
+            orders.append(order)
+        if orders:
+            database.upload_orders_for_customer(customer, orders)
+    logger.info(
+        f"Seeded {customers} customers with {orders_per_customer} orders each"
+        f" and {drivers} drivers"
+    )
+
+
+class VirtualUser:
+    def __init__(
+        self,
+        transport: Transport,
+        run_id: str,
+        number: int,
+        job_timeout: float = 30.0,
+        poll_interval: float = 0.05,
+    ):
+        self.transport = transport
+        self.run_id = run_id
+        self.number = number
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.samples: List[Sample] = []
+
+    def step(
+        self,
+        route: str,
+        method: str,
+        path: str,
+        data: Optional[dict] = None,
+        redirect: Optional[str] = None,
+    ) -> Response:
+        started = time.perf_counter()
+        response = self.transport.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        ok = response.status < 400 and (
+            redirect is None
+            or response.status in (301, 302, 303)
+            and (response.location or "").split("?")[0].endswith(redirect)
+        )
+        self.samples.append(
+            Sample(route, response.status, elapsed, ok, response.reads, response.writes)
+        )
+        if not ok:
+            raise JourneyFailedException(f"{route} answered {response.status}")
+        return response
+
+    def journey(self, iteration: int) -> None:
+        email = f"load-{self.run_id}-{self.number}-{iteration}@example.com"
+        self.step(
+            "POST /signup",
+            "POST",
+            "/signup",
+            {
+                "name": "Клиент",
+                "second_name": "Нагрузочный",
+                "email": email,
+                "phone": f"load-{self.run_id}-{self.number}-{iteration}",
+                "password": LOAD_TEST_PASSWORD,
+            },
+        )
+        self.step(
+            "POST /login",
+            "POST",
+            "/login",
+            {"email": email, "password": LOAD_TEST_PASSWORD},
+            redirect="/",
+        )
+        self.step(
+            "POST /make_order/order",
+            "POST",
+            "/make_order/order",
+            ORDER_FORM,
+            redirect="/orders",
+        )
+        orders = self.step("GET /orders", "GET", "/orders").body
+        order_id = ORDER_ID_PATTERN.search(orders)
+        if order_id is None:
+            raise JourneyFailedException("created order is not listed")
+        order_id = order_id.group(1)
+        self.confirm_solution(order_id)
+        orders_path = f"/orders/{order_id}"
+        self.step("GET /orders/<order_id>/agreement", "GET", f"{orders_path}/agreement")
+        self.step(
+            "GET /orders/<order_id>/agreement/confirm",
+            "GET",
+            f"{orders_path}/agreement/confirm",
+            redirect="/orders",
+        )
+        self.step("GET /orders/<order_id>/payments", "GET", f"{orders_path}/payments")
+        self.step(
+            "GET /orders/<order_id>/payments/confirm",
+            "GET",
+            f"{orders_path}/payments/confirm",
+            redirect="/orders",
+        )
+        self.step(
+            "GET /orders/<order_id>/done",
+            "GET",
+            f"{orders_path}/done",
+            redirect="/orders",
+        )
+        self.step("GET /logout", "GET", "/logout", redirect="/")
+
+    def confirm_solution(self, order_id: str) -> None:
+        # Водителя могут занять параллельным заказом: тогда берём новое решение
+        for _ in range(SOLUTION_ATTEMPTS):
+            solution_id = self.choose_solution(order_id)
+            response = self.step(
+                "GET /solutions/<order_id>/<solution_id>",
+                "GET",
+                f"/solutions/{order_id}/{solution_id}",
+            )
+            location = (response.location or "").split("?")[0]
+            if location.endswith("/orders"):
+                return
+        raise JourneyFailedException(f"every solution for {order_id} was taken")
+
+    def choose_solution(self, order_id: str) -> str:
+        page = self.step(
+            "GET /solutions/<order_id>", "GET", f"/solutions/{order_id}"
+        ).body
+        status_url = JOB_STATUS_PATTERN.search(page)
+        if status_url is not None:
+            deadline = time.monotonic() + self.job_timeout
+            while True:
+                job = self.step("GET /jobs/<job_id>", "GET", status_url.group(1))
+                if '"ready":true' in job.body.replace(" ", ""):
+                    break
+                if time.monotonic() > deadline:
+                    raise JourneyFailedException(f"solutions for {order_id} timed out")
+                time.sleep(self.poll_interval)
+            ready_url = JOB_READY_PATTERN.search(page).group(1).replace("&amp;", "&")
+            page = self.step("GET /solutions/<order_id>?job", "GET", ready_url).body
+        solution_id = re.search(rf"/solutions/{order_id}/([^\"/?]+)", page)
+        if solution_id is None:
+            raise JourneyFailedException(f"no solutions for {order_id}")
+        return solution_id.group(1)
+
+    def run(self, iterations: int) -> int:
+        failed = 0
+        for iteration in range(iterations):
+            try:
+                self.journey(iteration)
+            except JourneyFailedException as e:
+                failed += 1
+                logger.warning(f"Virtual user {self.number}: {e}")
+        return failed
+
+
+def run_load_test(
+    transport_factory: Callable[[], Transport],
+    users: int,
+    iterations: int,
+    run_id: Optional[str] = None,
+    job_timeout: float = 30.0,
+) -> LoadTestReport:
+    run_id = run_id or uuid4().hex[:8]
+    virtual_users = [
+        VirtualUser(transport_factory(), run_id, number, job_timeout)
+        for number in range(users)
+    ]
+    failed: List[int] = [0] * users
+
+    def run_user(number: int) -> None:
+        failed[number] = virtual_users[number].run(iterations)
+
+    threads = [
+        threading.Thread(target=run_user, args=(number,), name=f"virtual-user-{number}")
+        for number in range(users)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return build_report(
+        [sample for user in virtual_users for sample in user.samples],
+        elapsed,
+        users,
+        iterations,
+        journeys=users * iterations,
+        failed_journeys=sum(failed),
+    )
@@ -0,0 +1,187 @@
+import hmac
+import inspect
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from barathrum.models.entities import DriverStatuses, OrderStatuses
+
+logger = logging.getLogger("barathrum")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def instrument(target: Any, duration: Histogram, errors: Counter, layer: str) -> Any:
+    for name, attribute in inspect.getmembers(type(target)):
+        if name.startswith("_") or not inspect.isfunction(attribute):
+            continue
+        method = getattr(target, name)
+        if inspect.iscoroutinefunction(method):
+            continue
+        setattr(target, name, _timed(method, duration, errors, layer, name))
+    return target
+
+
+def _timed(
+    method: Callable, duration: Histogram, errors: Counter, layer: str, name: str
+) -> Callable:
+    observe = duration.labels(layer, name).observe
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            errors.labels(layer, name, type(e).__name__).inc()
+            raise
+        finally:
+            observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+class StateCollector(Collector):
+    def __init__(self, services: Any, ttl: float = 15.0, orders_ttl: float = 300.0):
+        self.services = services
+        self.ttl = ttl
+        self.orders_ttl = orders_ttl
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Tuple[float, Dict[str, int]]] = {}
+
+    def _status_counts(
+        self, name: str, count: Callable[[], Dict[str, int]], ttl: float
+    ) -> Dict[str, int]:
+        with self._lock:
+            now = time.monotonic()
+            counted_at, counts = self._counts.get(name, (None, {}))
+            if counted_at is None or now - counted_at >= ttl:
+                try:
+                    counts = count()
+                except Exception:
+                    # Хранилища бросают разные исключения (PyMongoError,
+                    # sqlite3.Error), а сбор метрик не должен ронять /metrics
+                    logger.exception(f"Could not count {name}")
+                self._counts[name] = (now, counts)
+            return counts
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        database = self.services.controller.database
+        drivers = self._status_counts(
+            "drivers", database.count_drivers_by_status, self.ttl
+        )
+        # Подсчёт встроенных заказов разворачивает всех клиентов, поэтому его
+        # обновляем реже, чем подсчёт водителей по индексу
+        orders = self._status_counts(
+            "orders", database.count_orders_by_status, self.orders_ttl
+        )
+        yield _by_status(
+            "barathrum_drivers", "Drivers by status", DriverStatuses, drivers
+        )
+        yield _by_status("barathrum_orders", "Orders by status", OrderStatuses, orders)
+        yield from self._process_gauges()
+
+    def _process_gauges(self) -> Iterator[GaugeMetricFamily]:
+        controller = self.services.controller
+        gauges = {
+            "barathrum_user_cache": controller.user_cache.stats(),
+            "barathrum_mongo_pool": controller.database.pool.stats(),
+            "barathrum_password_hasher": controller.password_hasher.stats(),
+            "barathrum_solution_workers": self.services.solution_workers.stats(),
+        }
+        for prefix, stats in gauges.items():
+            for field, value in vars(stats).items():
+                yield GaugeMetricFamily(
+                    f"{prefix}_{field}", f"{prefix} {field}", value=value
+                )
+
+
+def _by_status(
+    name: str, documentation: str, statuses: Any, counts: Dict[str, int]
+) -> GaugeMetricFamily:
+    family = GaugeMetricFamily(name, documentation, labels=["status"])
+    for status in statuses:
+        family.add_metric([status.value], counts.get(status.value, 0))
+    return family
+
+
+class Metrics:
+    def __init__(
+        self,
+        registry: Optional[CollectorRegistry] = None,
+        token: Optional[str] = None,
+    ):
+        self.registry = registry if registry is not None else CollectorRegistry()
+        self.token = token
+        self.state: Optional[StateCollector] = None
+        self.request_duration = Histogram(
+            "barathrum_http_request_duration_seconds",
+            "Time spent handling a request",
+            ["endpoint", "method"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.requests = Counter(
+            "barathrum_http_requests",
+            "Handled requests",
+            ["endpoint", "method", "status"],
+            registry=self.registry,
+        )
+        self.call_duration = Histogram(
+            "barathrum_call_duration_seconds",
+            "Time spent in controller and database methods",
+            ["layer", "method"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.call_errors = Counter(
+            "barathrum_call_errors",
+            "Exceptions raised by controller and database methods",
+            ["layer", "method", "exception"],
+            registry=self.registry,
+        )
+
+    def instrument(self, target: Any, layer: str) -> Any:
+        return instrument(target, self.call_duration, self.call_errors, layer)
+
+    def observe_request(
+        self, endpoint: str, method: str, status: int, elapsed: float
+    ) -> None:
+        self.request_duration.labels(endpoint, method).observe(elapsed)
+        self.requests.labels(endpoint, method, str(status)).inc()
+
+    def is_allowed(self, authorization: Optional[str]) -> bool:
+        if not self.token:
+            return False
+        return hmac.compare_digest(authorization or "", f"Bearer {self.token}")
+
+    def register_state(self, services: Any) -> None:
+        self.state = StateCollector(
+            services,
+            ttl=float(os.environ.get("METRICS_STATE_TTL", 15)),
+            orders_ttl=float(os.environ.get("METRICS_ORDERS_TTL", 300)),
+        )
+        self.registry.register(self.state)
+
+    def exposition(self) -> Tuple[bytes, str]:
+        registry = self.registry
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            if self.state is not None:
+                registry.register(self.state)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,170 @@
+import os
+from datetime import date, datetime
+from enum import Enum
+from functools import lru_cache, partial
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Type, TypeVar
+from uuid import UUID
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, ModelField
+
+from barathrum.models.entities import Solution
+
+Model = TypeVar("Model", bound=BaseModel)
+
+STRICT_MODELS = os.environ.get("STRICT_MODELS", "0") == "1"
+
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def _encode_sequence(value: Collection) -> list:
+    return [_encode(item) for item in value]
+
+
+def _encode_mapping(value: dict) -> dict:
+    return {key: _encode(item) for key, item in value.items()}
+
+
+_ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    **{plain_type: lambda value: value for plain_type in _PLAIN_TYPES},
+    UUID: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    Enum: lambda value: _encode(value.value),
+    BaseModel: lambda value: to_document(value),
+    list: _encode_sequence,
+    tuple: _encode_sequence,
+    set: _encode_sequence,
+    frozenset: _encode_sequence,
+    dict: _encode_mapping,
+}
+
+
+@lru_cache(maxsize=None)
+def _encoder(value_type: type) -> Callable[[Any], Any]:
+    for base in value_type.__mro__:
+        if base in _ENCODERS:
+            return _ENCODERS[base]
+    raise TypeError(f"Can not encode {value_type.__name__} to a document")
+
+
+def _encode(value: Any) -> Any:
+    return _encoder(type(value))(value)
+
+
+def to_document(model: BaseModel, exclude: Collection[str] = ()) -> dict:
+    values = model.__dict__
+    return {
+        field: _encode(values[field] if field in values else getattr(model, field))
+        for field in model.__fields__
+        if field not in exclude
+    }
+
+
+def to_documents(models: List[BaseModel]) -> List[dict]:
+    return [to_document(model) for model in models]
+
+
+def solution_to_document(solution: Solution) -> dict:
+    values = solution.__dict__
+    return {
+        field: str(solution.order.id) if field == "order" else _encode(values[field])
+        for field in solution.__fields__
+    }
+
+
+def from_document(model_class: Type[Model], document: dict) -> Model:
+    return model_class(**document)
+
+
+def _decode_datetime(value: Any) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _decode_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _decode_uuid(value: Any) -> UUID:
+    return value if isinstance(value, UUID) else UUID(value)
+
+
+def _decode_enum(enum_class: Type[Enum], value: Any) -> Enum:
+    return value if isinstance(value, enum_class) else enum_class(value)
+
+
+def _decode_model(model_class: Type[Model], value: Any) -> Model:
+    return value if isinstance(value, model_class) else _construct(model_class, value)
+
+
+def _decode_list(decoder: Optional[Callable[[Any], Any]], value: list) -> list:
+    if decoder is None:
+        return list(value)
+    return [decoder(item) for item in value]
+
+
+_DECODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime: _decode_datetime,
+    date: _decode_date,
+    UUID: _decode_uuid,
+}
+
+
+def _scalar_decoder(
+    model_class: Type[BaseModel], field_type: Any
+) -> Optional[Callable[[Any], Any]]:
+    if not isinstance(field_type, type):
+        return None
+    if issubclass(field_type, BaseModel):
+        return partial(_decode_model, field_type)
+    if issubclass(field_type, Enum):
+        if model_class.__config__.use_enum_values:
+            return None
+        return partial(_decode_enum, field_type)
+    for base, decoder in _DECODERS.items():
+        if issubclass(field_type, base):
+            return decoder
+    return None
+
+
+def _decoder(
+    model_class: Type[BaseModel], field: ModelField
+) -> Optional[Callable[[Any], Any]]:
+    decoder = _scalar_decoder(model_class, field.type_)
+    if field.shape == SHAPE_LIST:
+        return partial(_decode_list, decoder)
+    return decoder
+
+
+@lru_cache(maxsize=None)
+def _decoders(
+    model_class: Type[BaseModel],
+) -> Tuple[Tuple[str, ModelField, Optional[Callable[[Any], Any]]], ...]:
+    return tuple(
+        (name, field, _decoder(model_class, field))
+        for name, field in model_class.__fields__.items()
+    )
+
+
+def _construct(model_class: Type[Model], document: dict) -> Model:
+    values = {}
+    for name, field, decoder in _decoders(model_class):
+        if name not in document:
+            values[name] = field.get_default()
+            continue
+        value = document[name]
+        values[name] = value if value is None or decoder is None else decoder(value)
+    model = model_class.__new__(model_class)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__fields_set__", values.keys() & document.keys())
+    if model_class.__private_attributes__:
+        model._init_private_attributes()
+    return model
+
+
+def from_trusted_document(model_class: Type[Model], document: dict) -> Model:
+    if STRICT_MODELS:
+        return from_document(model_class, document)
+    return _construct(model_class, document)
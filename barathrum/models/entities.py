@@ -1,12 +1,12 @@
 from datetime import date, datetime, timedelta
 from enum import Enum
 from random import randint
-from typing import List, Optional
+from typing import Callable, List, Optional
 from uuid import UUID, uuid4
 
 from flask_login import UserMixin
 from pydantic import BaseModel as PyBaseModel
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 DATETIME_FORMAT = "%H:%M %d-%m-%Y"
 
@@ -152,6 +152,20 @@ class Customer(Person, UserMixin):
     phone: str
     password: str
     orders: Optional[List[Order]] = []
+    _orders_loader: Optional[Callable[[], List[Order]]] = PrivateAttr(default=None)
+
+    def __getattr__(self, name: str):
+        if name != "orders" or self._orders_loader is None:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        orders = self._orders_loader()
+        self.__dict__["orders"] = orders
+        self.__fields_set__.add("orders")
+        return orders
+
+    def defer_orders(self, loader: Callable[[], List[Order]]) -> None:
+        self.__dict__.pop("orders", None)
+        self.__fields_set__.discard("orders")
+        object.__setattr__(self, "_orders_loader", loader)
 
 
 class Solution(BaseModel):
@@ -159,3 +173,24 @@ class Solution(BaseModel):
     driver: Driver
     cost: float
     time: int = randint(1, 48)
+    pool_fingerprint: Optional[str] = None
+
+
+class SolutionJobStatuses(str, Enum):
+    PENDING = "В очереди"
+    RUNNING = "Выполняется"
+    DONE = "Готово"
+    FAILED = "Ошибка"
+
+
+class SolutionJob(BaseModel):
+    order: str
+    customer: str
+    status: SolutionJobStatuses = SolutionJobStatuses.PENDING
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    worker: Optional[str] = None
+    error: Optional[str] = None
+
+    class Config:
+        use_enum_values = True
@@ -0,0 +1,162 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, FrozenSet, List, Optional
+
+from barathrum.controller.db.operations import OperationCounts
+
+logger = logging.getLogger("barathrum")
+
+PROFILE_HEADER = "X-Barathrum-Profile"
+
+
+@dataclass
+class ProfileSummary:
+    name: str
+    endpoint: str
+    method: str
+    path: str
+    status: Optional[int]
+    started_at: str
+    wall_seconds: float
+    database_seconds: float
+    python_seconds: float
+    database_reads: int
+    database_writes: int
+    top: List[str]
+
+
+@dataclass
+class ActiveProfile:
+    profile: cProfile.Profile
+    started: float
+    started_at: datetime
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        keep: int = 100,
+        users: FrozenSet[str] = frozenset(),
+        top: int = 15,
+        random_value: Callable[[], float] = random.random,
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.users = users
+        self.top = top
+        self._random_value = random_value
+        self._lock = threading.Lock()
+
+    def is_allowed(self, email: Optional[str]) -> bool:
+        return email is not None and email in self.users
+
+    def should_profile(self, requested: bool, email: Optional[str]) -> bool:
+        if requested and self.is_allowed(email):
+            return True
+        return self.sample_rate > 0 and self._random_value() < self.sample_rate
+
+    def start(self) -> Optional[ActiveProfile]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            logger.info("Another profiler is active, request is not profiled")
+            return None
+        return ActiveProfile(profile, time.perf_counter(), datetime.now())
+
+    def finish(
+        self,
+        active: ActiveProfile,
+        endpoint: str,
+        method: str,
+        path: str,
+        status: Optional[int],
+        operations: Optional[OperationCounts],
+    ) -> ProfileSummary:
+        active.profile.disable()
+        wall = time.perf_counter() - active.started
+        operations = operations or OperationCounts()
+        name = f"{active.started_at:%Y%m%d-%H%M%S-%f}-{endpoint.replace('.', '-')}"
+        summary = ProfileSummary(
+            name=name,
+            endpoint=endpoint,
+            method=method,
+            path=path,
+            status=status,
+            started_at=active.started_at.isoformat(),
+            wall_seconds=wall,
+            database_seconds=operations.seconds,
+            python_seconds=max(wall - operations.seconds, 0.0),
+            database_reads=operations.reads,
+            database_writes=operations.writes,
+            top=self._top_functions(active.profile),
+        )
+        self._write(active.profile, summary)
+        return summary
+
+    def _top_functions(self, profile: cProfile.Profile) -> List[str]:
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        return [line for line in output.getvalue().splitlines() if line.strip()]
+
+    def _write(self, profile: cProfile.Profile, summary: ProfileSummary) -> None:
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f"{summary.name}.prof"))
+            with open(
+                os.path.join(self.directory, f"{summary.name}.json"),
+                "w",
+                encoding="utf-8",
+            ) as file:
+                json.dump(asdict(summary), file, ensure_ascii=False, indent=2)
+            self._rotate()
+
+    def _rotate(self) -> None:
+        summaries = sorted(
+            name for name in os.listdir(self.directory) if name.endswith(".json")
+        )
+        for name in summaries[: max(len(summaries) - self.keep, 0)]:
+            stem = name[: -len(".json")]
+            for extension in (".json", ".prof"):
+                # Старые профили может одновременно удалять другой воркер
+                try:
+                    os.remove(os.path.join(self.directory, stem + extension))
+                except FileNotFoundError:
+                    pass
+
+    def summaries(self) -> List[dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as file:
+                    result.append(json.load(file))
+            except FileNotFoundError:
+                continue
+        return result
+
+
+def create_request_profiler() -> RequestProfiler:
+    users = os.environ.get("PROFILE_USERS", "")
+    return RequestProfiler(
+        directory=os.environ.get("PROFILE_DIR", "/tmp/barathrum-profiles"),
+        sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+        keep=int(os.environ.get("PROFILE_KEEP", 100)),
+        users=frozenset(user.strip() for user in users.split(",") if user.strip()),
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from bcrypt import gensalt, hashpw
+
+from barathrum.controller.async_controller import AsyncController
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.indexes import INDEXES
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.db.motor import MotorBase, create_motor_base
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.models.entities import Cargo, Customer, Order, OrderStatuses
+
+REQUESTS = 200
+CONCURRENCY = 8
+
+
+@pytest.fixture()
+def customer_with_order(right_order_data):
+    customer = Customer(
+        name="Иван",
+        second_name="Иванов",
+        email="async@mail.ru",
+        phone="88002222222",
+        password=hashpw("sets4be4wtest43".encode("utf-8"), gensalt()),
+    )
+    order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+    order.update_status(OrderStatuses.WAIT_PAYMENTS)
+    database = MongoBase()
+    database.upload_customer(customer)
+    database.upload_order_for_customer(customer, order)
+    yield customer, order
+    database.delete_customer(customer)
+
+
+def test_async_controller_reads_what_sync_controller_wrote(customer_with_order):
+    customer, order = customer_with_order
+
+    async def confirm_payments():
+        controller = AsyncController(MotorBase())
+        await controller.confirm_payments(customer, str(order.id))
+        return (await controller.get_orders_by_user(customer)).orders
+
+    order.time = 1
+    MongoBase().update_order_fields(customer, str(order.id), {"time": 1})
+    orders = asyncio.run(confirm_payments())
+    assert orders[0].status == OrderStatuses.IN_PROGRESS.value
+    assert orders[0].expected_date is not None
+
+
+def test_async_login_keeps_password_changed_during_rehash(customer_with_order):
+    customer, _ = customer_with_order
+    database = MongoBase()
+    changed = hashpw("n3wpassw0rd".encode("utf-8"), gensalt(4)).decode()
+    controller = AsyncController(MotorBase(), password_hasher=PasswordHasher(rounds=4))
+    hash_async = controller.password_hasher.hash_async
+
+    async def hash_while_password_changes(password):
+        # Пока считался новый хеш, пользователь сменил пароль
+        database.update_entity(customer, "password", changed)
+        return await hash_async(password)
+
+    controller.password_hasher.hash_async = hash_while_password_changes
+    asyncio.run(
+        controller.login_user({"email": customer.email, "password": "sets4be4wtest43"})
+    )
+    controller.password_hasher.shutdown()
+    assert database.get_customer_by_id(str(customer.id)).password == changed
+
+
+def test_motor_unique_rebuild_keeps_index_while_duplicates_exist():
+    async def replace_twice():
+        database = MotorBase()
+        collection = database.client[MotorBase.DATABASE_NAME]["rebuild_test"]
+        await collection.drop()
+        await collection.create_index("email", name="email_1")
+        await collection.insert_many(
+            [
+                {"id": "1", "email": "kekus@mail.ru", "phone": "1"},
+                {"id": "2", "email": "kekus@mail.ru", "phone": "2"},
+            ]
+        )
+        await database._replace_indexes(collection, INDEXES["customer"])
+        kept = (await collection.index_information())["email_1"]
+        await collection.delete_one({"id": "2"})
+        await database._replace_indexes(collection, INDEXES["customer"])
+        rebuilt = (await collection.index_information())["email_1"]
+        await collection.drop()
+        return kept, rebuilt
+
+    kept, rebuilt = asyncio.run(replace_twice())
+    assert not kept.get("unique")
+    assert rebuilt["unique"]
+
+
+def test_motor_base_refuses_collection_orders_storage(monkeypatch):
+    monkeypatch.setenv("MONGO_ORDERS_STORAGE", "collection")
+    with pytest.raises(ValueError):
+        create_motor_base()
+    monkeypatch.setenv("MONGO_ORDERS_STORAGE", "embedded")
+    assert isinstance(create_motor_base(), MotorBase)
+
+
+class TestPerformance:
+    def test_sync_and_async_payments_throughput(self, customer_with_order):
+        customer, order = customer_with_order
+        sync_controller = Controller(MongoBase())
+        sync_start = time.time()
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            list(
+                executor.map(
+                    lambda _: sync_controller.show_payments(customer, str(order.id)),
+                    range(REQUESTS),
+                )
+            )
+        sync_time = time.time() - sync_start
+
+        async def run_async():
+            controller = AsyncController(MotorBase())
+            start = time.time()
+            await asyncio.gather(
+                *[
+                    controller.show_payments(customer, str(order.id))
+                    for _ in range(REQUESTS)
+                ]
+            )
+            return time.time() - start
+
+        async_time = asyncio.run(run_async())
+        print(
+            f"show_payments x{REQUESTS}: "
+            f"sync with {CONCURRENCY} threads {REQUESTS / sync_time:.0f} rps, "
+            f"async on one event loop {REQUESTS / async_time:.0f} rps"
+        )
@@ -3,13 +3,59 @@ import string
 import time
 from typing import Tuple
 
+import bson
 import pytest
 from bcrypt import gensalt, hashpw
+from pymongo import monitoring
 
-from barathrum.controller.db.mongo import CustomerExistsException, MongoBase
+from barathrum.controller.db.identity_map import IdentityMap
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.db.mongo_orders import OrderCollectionMongoBase
+from barathrum.controller.db.storage import CustomerExistsException
+from barathrum.models.codec import to_document
 from barathrum.models.entities import Cargo, Customer, Order, OrderStatuses
 
 
+class WireCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = 0
+        self.sent = 0
+        self.received = 0
+
+    def started(self, event):
+        self.commands += 1
+        self.sent += len(bson.encode(event.command))
+
+    def succeeded(self, event):
+        self.received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.commands = 0
+        self.sent = 0
+        self.received = 0
+
+
+def make_orders(customer: Customer, count: int) -> list:
+    letters = string.ascii_lowercase
+    orders = []
+    for _ in range(count):
+        random_order = {
+            "address_from": "".join(random.choice(letters) for j in range(10)),
+            "address_to": "".join(random.choice(letters) for j in range(10)),
+            "cargo_type": "Обычный",
+            "height": random.randrange(10),
+            "length": random.randrange(10),
+            "weight": random.randrange(10),
+            "width": random.randrange(10),
+        }
+        cargo = Cargo(**random_order)
+        orders.append(Order(customer=customer, cargo=cargo, **random_order))
+    return orders
+
+
 @pytest.fixture()
 def right_customer_data():
     return {
@@ -30,6 +76,7 @@ def get_db_customer_order_by_right_data(
     cargo = Cargo(**right_order_data)
     order = Order(customer=customer, cargo=cargo, **right_order_data)
     db = MongoBase()
+    db.ensure_indexes()
     return db, customer, order
 
 
@@ -82,6 +129,195 @@ class TestDataBase:
         assert customer.id == customer_from_bd.id
 
 
+class TestIdentityMap:
+    def test_customer_is_loaded_once(self, get_db_customer_order_by_right_data):
+        db, customer, order = get_db_customer_order_by_right_data
+        identity_map = IdentityMap()
+        db.identity_map_provider = lambda: identity_map
+        db.upload_customer(customer)
+        db.upload_order_for_customer(customer, order)
+        with db.operations.scope() as counts:
+            db.get_customer_by_id(str(customer.id))
+            db.get_customer_by_id(str(customer.id))
+            db.get_orders_by_customer(customer)
+            db.get_order_by_id(customer, str(order.id))
+        order.update_status(OrderStatuses.READY)
+        db.update_order_status(customer, order)
+        db_order = db.get_order_by_id(customer, str(order.id))
+        db.delete_customer(customer)
+        assert counts.reads == 2
+        assert db_order["status"] == order.status.value
+
+
+class TestProjections:
+    def test_customer_orders_are_loaded_lazily(
+        self, get_db_customer_order_by_right_data
+    ):
+        db, customer, order = get_db_customer_order_by_right_data
+        db.upload_customer(customer)
+        db.upload_order_for_customer(customer, order)
+        with db.operations.scope() as counts:
+            customer_db = db.get_customer_by_email(customer.email)
+        reads = counts.reads
+        with db.operations.scope() as counts:
+            orders = customer_db.orders
+        db.delete_customer(customer)
+        assert reads == 1
+        assert counts.reads == 1
+        assert [str(order_db.id) for order_db in orders] == [str(order.id)]
+
+
+class TestOrderCollection:
+    def test_upload_update_and_find_order(self, get_db_customer_order_by_right_data):
+        _, customer, order = get_db_customer_order_by_right_data
+        db = OrderCollectionMongoBase()
+        db.upload_customer(customer)
+        db.upload_order_for_customer(customer, order)
+        order.update_status(OrderStatuses.READY)
+        db.update_order_status(customer, order)
+        db_order = db.get_order_by_id(customer, str(order.id))
+        customer_db = db.get_one_result_by_field(Customer, "id", customer.id)
+        db.delete_customer(customer)
+        assert db_order["status"] == order.status.value
+        assert customer_db["orders"] == []
+
+    def test_migrate_embedded_orders(self, get_db_customer_order_by_right_data):
+        embedded_db, customer, _ = get_db_customer_order_by_right_data
+        db = OrderCollectionMongoBase(embedded_fallback=False)
+        orders = make_orders(customer, 10)
+        embedded_db.upload_customer(customer)
+        embedded_db.upload_orders_for_customer(customer, orders)
+        migrated = db.migrate_embedded_orders(batch_size=3, restart=True)
+        resumed = db.migrate_embedded_orders(batch_size=3)
+        db_order = db.get_order_by_id(customer, str(orders[5].id))
+        db_orders = db.get_orders_by_customer(customer)
+        customer_db = db.get_one_result_by_field(Customer, "id", customer.id)
+        db.delete_customer(customer)
+        assert migrated >= 10
+        assert resumed == 0
+        assert db_order["id"] == str(orders[5].id)
+        assert len(db_orders) == 10
+        assert customer_db["orders"] == []
+
+    def test_migration_keeps_orders_updated_during_copy(
+        self, get_db_customer_order_by_right_data, monkeypatch
+    ):
+        embedded_db, customer, _ = get_db_customer_order_by_right_data
+        db = OrderCollectionMongoBase(embedded_fallback=False)
+        orders = make_orders(customer, 3)
+        embedded_db.upload_customer(customer)
+        embedded_db.upload_orders_for_customer(customer, orders)
+        copy = db._copy_customer_orders
+        updated = []
+
+        def copy_after_update(customer_db, copied):
+            if not updated:
+                embedded_db.update_order_fields(
+                    customer, str(orders[1].id), {"status": OrderStatuses.READY.value}
+                )
+                updated.append(True)
+            copy(customer_db, copied)
+
+        monkeypatch.setattr(db, "_copy_customer_orders", copy_after_update)
+        migrated = db.migrate_embedded_orders(restart=True)
+        db_order = db.get_order_by_id(customer, str(orders[1].id))
+        customer_db = db.get_one_result_by_field(Customer, "id", customer.id)
+        db.delete_customer(customer)
+        assert migrated >= 3
+        assert db_order["status"] == OrderStatuses.READY.value
+        assert customer_db["orders"] == []
+
+    def test_upload_orders_json_replaces_customer_orders(
+        self, get_db_customer_order_by_right_data
+    ):
+        _, customer, _ = get_db_customer_order_by_right_data
+        db = OrderCollectionMongoBase(embedded_fallback=False)
+        db.upload_customer(customer)
+        orders = make_orders(customer, 3)
+        db.upload_orders_for_customer(customer, orders)
+        kept = db.get_order_by_id(customer, str(orders[0].id))
+        kept["status"] = OrderStatuses.READY.value
+        added = make_orders(customer, 1)[0]
+        db.upload_orders_for_customer_json(customer, [kept, to_document(added)])
+        replaced = {
+            order["id"]: order["status"]
+            for order in db.get_orders_by_customer(customer)
+        }
+        db.upload_orders_for_customer_json(customer, [])
+        emptied = db.get_orders_by_customer(customer)
+        db.delete_customer(customer)
+        assert replaced == {
+            str(orders[0].id): OrderStatuses.READY.value,
+            str(added.id): added.status.value,
+        }
+        assert emptied == []
+
+
+class TestStatusCounts:
+    @pytest.mark.parametrize("database_class", [MongoBase, OrderCollectionMongoBase])
+    def test_orders_are_counted_by_status(
+        self, get_db_customer_order_by_right_data, database_class
+    ):
+        embedded_db, customer, _ = get_db_customer_order_by_right_data
+        db = database_class()
+        orders = make_orders(customer, 5)
+        for order in orders[:2]:
+            order.update_status(OrderStatuses.WAIT_PAYMENTS)
+        before = db.count_orders_by_status()
+        embedded_db.upload_customer(customer)
+        embedded_db.upload_orders_for_customer(customer, orders[:3])
+        for order in orders[3:]:
+            db.upload_order_for_customer(customer, order)
+        after = db.count_orders_by_status()
+        db.delete_customer(customer)
+        added = {
+            status: after.get(status, 0) - before.get(status, 0)
+            for status in after.keys() | before.keys()
+        }
+        assert added[OrderStatuses.WAIT_PAYMENTS.value] == 2
+        assert added[OrderStatuses.IN_PROCESS.value] == 3
+
+
+class TestOrdersPage:
+    @pytest.mark.parametrize("database_class", [MongoBase, OrderCollectionMongoBase])
+    def test_pages_cover_all_orders(
+        self, get_db_customer_order_by_right_data, database_class
+    ):
+        embedded_db, customer, _ = get_db_customer_order_by_right_data
+        db = database_class()
+        orders = make_orders(customer, 25)
+        embedded_db.upload_customer(customer)
+        embedded_db.upload_orders_for_customer(customer, orders[:10])
+        for order in orders[10:]:
+            db.upload_order_for_customer(customer, order)
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = db.get_orders_page(customer, 10, cursor)
+            pages.append(page)
+            if cursor is None:
+                break
+        db.delete_customer(customer)
+        found = [order["id"] for page in pages for order in page]
+        expected = sorted(orders, key=lambda o: (o.created_at, str(o.id)), reverse=True)
+        assert [len(page) for page in pages] == [10, 10, 5]
+        assert found == [str(order.id) for order in expected]
+
+    def test_status_filter(self, get_db_customer_order_by_right_data):
+        db, customer, _ = get_db_customer_order_by_right_data
+        orders = make_orders(customer, 6)
+        for order in orders[:2]:
+            order.update_status(OrderStatuses.WAIT_PAYMENTS)
+        db.upload_customer(customer)
+        db.upload_orders_for_customer(customer, orders)
+        page, cursor = db.get_orders_page(
+            customer, 10, statuses=[OrderStatuses.WAIT_PAYMENTS.value]
+        )
+        db.delete_customer(customer)
+        assert {order["id"] for order in page} == {str(o.id) for o in orders[:2]}
+        assert cursor is None
+
+
 class TestPassword:
     def test_check_hashed_pwd(self, get_customer_update_from_bd):
         customer_from_bd, customer = get_customer_update_from_bd
@@ -118,3 +354,67 @@ class TestPerformance:
         db.get_orders_by_customer(customer)
         get_end = time.time()
         print(f"Get time: {(get_end - get_start) * 1000}")
+        db.delete_customer(customer)
+
+    @pytest.mark.parametrize("orders_count", [10, 100, 1000])
+    def test_order_status_update_wire_size(
+        self, get_db_customer_order_by_right_data, orders_count
+    ):
+        _, customer, _ = get_db_customer_order_by_right_data
+        counter = WireCounter()
+        db = MongoBase(event_listeners=[counter])
+        db.upload_customer(customer)
+        orders = make_orders(customer, orders_count)
+        db.upload_orders_for_customer(customer, orders)
+        order = orders[orders_count // 2]
+        order.update_status(OrderStatuses.WAIT_PAYMENTS)
+
+        counter.reset()
+        rewrite_start = time.time()
+        orders_db = db.get_orders_by_customer(customer)
+        for order_db in orders_db:
+            if order_db["id"] == str(order.id):
+                order_db["status"] = order.status.value
+        db.upload_orders_for_customer_json(customer, orders_db)
+        rewrite_time = (time.time() - rewrite_start) * 1000
+        rewrite = (counter.commands, counter.sent, counter.received)
+
+        counter.reset()
+        targeted_start = time.time()
+        db.update_order_status(customer, order)
+        targeted_time = (time.time() - targeted_start) * 1000
+        targeted = (counter.commands, counter.sent, counter.received)
+
+        db_order = db.get_order_by_id(customer, str(order.id))
+        db.delete_customer(customer)
+        print(
+            f"Orders: {orders_count}; "
+            f"rewrite: {rewrite_time:.2f} ms, {rewrite[0]} commands, "
+            f"{rewrite[1]} bytes sent, {rewrite[2]} bytes received; "
+            f"targeted: {targeted_time:.2f} ms, {targeted[0]} commands, "
+            f"{targeted[1]} bytes sent, {targeted[2]} bytes received"
+        )
+        assert db_order["status"] == OrderStatuses.WAIT_PAYMENTS.value
+        assert targeted[0] == 1
+        assert targeted[1] < rewrite[1]
+
+    @pytest.mark.parametrize("orders_count", [10, 1000])
+    def test_login_wire_size(self, get_db_customer_order_by_right_data, orders_count):
+        _, customer, _ = get_db_customer_order_by_right_data
+        counter = WireCounter()
+        db = MongoBase(event_listeners=[counter])
+        db.upload_customer(customer)
+        db.upload_orders_for_customer(customer, make_orders(customer, orders_count))
+
+        counter.reset()
+        db.get_customer_by_email(customer.email)
+        login = counter.received
+        counter.reset()
+        db.get_one_result_by_field(Customer, "email", customer.email)
+        full = counter.received
+        db.delete_customer(customer)
+        print(
+            f"Orders: {orders_count}; login: {login} bytes received; "
+            f"full document: {full} bytes received"
+        )
+        assert login < full
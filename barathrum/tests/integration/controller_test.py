@@ -1,4 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from bcrypt import gensalt, hashpw
+
+from barathrum.controller.controller import Controller, SolutionNotFoundException
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.passwords import PasswordHasher, hash_rounds
+from barathrum.models.codec import from_trusted_document
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    OrderStatuses,
+)
 
 
 @pytest.fixture()
@@ -12,12 +28,79 @@ def user_data():
     }
 
 
+@pytest.fixture()
+def customer_with_order(user_data, right_order_data):
+    customer = Customer(
+        password=hashpw("sets4be4wtest43".encode("utf-8"), gensalt()), **user_data
+    )
+    cargo = Cargo(**right_order_data)
+    order = Order(cargo=cargo, **right_order_data)
+    order.update_status(OrderStatuses.WAIT_DECISION)
+    database = MongoBase()
+    database.upload_customer(customer)
+    database.upload_order_for_customer(customer, order)
+    yield customer, order
+    database.delete_solutions_by_order(order)
+    database.delete_customer(customer)
+
+
 def test_create_order():
     pass
 
 
-def test_make_solutions_by_order_id():
-    pass
+@pytest.mark.parametrize("drivers_count", [1, 10])
+def test_make_solutions_by_order_id(customer_with_order, drivers_count):
+    customer, order = customer_with_order
+    database = MongoBase()
+    drivers = [
+        Driver(
+            name="Пётр",
+            second_name="Петров",
+            qualification="Высокая",
+            experience=10,
+            status=DriverStatuses.IS_WAITING,
+        )
+        for _ in range(drivers_count)
+    ]
+    for driver in drivers:
+        database.upload_entity(driver)
+    with database.operations.scope() as counts:
+        Controller(database).make_solutions_by_order_id(customer, str(order.id))
+    for driver in drivers:
+        database.delete_entity(driver)
+    assert counts.reads == 4
+    assert counts.writes <= 2
+
+
+def test_make_solutions_reuses_fresh_solutions(customer_with_order):
+    customer, order = customer_with_order
+    database = MongoBase()
+    controller = Controller(database)
+    driver = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    database.upload_entity(driver)
+    assert controller.make_solutions_by_order_id(customer, str(order.id))
+    other = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    database.upload_entity(other)
+    with database.operations.scope() as counts:
+        regenerated = controller.make_solutions_by_order_id(customer, str(order.id))
+    driver.update_status(DriverStatuses.IS_BUSY)
+    database.update_driver_status(driver)
+    driver_changed = controller.make_solutions_by_order_id(customer, str(order.id))
+    solutions = database.get_solutions_by_order_id(str(order.id))
+    database.delete_entity(driver)
+    database.delete_entity(other)
+    assert not regenerated
+    assert counts.reads == 2
+    assert counts.writes == 0
+    assert driver_changed
+    assert controller.solution_stats.reused == 1
+    assert controller.solution_stats.generated == 2
+    assert str(driver.id) not in {solution["driver"]["id"] for solution in solutions}
+    assert str(other.id) in {solution["driver"]["id"] for solution in solutions}
 
 
 def test_calculate_cost():
@@ -36,16 +119,86 @@ def test_login_user():
     pass
 
 
-def test_get_user_by_id():
-    pass
+def test_get_user_by_id(customer_with_order):
+    customer, order = customer_with_order
+    database = MongoBase()
+    controller = Controller(database)
+    controller.get_user_by_id(str(customer.id))
+    with database.operations.scope() as counts:
+        cached = controller.get_user_by_id(str(customer.id))
+    order.update_status(OrderStatuses.READY)
+    database.update_order_status(customer, order)
+    kept = controller.get_user_by_id(str(customer.id))
+    assert [loaded.status for loaded in cached.orders] == [OrderStatuses.READY]
+    database.update_order_status(customer, order)
+    reloaded = controller.get_user_by_id(str(customer.id))
+    assert counts.reads == 0
+    assert cached.id == customer.id
+    assert kept is cached
+    assert reloaded is not cached
+    assert controller.user_cache.stats().invalidations == 1
 
 
 def test_get_orders_by_user():
     pass
 
 
-def test_confirm_solution():
-    pass
+def test_confirm_solution(customer_with_order):
+    customer, order = customer_with_order
+    database = MongoBase()
+    controller = Controller(database)
+    driver = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    database.upload_entity(driver)
+    controller.make_solutions_by_order_id(customer, str(order.id))
+    solution = next(
+        solution
+        for solution in database.get_solutions_by_order_id(str(order.id))
+        if solution["driver"]["id"] == str(driver.id)
+    )
+    with database.operations.scope() as counts:
+        controller.confirm_solution(customer, str(order.id), solution["id"])
+    order_db = database.get_order_by_id(customer, str(order.id))
+    driver_db = database.get_driver_by_id(str(driver.id))
+    database.delete_entity(driver)
+    assert counts.reads == 3
+    assert counts.writes == 3
+    assert order_db["status"] == OrderStatuses.WAIT_CONTRACT_SIGNING.value
+    assert order_db["driver"]["id"] == str(driver.id)
+    assert driver_db["status"] == DriverStatuses.IS_BUSY.value
+    assert database.get_solutions_by_order_id(str(order.id)) == []
+
+
+def test_confirm_solution_books_driver_atomically(customer_with_order, monkeypatch):
+    customer, order = customer_with_order
+    database = MongoBase()
+    controller = Controller(database)
+    driver = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    database.upload_entity(driver)
+    controller.make_solutions_by_order_id(customer, str(order.id))
+    solution = next(
+        solution
+        for solution in database.get_solutions_by_order_id(str(order.id))
+        if solution["driver"]["id"] == str(driver.id)
+    )
+    # Проверка занятости прочитала свободного водителя, а другой заказ занял его
+    # до записи подтверждения
+    stale_driver = from_trusted_document(
+        Driver, database.get_driver_by_id(str(driver.id))
+    )
+    monkeypatch.setattr(database, "get_drivers_by_ids", lambda ids: [stale_driver])
+    database.update_drivers_status([driver], DriverStatuses.IS_BUSY)
+    with pytest.raises(SolutionNotFoundException):
+        controller.confirm_solution(customer, str(order.id), solution["id"])
+    order_db = database.get_order_by_id(customer, str(order.id))
+    solutions = database.get_solutions_by_order_id(str(order.id))
+    database.delete_entity(driver)
+    assert order_db["status"] == OrderStatuses.WAIT_DECISION.value
+    assert "driver" not in order_db or order_db["driver"] is None
+    assert solutions != []
 
 
 def test_create_agreement():
@@ -66,3 +219,52 @@ def test_confirm_payments():
 
 def test_accomplish_order():
     pass
+
+
+def test_login_rehashes_password_with_new_rounds(user_data):
+    database = MongoBase()
+    Controller(database, password_hasher=PasswordHasher(rounds=4)).sign_up_user(
+        {**user_data, "password": "sets4be4wtest43"}
+    )
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=5))
+    customer = controller.login_user(
+        {"email": user_data["email"], "password": "sets4be4wtest43"}
+    )
+    stored = database.get_customer_by_email(user_data["email"])
+    database.delete_customer(customer)
+    assert hash_rounds(customer.password) == 5
+    assert stored.password == customer.password
+    assert controller.password_hasher.verify("sets4be4wtest43", stored.password)
+
+
+@pytest.mark.parametrize("threads", [16])
+def test_concurrent_sign_up_creates_one_customer(user_data, threads):
+    database = MongoBase()
+    database.ensure_indexes()
+    controller = Controller(
+        database, password_hasher=PasswordHasher(rounds=4, workers=4, max_pending=64)
+    )
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(
+            executor.map(
+                lambda number: controller.sign_up_user(
+                    {
+                        **user_data,
+                        "phone": user_data["phone"] if number % 2 else str(number),
+                        "password": "sets4be4wtest43",
+                    }
+                ),
+                range(threads * 4),
+            )
+        )
+    customers = list(
+        database.client[database.DATABASE_NAME][Customer.__name__.lower()].find(
+            {"email": user_data["email"]}
+        )
+    )
+    for customer in customers:
+        database.client[database.DATABASE_NAME][Customer.__name__.lower()].delete_one(
+            {"id": customer["id"]}
+        )
+    assert results.count(True) == 1
+    assert len(customers) == 1
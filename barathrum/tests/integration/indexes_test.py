@@ -0,0 +1,90 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from barathrum.controller.db.explain import (
+    CommandRecorder,
+    find_collection_scans,
+    winning_plans,
+)
+from barathrum.controller.db.indexes import (
+    INDEXES,
+    conflicting_indexes,
+    duplicates_pipeline,
+    replace_indexes,
+    replacement_steps,
+)
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.db.mongo_orders import OrderCollectionMongoBase
+
+
+@pytest.mark.parametrize("database_class", [MongoBase, OrderCollectionMongoBase])
+def test_queries_use_indexes(database_class):
+    recorder = CommandRecorder()
+    database = database_class(event_listeners=[recorder])
+    database.ensure_indexes()
+    assert find_collection_scans(database, recorder) == {}
+
+
+def test_ensure_indexes_is_idempotent():
+    database = MongoBase()
+    first = database.ensure_indexes()
+    second = database.ensure_indexes()
+    assert first == second
+
+
+def test_non_unique_customer_indexes_conflict():
+    existing = {
+        "id_1": {"key": [("id", 1)], "unique": True},
+        "email_1": {"key": [("email", 1)]},
+        "phone_1": {"key": [("phone", 1)], "unique": True},
+    }
+    assert conflicting_indexes(INDEXES["customer"], existing) == ["email_1"]
+
+
+def test_unique_rebuild_keeps_index_while_duplicates_exist():
+    database = MongoBase()
+    collection = database.client[MongoBase.DATABASE_NAME]["rebuild_test"]
+    collection.drop()
+    collection.create_index("email", name="email_1")
+    collection.insert_many(
+        [
+            {"id": "1", "email": "kekus@mail.ru", "phone": "1"},
+            {"id": "2", "email": "kekus@mail.ru", "phone": "2"},
+        ]
+    )
+    replace_indexes(collection, INDEXES["customer"])
+    kept = collection.index_information()["email_1"]
+    collection.delete_one({"id": "2"})
+    replace_indexes(collection, INDEXES["customer"])
+    rebuilt = collection.index_information()["email_1"]
+    collection.drop()
+    assert not kept.get("unique")
+    assert rebuilt["unique"]
+
+
+def test_failed_rebuild_restores_previous_index():
+    email = INDEXES["customer"][1]
+    existing = {"email_1": {"key": [("email", 1)], "v": 2}}
+    steps = replacement_steps("customer", INDEXES["customer"], existing)
+    assert next(steps) == ("aggregate", duplicates_pipeline(email))
+    assert steps.send([]) == ("drop_index", "email_1")
+    assert steps.send(None) == ("create_indexes", [email])
+    command, restored = steps.throw(OperationFailure("E11000", 11000))
+    assert command == "create_indexes"
+    assert restored[0].document["name"] == "email_1"
+    assert dict(restored[0].document["key"]) == {"email": 1}
+    assert "unique" not in restored[0].document
+    with pytest.raises(OperationFailure):
+        steps.send(None)
+
+
+def test_aggregate_explanations_are_unwrapped():
+    find = {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}
+    aggregate = {
+        "stages": [
+            {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}},
+            {"$group": {"_id": "$status"}},
+        ]
+    }
+    assert winning_plans(find) == [{"stage": "IXSCAN"}]
+    assert winning_plans(aggregate) == [{"stage": "COLLSCAN"}]
@@ -0,0 +1,36 @@
+from uuid import uuid4
+
+from barathrum.app import create_app
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.loadtest.scenario import AppTransport, run_load_test, seed
+
+
+def test_order_lifecycle_under_load():
+    database = MongoBase()
+    database.ensure_indexes()
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    app = create_app(controller)
+    app.config["SECRET_KEY"] = "load-test"
+    run_id = uuid4().hex[:8]
+    seed(database, run_id, 2, 5, 1, controller.password_hasher)
+    try:
+        report = run_load_test(
+            lambda: AppTransport(app), users=2, iterations=2, run_id=run_id
+        )
+    finally:
+        app.extensions["barathrum"].solution_workers.stop()
+    assert report.journeys == 4
+    assert report.failed_journeys == 0
+    assert report.errors == 0
+    assert report.routes["GET /orders/<order_id>/done"].count == 4
+    assert report.routes["POST /login"].reads_per_request == 1
+    for route in (
+        "GET /orders/<order_id>/agreement",
+        "GET /orders/<order_id>/agreement/confirm",
+        "GET /orders/<order_id>/payments",
+        "GET /orders/<order_id>/payments/confirm",
+        "GET /orders/<order_id>/done",
+    ):
+        assert report.routes[route].reads_per_request == 1, route
@@ -0,0 +1,139 @@
+import time
+
+import pytest
+from bcrypt import gensalt, hashpw
+from pymongo.errors import DuplicateKeyError
+
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.mongo import MongoBase
+from barathrum.controller.workers import SolutionWorkerPool
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    Order,
+    SolutionJobStatuses,
+)
+
+
+@pytest.fixture()
+def database():
+    return MongoBase()
+
+
+@pytest.fixture()
+def customer_with_order(database, right_order_data):
+    customer = Customer(
+        name="Иван",
+        second_name="Иванов",
+        email="workers@mail.ru",
+        phone="88005553536",
+        password=hashpw("sets4be4wtest43".encode("utf-8"), gensalt()),
+    )
+    order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+    driver = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    database.upload_customer(customer)
+    database.upload_order_for_customer(customer, order)
+    database.upload_entity(driver)
+    yield customer, order
+    database.solution_jobs.delete_many({"customer": str(customer.id)})
+    database.delete_solutions_by_order(order)
+    database.delete_entity(driver)
+    database.delete_customer(customer)
+
+
+def test_submit_reuses_active_job(database, customer_with_order):
+    customer, order = customer_with_order
+    pool = SolutionWorkerPool(Controller(database), workers=0)
+    first = pool.submit(customer, str(order.id))
+    second = pool.submit(customer, str(order.id))
+    pool.run_pending()
+    third = pool.submit(customer, str(order.id))
+    assert first["status"] == SolutionJobStatuses.PENDING.value
+    assert first["id"] == second["id"]
+    assert third["id"] != first["id"]
+
+
+def test_only_one_active_job_per_order(database, customer_with_order, monkeypatch):
+    customer, order = customer_with_order
+    database.ensure_indexes()
+    pool = SolutionWorkerPool(Controller(database), workers=0)
+    job = pool.submit(customer, str(order.id))
+    with pytest.raises(DuplicateKeyError):
+        database.solution_jobs.insert_one(
+            {"id": "racing", "order": str(order.id), "active": True}
+        )
+    upsert = database._upsert_solution_job
+    attempts = []
+
+    def lose_race(order_id, document):
+        attempts.append(order_id)
+        if len(attempts) == 1:
+            raise DuplicateKeyError("order_1")
+        return upsert(order_id, document)
+
+    monkeypatch.setattr(database, "_upsert_solution_job", lose_race)
+    assert pool.submit(customer, str(order.id))["id"] == job["id"]
+    assert len(attempts) == 2
+    pool.run_pending()
+    assert "active" not in pool.get_job(job["id"])
+
+
+def test_run_pending_makes_solutions(database, customer_with_order):
+    customer, order = customer_with_order
+    pool = SolutionWorkerPool(Controller(database), workers=0)
+    job = pool.submit(customer, str(order.id))
+    assert pool.run_pending()
+    assert not pool.run_pending()
+    stats = pool.stats()
+    assert pool.get_job(job["id"])["status"] == SolutionJobStatuses.DONE.value
+    assert database.get_solutions_by_order_id(str(order.id))
+    assert stats.completed == 1
+    assert stats.queue_depth == 0
+
+
+def test_failed_job_is_recorded(database, customer_with_order):
+    customer, _ = customer_with_order
+    pool = SolutionWorkerPool(Controller(database), workers=0)
+    job = pool.submit(customer, "missing")
+    pool.run_pending()
+    failed = pool.get_job(job["id"])
+    assert failed["status"] == SolutionJobStatuses.FAILED.value
+    assert failed["error"]
+    assert pool.stats().failed == 1
+
+
+def test_workers_process_jobs_in_background(database, customer_with_order):
+    customer, order = customer_with_order
+    pool = SolutionWorkerPool(Controller(database), workers=2, poll_interval=0.1)
+    pool.start()
+    job = pool.submit(customer, str(order.id))
+    deadline = time.monotonic() + 10
+    while pool.get_job(job["id"])["status"] != SolutionJobStatuses.DONE.value:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    pool.stop()
+    stats = pool.stats()
+    assert stats.completed == 1
+    assert 0 < stats.utilization <= 1
+
+
+def test_stale_jobs_are_requeued_periodically(database, customer_with_order):
+    customer, order = customer_with_order
+    now = [0.0]
+    pool = SolutionWorkerPool(
+        Controller(database),
+        workers=0,
+        stale_after=0,
+        requeue_interval=10,
+        clock=lambda: now[0],
+    )
+    pool.start()
+    job = pool.submit(customer, str(order.id))
+    database.claim_solution_job("crashed")
+    assert pool.requeue_stale_jobs() == 0
+    now[0] = 10
+    assert pool.requeue_stale_jobs() == 1
+    assert pool.get_job(job["id"])["status"] == SolutionJobStatuses.PENDING.value
@@ -0,0 +1,64 @@
+import sys
+
+import pytest
+
+from barathrum.benchmarks import run
+from barathrum.benchmarks.cases import BENCHMARKS
+from barathrum.benchmarks.runner import (
+    BenchmarkResult,
+    compare_results,
+    load_results,
+    measure,
+    save_results,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self) -> None:
+        self.now += 0.01
+
+
+@pytest.mark.parametrize("name", sorted(BENCHMARKS))
+def test_benchmark_runs(name):
+    function = BENCHMARKS[name].setup(3)
+    assert function() is not None
+
+
+def test_measure_reports_time_per_call():
+    clock = FakeClock()
+    result = measure("noop", 10, clock.advance, repeat=3, min_time=0.05, clock=clock)
+    assert result.key == "noop[10]"
+    assert result.calls == 8
+    assert result.best == pytest.approx(0.01)
+    assert result.median == pytest.approx(0.01)
+
+
+def test_regressions_against_baseline(tmp_path):
+    baseline = [BenchmarkResult("order", 10, 0.001, 0.001, 100)]
+    save_results(baseline, str(tmp_path / "baseline.json"))
+    loaded = load_results(str(tmp_path / "baseline.json"))
+    assert loaded == {"order[10]": baseline[0]}
+    faster = [BenchmarkResult("order", 10, 0.0011, 0.0012, 100)]
+    slower = [
+        BenchmarkResult("order", 10, 0.002, 0.002, 100),
+        BenchmarkResult("order", 100, 0.02, 0.02, 10),
+    ]
+    assert not compare_results(loaded, faster, threshold=0.25)
+    assert compare_results(loaded, slower, threshold=0.25) == [
+        "order[10] 2000.0 us, baseline 1000.0 us (+100%)"
+    ]
+
+
+def test_missing_baseline_is_an_error(tmp_path, monkeypatch):
+    baseline = str(tmp_path / "missing.json")
+    monkeypatch.setattr(sys, "argv", ["run", "--baseline", baseline])
+    monkeypatch.setattr(run, "run_benchmarks", pytest.fail)
+    with pytest.raises(SystemExit) as exit_info:
+        run.main()
+    assert exit_info.value.code != 0
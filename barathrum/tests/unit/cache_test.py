@@ -0,0 +1,66 @@
+import pytest
+
+from barathrum.controller.cache import UserCache
+from barathrum.models.entities import Customer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def customer():
+    return Customer(name="Иван", second_name="Иванов", email="", phone="", password="")
+
+
+def test_cache_hit_and_miss(customer):
+    cache = UserCache()
+    assert cache.get(str(customer.id)) is None
+    cache.put(str(customer.id), customer)
+    assert cache.get(str(customer.id)) is customer
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 1, 1)
+
+
+def test_cache_entry_expires(customer):
+    clock = FakeClock()
+    cache = UserCache(ttl=10, clock=clock)
+    cache.put(str(customer.id), customer)
+    clock.now = 10
+    assert cache.get(str(customer.id)) is None
+    assert cache.stats().expirations == 1
+
+
+def test_least_recently_used_entry_is_evicted(customer):
+    cache = UserCache(max_size=2)
+    cache.put("1", customer)
+    cache.put("2", customer)
+    cache.get("1")
+    cache.put("3", customer)
+    assert cache.get("2") is None
+    assert cache.get("1") is customer
+    assert cache.stats().evictions == 1
+
+
+def test_invalidate(customer):
+    cache = UserCache()
+    cache.put(str(customer.id), customer)
+    cache.invalidate(str(customer.id))
+    assert cache.get(str(customer.id)) is None
+    assert cache.stats().invalidations == 1
+
+
+def test_forget_orders_keeps_customer_without_loaded_orders(customer):
+    cache = UserCache()
+    customer.defer_orders(lambda: [])
+    cache.put(str(customer.id), customer)
+    cache.forget_orders(str(customer.id))
+    assert cache.get(str(customer.id)) is customer
+    assert customer.orders == []
+    cache.forget_orders(str(customer.id))
+    assert cache.get(str(customer.id)) is None
+    assert cache.stats().invalidations == 1
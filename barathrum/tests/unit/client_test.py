@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from barathrum.controller.db.client import (
+    PoolMonitor,
+    ProcessLocalClient,
+    mongo_client_options,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_client_options_from_environment(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "50")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "5")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "200")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zstd, brotli,snappy")
+    monkeypatch.delenv("MONGO_MAX_IDLE_TIME_MS", raising=False)
+    options = mongo_client_options()
+    assert options["maxPoolSize"] == 50
+    assert options["minPoolSize"] == 5
+    assert options["waitQueueTimeoutMS"] == 200
+    assert options["compressors"] == "zstd,snappy"
+    assert "maxIdleTimeMS" not in options
+
+
+def test_pool_monitor_counts_checkouts_and_waits():
+    clock = FakeClock()
+    monitor = PoolMonitor(clock)
+    monitor.connection_created(None)
+    monitor.connection_check_out_started(None)
+    assert monitor.stats().waiters == 1
+    clock.now = 0.5
+    monitor.connection_checked_out(None)
+    stats = monitor.stats()
+    assert (stats.connections, stats.checked_out, stats.waiters) == (1, 1, 0)
+    monitor.connection_check_out_started(None)
+    clock.now = 2.0
+    monitor.connection_check_out_failed(None)
+    monitor.connection_checked_in(None)
+    stats = monitor.stats()
+    assert stats.checked_out == 0
+    assert stats.failed_checkouts == 1
+    assert stats.average_wait == 1.0
+    assert stats.max_wait == 1.5
+
+
+def test_client_is_created_lazily_once():
+    created = []
+    connected = []
+    client = ProcessLocalClient(
+        lambda: created.append(object()) or created[-1],
+        lambda: connected.append(True),
+    )
+    assert not created
+    assert client.get() is client.get()
+    assert len(created) == len(connected) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_client_is_recreated_after_fork():
+    client = ProcessLocalClient(object)
+    parent = client.get()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        os.write(write, b"1" if client.get() is not parent else b"0")
+        os._exit(0)
+    os.close(write)
+    recreated = os.read(read, 1)
+    os.close(read)
+    os.waitpid(pid, 0)
+    assert recreated == b"1"
+    assert client.get() is parent
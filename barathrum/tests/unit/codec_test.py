@@ -0,0 +1,211 @@
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from bcrypt import gensalt, hashpw
+from orjson import orjson
+
+from barathrum.models import codec
+from barathrum.models.codec import (
+    from_document,
+    from_trusted_document,
+    solution_to_document,
+    to_document,
+    to_documents,
+)
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    OrderStatuses,
+    Solution,
+    SolutionJob,
+)
+
+
+def make_order(right_order_data) -> Order:
+    order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+    order.set_solution_params(make_driver(), 1200.5, 12)
+    order.update_status(OrderStatuses.IN_PROGRESS)
+    order.update_status(OrderStatuses.READY)
+    return order
+
+
+def make_driver() -> Driver:
+    driver = Driver(
+        name="Пётр", second_name="Петров", qualification="Высокая", experience=10
+    )
+    driver.update_status(DriverStatuses.IS_CANDIDATE)
+    return driver
+
+
+def make_customer(orders) -> Customer:
+    return Customer(
+        name="Иван",
+        second_name="Иванов",
+        email="kekus@mail.ru",
+        phone="88005553535",
+        password=hashpw("sets4be4wtest43".encode("utf-8"), gensalt(4)),
+        orders=orders,
+    )
+
+
+def make_solutions(order, count) -> list:
+    return [
+        Solution(order=order, driver=make_driver(), cost=100.0) for _ in range(count)
+    ]
+
+
+def json_document(model) -> dict:
+    return orjson.loads(model.json())
+
+
+def json_solution_document(solution) -> dict:
+    document = orjson.loads(solution.json())
+    document["order"] = document["order"]["id"]
+    return document
+
+
+def test_order_document_matches_json(right_order_data):
+    order = make_order(right_order_data)
+    assert to_document(order) == json_document(order)
+    assert list(to_document(order)) == list(json_document(order))
+
+
+def test_customer_document_matches_json(right_order_data):
+    customer = make_customer([make_order(right_order_data) for _ in range(3)])
+    assert to_document(customer) == json_document(customer)
+
+
+def test_solution_document_matches_json(right_order_data):
+    solutions = make_solutions(make_order(right_order_data), 3)
+    assert [solution_to_document(solution) for solution in solutions] == [
+        json_solution_document(solution) for solution in solutions
+    ]
+
+
+def test_job_document_matches_json():
+    job = SolutionJob(order="order", customer="customer", started_at=datetime.now())
+    assert to_documents([job]) == [json_document(job)]
+
+
+def test_document_round_trip(right_order_data):
+    order = make_order(right_order_data)
+    assert from_document(Order, to_document(order)) == order
+
+
+def test_trusted_order_matches_validated(right_order_data):
+    document = {"_id": "object-id", **to_document(make_order(right_order_data))}
+    order = from_trusted_document(Order, document)
+    assert order == Order(**document)
+    assert isinstance(order.cargo, Cargo)
+    assert isinstance(order.driver, Driver)
+    assert isinstance(order.ready_date, datetime)
+    assert order.get_ready_readable_date()
+    assert "_id" not in order.__dict__
+
+
+def test_trusted_customer_matches_validated(right_order_data):
+    document = to_document(make_customer([make_order(right_order_data)]))
+    customer = from_trusted_document(Customer, document)
+    assert customer == Customer(**document)
+    assert customer.orders is not document["orders"]
+
+
+def test_trusted_solution_keeps_order_model(right_order_data):
+    order = make_order(right_order_data)
+    document = solution_to_document(make_solutions(order, 1)[0])
+    solution = from_trusted_document(Solution, {**document, "order": order})
+    assert solution.order is order
+    assert solution.driver.status == DriverStatuses.IS_CANDIDATE.value
+
+
+def test_trusted_read_fills_defaults(right_order_data):
+    document = to_document(make_order(right_order_data))
+    del document["status"]
+    assert from_trusted_document(Order, document).status == OrderStatuses.IN_PROCESS
+
+
+def test_strict_models_validate(monkeypatch, right_order_data):
+    monkeypatch.setattr(codec, "STRICT_MODELS", True)
+    document = to_document(make_order(right_order_data))
+    document["cargo"]["weight"] = "heavy"
+    with pytest.raises(ValueError):
+        from_trusted_document(Order, document)
+
+
+def test_unknown_type_is_rejected():
+    class Unknown:
+        pass
+
+    with pytest.raises(TypeError):
+        to_document(
+            SolutionJob.construct(
+                order=Unknown(), customer="", status="", id="", created_at=""
+            )
+        )
+
+
+def measure(encode, models, rounds=20) -> tuple:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        [encode(model) for model in models]
+    elapsed = (time.perf_counter() - start) / rounds / len(models)
+    tracemalloc.start()
+    [encode(model) for model in models]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1e6, peak / len(models)
+
+
+class TestPerformance:
+    @pytest.mark.parametrize("entity", ["order", "customer", "solutions"])
+    def test_codec_performance(self, right_order_data, entity):
+        order = make_order(right_order_data)
+        if entity == "order":
+            models = [make_order(right_order_data) for _ in range(100)]
+            encode, json_encode = to_document, json_document
+        elif entity == "customer":
+            models = [make_customer([order] * 10) for _ in range(20)]
+            encode, json_encode = to_document, json_document
+        else:
+            models = make_solutions(order, 100)
+            encode, json_encode = solution_to_document, json_solution_document
+        json_time, json_memory = measure(json_encode, models)
+        codec_time, codec_memory = measure(encode, models)
+        print(
+            f"{entity}: json {json_time:.1f} us, {json_memory / 1024:.1f} KiB; "
+            f"codec {codec_time:.1f} us, {codec_memory / 1024:.1f} KiB per entity"
+        )
+        assert codec_time < json_time
+
+    @pytest.mark.parametrize("orders_count", [1000])
+    def test_trusted_read_performance(self, right_order_data, orders_count):
+        document = to_document(
+            make_customer([make_order(right_order_data) for _ in range(orders_count)])
+        )
+
+        validated_start = time.perf_counter()
+        validated = [Order(**order) for order in document["orders"]]
+        validated_time = (time.perf_counter() - validated_start) * 1000
+        trusted_start = time.perf_counter()
+        trusted = [from_trusted_document(Order, order) for order in document["orders"]]
+        trusted_time = (time.perf_counter() - trusted_start) * 1000
+
+        customer_start = time.perf_counter()
+        Customer(**document)
+        customer_time = (time.perf_counter() - customer_start) * 1000
+        trusted_customer_start = time.perf_counter()
+        from_trusted_document(Customer, document)
+        trusted_customer_time = (time.perf_counter() - trusted_customer_start) * 1000
+        print(
+            f"Orders: {orders_count}; validated orders: {validated_time:.1f} ms; "
+            f"trusted orders: {trusted_time:.1f} ms; "
+            f"validated customer: {customer_time:.1f} ms; "
+            f"trusted customer: {trusted_customer_time:.1f} ms"
+        )
+        assert trusted == validated
+        assert trusted_time < validated_time
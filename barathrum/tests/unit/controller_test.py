@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from barathrum.controller.controller import solutions_are_fresh, solutions_are_recent
+
+
+def make_solutions(fingerprint, age, count=3):
+    created_at = (datetime.now() - timedelta(seconds=age)).isoformat()
+    return [
+        {"pool_fingerprint": fingerprint, "created_at": created_at}
+        for _ in range(count)
+    ]
+
+
+def test_fresh_solutions():
+    assert solutions_are_fresh(make_solutions("abc", 10), "abc", 60)
+
+
+def test_no_solutions_are_not_fresh():
+    assert not solutions_are_fresh([], "abc", 60)
+
+
+def test_changed_pool_is_not_fresh():
+    assert not solutions_are_fresh(make_solutions("abc", 10), "def", 60)
+
+
+def test_expired_solutions_are_not_fresh():
+    assert not solutions_are_fresh(make_solutions("abc", 120), "abc", 60)
+
+
+def test_solutions_without_fingerprint_are_not_fresh():
+    solutions = make_solutions("abc", 10)
+    del solutions[0]["pool_fingerprint"]
+    assert not solutions_are_fresh(solutions, "abc", 60)
+
+
+def test_recent_solutions_ignore_fingerprint():
+    assert solutions_are_recent(make_solutions(None, 10), 60)
+    assert not solutions_are_recent(make_solutions(None, 120), 60)
+    assert not solutions_are_recent([], 60)
@@ -0,0 +1,60 @@
+from barathrum.controller.db.identity_map import IdentityMap, covers, projection_key
+
+
+def test_identity_map_returns_added_document():
+    identity_map = IdentityMap()
+    document = {"id": "1", "orders": []}
+    identity_map.add("customer", "id", "1", document)
+    assert identity_map.get("customer", "id", "1") is document
+    assert identity_map.get("customer", "id", "2") is None
+    assert (identity_map.hits, identity_map.misses) == (1, 1)
+
+
+def test_identity_map_forgets_every_key_of_a_document():
+    identity_map = IdentityMap()
+    document = {"id": "1", "email": "kekus@mail.ru"}
+    identity_map.add("customer", "id", "1", document)
+    identity_map.add("customer", "email", "kekus@mail.ru", document)
+    identity_map.add("driver", "id", "1", {"id": "1"})
+    identity_map.forget("customer", "1")
+    assert identity_map.get("customer", "id", "1") is None
+    assert identity_map.get("customer", "email", "kekus@mail.ru") is None
+    assert identity_map.get("driver", "id", "1") is not None
+
+
+def test_projected_get_falls_back_to_full_document():
+    identity_map = IdentityMap()
+    document = {"id": "1", "orders": []}
+    projected = {"id": "1"}
+    identity_map.add("customer", "id", "1", projected, {"orders": 0})
+    assert identity_map.get("customer", "id", "1") is None
+    assert identity_map.get("customer", "id", "1", {"orders": 0}) is projected
+    identity_map.add("customer", "id", "1", document)
+    assert identity_map.get("customer", "id", "1", {"_id": 0, "orders": 1}) is document
+
+
+def test_projected_get_uses_covering_entry():
+    identity_map = IdentityMap()
+    orders = {"id": "1", "orders": []}
+    identity_map.add("customer", "id", "1", orders, {"_id": 0, "id": 1, "orders": 1})
+    assert identity_map.get("customer", "id", "1", {"orders": 1}) is orders
+    assert identity_map.get("customer", "id", "1", {"orders": 0}) is None
+    customer = {"id": "1", "name": "Иван"}
+    identity_map.add("customer", "id", "1", customer, {"orders": 0})
+    assert identity_map.get("customer", "id", "1", {"name": 1}) is customer
+    identity_map.forget("customer", "1")
+    assert identity_map.get("customer", "id", "1", {"orders": 1}) is None
+
+
+def test_covers_compares_projected_fields():
+    orders = projection_key({"_id": 0, "id": 1, "orders": 1})
+    no_orders = projection_key({"orders": 0})
+    assert covers(None, orders)
+    assert covers(orders, projection_key({"orders": 1}))
+    assert not covers(orders, projection_key({"name": 1}))
+    assert not covers(orders, no_orders)
+    assert covers(no_orders, projection_key({"orders": 0, "password": 0}))
+    assert not covers(no_orders, orders)
+    assert not covers(no_orders, None)
+    element = projection_key({"orders": {"$elemMatch": {"id": "1"}}})
+    assert not covers(orders, element)
@@ -0,0 +1,113 @@
+from barathrum.app import create_app
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.memory import MemoryBase
+from barathrum.controller.db.sqlite import SqliteBase
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.loadtest.report import (
+    LoadTestReport,
+    Sample,
+    build_report,
+    compare_reports,
+    format_comparison,
+    load_report,
+    percentile,
+    save_report,
+)
+from barathrum.loadtest.scenario import AppTransport, run_load_test, seed
+
+
+def make_report(seconds: float, reads: int = 2, elapsed: float = 1.0):
+    samples = [
+        Sample("GET /orders", 200, seconds * (number + 1) / 100, reads=reads, writes=0)
+        for number in range(100)
+    ]
+    samples.append(Sample("POST /login", 302, seconds, ok=False))
+    return build_report(
+        samples, elapsed, users=2, iterations=1, journeys=2, failed_journeys=1
+    )
+
+
+def test_percentiles_use_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_report_groups_samples_by_route():
+    report = make_report(0.1)
+    assert report.requests == 101
+    assert report.errors == 1
+    assert report.throughput == 101
+    orders = report.routes["GET /orders"]
+    assert orders.count == 100
+    assert orders.p95 == 0.095
+    assert orders.reads_per_request == 2
+    assert report.routes["POST /login"].reads_per_request is None
+
+
+def test_baseline_round_trip(tmp_path):
+    report = make_report(0.1)
+    save_report(report, str(tmp_path / "baseline.json"))
+    assert load_report(str(tmp_path / "baseline.json")) == report
+
+
+def test_regressions_against_baseline():
+    baseline = make_report(0.1)
+    assert not compare_reports(baseline, make_report(0.11), threshold=0.2)
+    regressions = compare_reports(
+        baseline, make_report(0.2, reads=3, elapsed=2.0), threshold=0.2
+    )
+    assert any(regression.startswith("throughput") for regression in regressions)
+    assert "GET /orders p95 190.0ms, baseline 95.0ms" in regressions
+    assert "GET /orders reads_per_request 3.0, baseline 2.0" in regressions
+
+
+def test_report_from_dict_restores_routes():
+    report = LoadTestReport.from_dict(make_report(0.1).to_dict())
+    assert report.routes["GET /orders"].count == 100
+
+
+def test_comparison_lists_every_storage():
+    lines = format_comparison({"mongo": make_report(0.2), "sqlite": make_report(0.1)})
+    assert lines[0] == "mongo: 101.0 req/s sqlite: 101.0 req/s"
+    assert "mongo p95" in lines[1] and "sqlite p95" in lines[1]
+    assert lines[2].split() == [
+        "GET",
+        "/orders",
+        "100.0ms",
+        "190.0ms",
+        "50.0ms",
+        "95.0ms",
+    ]
+
+
+def test_order_lifecycle_in_memory():
+    database = MemoryBase()
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    app = create_app(controller)
+    app.config["SECRET_KEY"] = "load-test"
+    seed(database, "memory", 3, 5, 2, controller.password_hasher)
+    try:
+        report = run_load_test(lambda: AppTransport(app), users=2, iterations=2)
+    finally:
+        app.extensions["barathrum"].solution_workers.stop()
+    assert report.failed_journeys == 0
+    assert report.routes["GET /orders/<order_id>/done"].count == 4
+    assert report.routes["POST /login"].reads_per_request == 1
+
+
+def test_order_lifecycle_in_sqlite(tmp_path):
+    database = SqliteBase(str(tmp_path / "barathrum.sqlite3"))
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    app = create_app(controller)
+    app.config["SECRET_KEY"] = "load-test"
+    seed(database, "sqlite", 3, 5, 2, controller.password_hasher)
+    try:
+        report = run_load_test(lambda: AppTransport(app), users=2, iterations=2)
+    finally:
+        app.extensions["barathrum"].solution_workers.stop()
+    assert report.failed_journeys == 0
+    assert report.routes["GET /orders/<order_id>/done"].count == 4
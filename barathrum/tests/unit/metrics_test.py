@@ -0,0 +1,137 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from barathrum.app import create_app
+from barathrum.controller.cache import UserCache
+from barathrum.controller.controller import Controller
+from barathrum.controller.db.memory import MemoryBase
+from barathrum.controller.db.client import PoolMonitor
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.metrics import Metrics, StateCollector
+
+
+class Database:
+    def __init__(self):
+        self.pool = PoolMonitor()
+        self.counted = 0
+        self.orders_counted = 0
+
+    def find(self, value):
+        return value
+
+    def fail(self):
+        raise KeyError("missing")
+
+    def count_drivers_by_status(self):
+        self.counted += 1
+        return {"Свободен": 3}
+
+    def count_orders_by_status(self):
+        self.orders_counted += 1
+        return {"Выполнен": 2}
+
+
+def sample(metrics, name, **labels):
+    return metrics.registry.get_sample_value(name, labels)
+
+
+def test_instrumented_methods_are_timed():
+    metrics = Metrics()
+    database = metrics.instrument(Database(), "database")
+    assert database.find(1) == 1
+    with pytest.raises(KeyError):
+        database.fail()
+    labels = {"layer": "database", "method": "find"}
+    assert sample(metrics, "barathrum_call_duration_seconds_count", **labels) == 1
+    assert (
+        sample(
+            metrics,
+            "barathrum_call_errors_total",
+            layer="database",
+            method="fail",
+            exception="KeyError",
+        )
+        == 1
+    )
+
+
+def test_requests_are_counted_by_status():
+    metrics = Metrics()
+    metrics.observe_request("root", "GET", 200, 0.01)
+    metrics.observe_request("root", "GET", 500, 0.02)
+    assert (
+        sample(
+            metrics,
+            "barathrum_http_requests_total",
+            endpoint="root",
+            method="GET",
+            status="500",
+        )
+        == 1
+    )
+    assert (
+        sample(
+            metrics,
+            "barathrum_http_request_duration_seconds_count",
+            endpoint="root",
+            method="GET",
+        )
+        == 2
+    )
+
+
+def test_state_is_counted_once_per_ttl():
+    database = Database()
+    hasher = PasswordHasher(rounds=4, workers=1)
+    services = SimpleNamespace(
+        controller=SimpleNamespace(
+            database=database, user_cache=UserCache(), password_hasher=hasher
+        ),
+        solution_workers=SimpleNamespace(stats=lambda: SimpleNamespace(running=1)),
+    )
+    metrics = Metrics()
+    metrics.state = StateCollector(services, ttl=0, orders_ttl=60)
+    metrics.registry.register(metrics.state)
+    metrics.exposition()
+    metrics.exposition()
+    hasher.shutdown()
+    assert database.counted == 2
+    assert database.orders_counted == 1
+    assert sample(metrics, "barathrum_drivers", status="Свободен") == 3
+    assert sample(metrics, "barathrum_drivers", status="Занят") == 0
+    assert sample(metrics, "barathrum_orders", status="Выполнен") == 2
+    assert sample(metrics, "barathrum_solution_workers_running") == 1
+
+
+def test_state_survives_storage_errors():
+    database = Database()
+    database.count_orders_by_status = lambda: sqlite3.connect(":memory:").execute(
+        "SELECT * FROM missing"
+    )
+    services = SimpleNamespace(controller=SimpleNamespace(database=database))
+    state = StateCollector(services)
+    assert state._status_counts("orders", database.count_orders_by_status, 0) == {}
+    assert state._status_counts("drivers", database.count_drivers_by_status, 0) == {
+        "Свободен": 3
+    }
+
+
+def test_metrics_require_token(monkeypatch):
+    assert not Metrics().is_allowed("Bearer ")
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+    controller = Controller(MemoryBase(), password_hasher=PasswordHasher(rounds=4))
+    app = create_app(controller)
+    try:
+        client = app.test_client()
+        anonymous = client.get("/metrics")
+        wrong = client.get("/metrics", headers={"Authorization": "Bearer other"})
+        allowed = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    finally:
+        app.extensions["barathrum"].solution_workers.stop()
+        controller.password_hasher.shutdown()
+    assert anonymous.status_code == 401
+    assert wrong.status_code == 401
+    assert allowed.status_code == 200
+    assert b"barathrum_drivers" in allowed.data
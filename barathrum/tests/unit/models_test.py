@@ -42,3 +42,19 @@ class TestPydantic:
         order = Order(cargo=cargo, **right_order_data)
         order.update_status(OrderStatuses.WAIT_DECISION)
         assert order.status.value == "Ждёт выбора решения"
+
+    def test_customer_orders_are_loaded_on_access(self, right_order_data):
+        order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+        customer = Customer(
+            name="Иван",
+            second_name="Иванов",
+            email="kekus@mail.ru",
+            phone="88005553535",
+            password="password",
+        )
+        calls = []
+        customer.defer_orders(lambda: calls.append(1) or [order])
+        assert "orders" not in customer.__dict__
+        assert customer.orders == [order]
+        assert customer.orders == [order]
+        assert len(calls) == 1
@@ -0,0 +1,23 @@
+from barathrum.controller.db.operations import OperationCounter
+
+
+def test_nested_scopes_stop_their_own_counts():
+    counter = OperationCounter()
+    with counter.scope() as outer:
+        with counter.scope() as inner:
+            pass
+        counter.count("find")
+        counter.count("update")
+    counter.count("find")
+    assert (inner.reads, inner.writes) == (0, 0)
+    assert (outer.reads, outer.writes) == (1, 1)
+
+
+def test_counts_reach_every_active_scope():
+    counter = OperationCounter()
+    with counter.scope() as outer:
+        counter.count("insert")
+        with counter.scope() as inner:
+            counter.count("aggregate")
+    assert outer.round_trips == 2
+    assert inner.round_trips == 1
@@ -0,0 +1,39 @@
+import pytest
+
+from barathrum.controller.db.pagination import (
+    InvalidCursorException,
+    OrderCursor,
+    split_page,
+)
+
+
+def make_documents(count):
+    return [
+        {"id": f"order-{index:02}", "created_at": f"2022-06-0{index % 3 + 1}T10:00:00"}
+        for index in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    cursor = OrderCursor(created_at="2022-06-01T10:00:00.123456", id="order-1")
+    assert OrderCursor.decode(cursor.encode()) == cursor
+
+
+@pytest.mark.parametrize("token", ["", "not base64!", "b3JkZXI="])
+def test_invalid_cursor(token):
+    with pytest.raises(InvalidCursorException):
+        OrderCursor.decode(token)
+
+
+def test_split_page_orders_by_created_at_and_id():
+    documents = make_documents(7)
+    page, cursor = split_page(documents, 5)
+    keys = [(document["created_at"], document["id"]) for document in page]
+    assert keys == sorted(keys, reverse=True)
+    assert cursor == OrderCursor.from_document(page[-1])
+
+
+def test_split_last_page():
+    page, cursor = split_page(make_documents(3), 5)
+    assert len(page) == 3
+    assert cursor is None
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from barathrum.controller.passwords import (
+    PasswordHasher,
+    PasswordHasherBusyException,
+    hash_rounds,
+)
+
+
+@pytest.fixture()
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    hashed = hasher.hash("sets4be4wtest43")
+    assert hash_rounds(hashed) == 4
+    assert hasher.verify("sets4be4wtest43", hashed)
+    assert not hasher.verify("wrong", hashed)
+    stats = hasher.stats()
+    assert (stats.hashed, stats.verified, stats.pending) == (1, 2, 0)
+
+
+def test_needs_rehash_when_rounds_change(hasher):
+    hashed = hasher.hash("sets4be4wtest43")
+    assert not hasher.needs_rehash(hashed)
+    hasher.rounds = 5
+    assert hasher.needs_rehash(hashed)
+
+
+def test_excess_work_is_rejected(hasher):
+    release = threading.Event()
+    blocked = hasher.submit(release.wait)
+    with pytest.raises(PasswordHasherBusyException):
+        hasher.verify("sets4be4wtest43", "$2b$04$")
+    release.set()
+    blocked.result()
+    assert hasher.stats().rejected == 1
+    assert hasher.hash("sets4be4wtest43")
@@ -0,0 +1,58 @@
+import os
+import time
+
+from barathrum.controller.db.operations import OperationCounts
+from barathrum.profiling import RequestProfiler
+
+
+def profile_request(profiler: RequestProfiler, endpoint: str = "root"):
+    active = profiler.start()
+    time.sleep(0.01)
+    return profiler.finish(
+        active, endpoint, "GET", "/", 200, OperationCounts(reads=2, seconds=0.0005)
+    )
+
+
+def test_sampling_and_allowed_users():
+    profiler = RequestProfiler(
+        "unused", sample_rate=0.1, users=frozenset({"admin@mail.ru"})
+    )
+    profiler._random_value = lambda: 0.5
+    assert profiler.should_profile(True, "admin@mail.ru")
+    assert not profiler.should_profile(True, "user@mail.ru")
+    assert not profiler.should_profile(False, "admin@mail.ru")
+    profiler._random_value = lambda: 0.05
+    assert profiler.should_profile(False, None)
+
+
+def test_profile_records_database_and_python_time(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    summary = profile_request(profiler)
+    assert summary.database_seconds == 0.0005
+    assert summary.python_seconds == summary.wall_seconds - 0.0005
+    assert summary.python_seconds > 0
+    assert summary.database_reads == 2
+    assert summary.top
+    assert os.path.exists(tmp_path / f"{summary.name}.prof")
+    assert profiler.summaries()[0]["name"] == summary.name
+
+
+def test_old_profiles_are_rotated(tmp_path):
+    profiler = RequestProfiler(str(tmp_path), keep=2)
+    names = [profile_request(profiler, f"page{number}").name for number in range(4)]
+    assert [summary["name"] for summary in profiler.summaries()] == names[:1:-1]
+    assert len(os.listdir(tmp_path)) == 4
+
+
+def test_rotation_ignores_profiles_removed_by_another_worker(tmp_path, monkeypatch):
+    profiler = RequestProfiler(str(tmp_path), keep=1)
+    profile_request(profiler, "first")
+    remove = os.remove
+
+    def remove_twice(path):
+        remove(path)
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", remove_twice)
+    latest = profile_request(profiler, "second")
+    assert [summary["name"] for summary in profiler.summaries()] == [latest.name]
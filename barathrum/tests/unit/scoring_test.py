@@ -0,0 +1,119 @@
+import random
+import time
+from uuid import uuid4
+
+import pytest
+
+from barathrum.controller.controller import Controller
+from barathrum.controller.scoring import (
+    DriverPool,
+    ScoringEngine,
+    drivers_fingerprint,
+)
+from barathrum.models.entities import (
+    Cargo,
+    Driver,
+    DriverQualification,
+    DriverStatuses,
+)
+
+
+def make_driver_documents(count: int) -> list:
+    qualifications = [qualification.value for qualification in DriverQualification]
+    statuses = [DriverStatuses.IS_WAITING.value, DriverStatuses.IS_CANDIDATE.value]
+    return [
+        {
+            "id": str(uuid4()),
+            "name": "Иван",
+            "second_name": "Иванов",
+            "qualification": random.choice(qualifications),
+            "experience": random.randint(2, 60),
+            "status": random.choice(statuses),
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.fixture()
+def cargo(right_order_data):
+    return Cargo(**right_order_data)
+
+
+def test_drivers_fingerprint_ignores_order():
+    drivers = [Driver(**document) for document in make_driver_documents(20)]
+    assert drivers_fingerprint(drivers) == drivers_fingerprint(drivers[::-1])
+
+
+def test_drivers_fingerprint_changes_with_drivers_and_statuses():
+    drivers = [Driver(**document) for document in make_driver_documents(20)]
+    fingerprint = drivers_fingerprint(drivers)
+    assert fingerprint != drivers_fingerprint(drivers[1:])
+    drivers[0].update_status(DriverStatuses.IS_BUSY)
+    assert fingerprint != drivers_fingerprint(drivers)
+
+
+def test_costs_match_controller(cargo):
+    documents = make_driver_documents(50)
+    pool = DriverPool.from_documents(documents)
+    costs = ScoringEngine.costs(pool, cargo)
+    for document, cost in zip(documents, costs):
+        assert cost == Controller._calculate_cost(Driver(**document), cargo)
+
+
+def test_rank_returns_best_drivers_in_order(cargo):
+    documents = make_driver_documents(200)
+    engine = ScoringEngine(k=5)
+    pool = DriverPool.from_documents(documents)
+    ranked = engine.rank(pool, cargo)
+    scores = engine.scores(pool, engine.costs(pool, cargo))
+    assert len(ranked.ids) == 5
+    assert ranked.scores == sorted(ranked.scores, reverse=True)
+    assert ranked.scores[-1] >= sorted(scores, reverse=True)[4]
+
+
+def test_experienced_waiting_driver_wins(cargo):
+    documents = make_driver_documents(2)
+    documents[0].update(experience=60, status=DriverStatuses.IS_WAITING.value)
+    documents[1].update(
+        qualification=documents[0]["qualification"],
+        experience=2,
+        status=DriverStatuses.IS_CANDIDATE.value,
+    )
+    ranked = ScoringEngine(k=1).rank(DriverPool.from_documents(documents), cargo)
+    assert ranked.ids == [documents[0]["id"]]
+
+
+def test_rank_small_and_empty_pool(cargo):
+    engine = ScoringEngine(k=10)
+    assert (
+        len(engine.rank(DriverPool.from_documents(make_driver_documents(3)), cargo).ids)
+        == 3
+    )
+    assert engine.rank(DriverPool.from_documents([]), cargo).ids == []
+
+
+class TestPerformance:
+    @pytest.mark.parametrize("drivers_count", [1000, 10000, 100000])
+    def test_rank_drivers_performance(self, cargo, drivers_count):
+        documents = make_driver_documents(drivers_count)
+        engine = ScoringEngine(k=10)
+
+        models_start = time.time()
+        costs = [
+            (Controller._calculate_cost(Driver(**document), cargo), document["id"])
+            for document in documents
+        ]
+        sorted(costs)[:10]
+        models_time = (time.time() - models_start) * 1000
+
+        pool_start = time.time()
+        pool = DriverPool.from_documents(documents)
+        pool_time = (time.time() - pool_start) * 1000
+        rank_start = time.time()
+        ranked = engine.rank(pool, cargo)
+        rank_time = (time.time() - rank_start) * 1000
+        print(
+            f"Drivers: {drivers_count}; per-driver models: {models_time:.1f} ms; "
+            f"columns: {pool_time:.1f} ms; vectorized rank: {rank_time:.2f} ms"
+        )
+        assert len(ranked.ids) == 10
@@ -0,0 +1,284 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from barathrum.controller.controller import Controller, SolutionNotFoundException
+from barathrum.controller.db.sqlite import SqliteBase
+from barathrum.controller.db.storage import CustomerExistsException
+from barathrum.controller.passwords import PasswordHasher
+from barathrum.models.entities import (
+    Cargo,
+    Customer,
+    Driver,
+    DriverStatuses,
+    Order,
+    OrderStatuses,
+    Solution,
+    SolutionJobStatuses,
+)
+
+
+def make_customer(email: str = "kekus@mail.ru", phone: str = "88005553535"):
+    return Customer(
+        name="Иван", second_name="Иванов", email=email, phone=phone, password="x"
+    )
+
+
+def make_order(right_order_data, created_at: datetime = None) -> Order:
+    order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+    if created_at is not None:
+        order.created_at = created_at
+    order.update_status(OrderStatuses.WAIT_DECISION)
+    return order
+
+
+def make_driver(status: DriverStatuses = DriverStatuses.IS_WAITING) -> Driver:
+    return Driver(
+        name="Пётр",
+        second_name="Петров",
+        qualification="Высокая",
+        experience=10,
+        status=status,
+    )
+
+
+@pytest.fixture()
+def database(tmp_path):
+    database = SqliteBase(str(tmp_path / "barathrum.sqlite3"))
+    yield database
+    database.close()
+
+
+def test_schema_uses_wal_and_indexes(database):
+    assert database.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    indexes = database.ensure_indexes()
+    assert "orders_customer_created" in indexes["orders"]
+    assert "solution_jobs_status_created" in indexes["solution_jobs"]
+
+
+def test_email_and_phone_are_unique(database):
+    database.upload_customer(make_customer())
+    with pytest.raises(CustomerExistsException):
+        database.upload_customer(make_customer(phone="1"))
+    with pytest.raises(CustomerExistsException):
+        database.upload_customer(make_customer(email="other@mail.ru"))
+    database.upload_customer(make_customer("other@mail.ru", "1"))
+    assert database.get_customer_by_phone("1").email == "other@mail.ru"
+
+
+def test_other_integrity_errors_are_not_duplicate_customers(database):
+    customer = make_customer()
+    database.upload_customer(customer)
+    same_id = make_customer("other@mail.ru", "1").copy(update={"id": customer.id})
+    with pytest.raises(sqlite3.IntegrityError):
+        database.upload_customer(same_id)
+
+
+def test_customer_orders_are_loaded_lazily(database, right_order_data):
+    customer = make_customer()
+    order = make_order(right_order_data)
+    database.upload_customer(customer)
+    database.upload_order_for_customer(customer, order)
+    with database.operations.scope() as counts:
+        found = database.get_customer_by_email(customer.email)
+        assert "orders" not in found.__dict__
+        assert [loaded.id for loaded in found.orders] == [order.id]
+    assert counts.reads == 2
+    stored = database.get_order_by_id(customer, str(order.id))
+    assert stored["cargo"]["weight"] == 2
+    assert database.get_order_by_id(make_customer(), str(order.id)) is None
+
+
+def test_orders_page_is_sorted_and_filtered(database, right_order_data):
+    customer = make_customer()
+    database.upload_customer(customer)
+    started = datetime(2022, 1, 1)
+    orders = [
+        make_order(right_order_data, started + timedelta(minutes=minute))
+        for minute in range(5)
+    ]
+    orders[1].update_status(OrderStatuses.READY)
+    database.upload_orders_for_customer(customer, orders)
+    page, cursor = database.get_orders_page(customer, 2)
+    assert [document["id"] for document in page] == [
+        str(orders[4].id),
+        str(orders[3].id),
+    ]
+    page, cursor = database.get_orders_page(customer, 2, cursor)
+    assert [document["id"] for document in page] == [
+        str(orders[2].id),
+        str(orders[1].id),
+    ]
+    page, cursor = database.get_orders_page(customer, 2, cursor)
+    assert [document["id"] for document in page] == [str(orders[0].id)]
+    assert cursor is None
+    page, _ = database.get_orders_page(
+        customer, 10, statuses=[OrderStatuses.READY.value]
+    )
+    assert [document["id"] for document in page] == [str(orders[1].id)]
+    assert database.count_orders_by_status() == {
+        OrderStatuses.WAIT_DECISION.value: 4,
+        OrderStatuses.READY.value: 1,
+    }
+
+
+def test_unit_of_work_is_one_transaction(database, right_order_data):
+    customer = make_customer()
+    order = make_order(right_order_data)
+    drivers = [make_driver() for _ in range(3)]
+    database.upload_customer(customer)
+    database.upload_order_for_customer(customer, order)
+    database.upload_entities(drivers)
+    order.update_status(OrderStatuses.WAIT_CONTRACT_SIGNING)
+    drivers[0].update_status(DriverStatuses.IS_BUSY)
+    with pytest.raises(ValueError):
+        with database.unit_of_work() as uow:
+            uow.update_driver_status(drivers[0])
+            uow.update_order_fields(customer, str(order.id), {"unknown": 1})
+    assert database.count_drivers_by_status() == {DriverStatuses.IS_WAITING.value: 3}
+    with database.unit_of_work() as uow:
+        uow.update_order_status(customer, order)
+        uow.update_driver_status(drivers[0])
+    assert len(database.get_vacant_driver_pool()) == 2
+    assert database.count_drivers_by_status() == {
+        DriverStatuses.IS_WAITING.value: 2,
+        DriverStatuses.IS_BUSY.value: 1,
+    }
+    stored = database.get_order_by_id(customer, str(order.id))
+    assert stored["status"] == OrderStatuses.WAIT_CONTRACT_SIGNING.value
+
+
+def test_solution_job_queue(database):
+    customer = make_customer()
+    first = database.enqueue_solution_job(customer, "first")
+    assert database.enqueue_solution_job(customer, "first")["id"] == first["id"]
+    database.enqueue_solution_job(customer, "second")
+    claimed = database.claim_solution_job("worker")
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == SolutionJobStatuses.RUNNING.value
+    assert database.count_solution_jobs(SolutionJobStatuses.PENDING) == 1
+    requeued = database.requeue_stale_solution_jobs(datetime.now() + timedelta(1))
+    assert requeued.modified_count == 1
+    assert database.count_solution_jobs(SolutionJobStatuses.PENDING) == 2
+    database.claim_solution_job("worker")
+    database.finish_solution_job(first["id"], SolutionJobStatuses.DONE)
+    job = database.get_solution_job(first["id"])
+    assert job["status"] == SolutionJobStatuses.DONE.value
+
+
+def test_threads_claim_each_job_once(database):
+    customer = make_customer()
+    for number in range(20):
+        database.enqueue_solution_job(customer, f"order-{number}")
+    claimed = []
+
+    def claim() -> None:
+        while True:
+            job = database.claim_solution_job(threading.current_thread().name)
+            if job is None:
+                return
+            claimed.append(job["id"])
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(claimed) == len(set(claimed)) == 20
+    assert database.pool.stats().connections >= 4
+
+
+def test_controller_runs_order_lifecycle(database, right_order_data):
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    database.upload_entities([make_driver() for _ in range(5)])
+    assert controller.sign_up_user(
+        {
+            "name": "Иван",
+            "second_name": "Иванов",
+            "email": "kekus@mail.ru",
+            "phone": "88005553535",
+            "password": "secret",
+        }
+    )
+    customer = controller.login_user({"email": "kekus@mail.ru", "password": "secret"})
+    controller.create_order(customer, dict(right_order_data))
+    order_id = str(controller.get_orders_by_user(customer).orders[0].id)
+    controller.make_solutions_by_order_id(customer, order_id)
+    solution = database.get_solutions_by_order_id(order_id)[0]
+    controller.confirm_solution(customer, order_id, solution["id"])
+    controller.confirm_agreement(customer, order_id)
+    controller.confirm_payments(customer, order_id)
+    controller.accomplish_order(customer, order_id)
+    order = controller.get_orders_by_user(customer).orders[0]
+    assert order.status == OrderStatuses.READY.value
+    assert str(order.driver.id) == solution["driver"]["id"]
+    assert DriverStatuses.IS_BUSY.value not in database.count_drivers_by_status()
+    controller.password_hasher.shutdown()
+
+
+def test_concurrent_requests_generate_solutions_once(database, right_order_data):
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    customer = make_customer()
+    database.upload_customer(customer)
+    order = make_order(right_order_data)
+    database.upload_order_for_customer(customer, order)
+    database.upload_entities([make_driver() for _ in range(3)])
+    barrier = threading.Barrier(2)
+
+    def make_solutions():
+        barrier.wait()
+        controller.make_solutions_by_order_id(customer, str(order.id))
+
+    threads = [threading.Thread(target=make_solutions) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(database.get_solutions_by_order_id(str(order.id))) == 3
+    assert (controller.solution_stats.generated, controller.solution_stats.reused) == (
+        1,
+        1,
+    )
+    controller.password_hasher.shutdown()
+
+
+def test_driver_is_confirmed_for_one_order_only(database, right_order_data):
+    controller = Controller(database, password_hasher=PasswordHasher(rounds=4))
+    customer = make_customer()
+    database.upload_customer(customer)
+    driver = make_driver()
+    database.upload_entity(driver)
+    orders = [make_order(right_order_data) for _ in range(2)]
+    solutions = [Solution(order=order, driver=driver, cost=1) for order in orders]
+    for order in orders:
+        database.upload_order_for_customer(customer, order)
+    database.upload_solutions(solutions)
+    controller.confirm_solution(customer, str(orders[0].id), str(solutions[0].id))
+    with pytest.raises(SolutionNotFoundException):
+        controller.confirm_solution(customer, str(orders[1].id), str(solutions[1].id))
+    order_db = database.get_order_by_id(customer, str(orders[1].id))
+    assert order_db["status"] == OrderStatuses.WAIT_DECISION.value
+    controller.password_hasher.shutdown()
+
+
+def test_orders_and_solutions_keep_driver_snapshot(database, right_order_data):
+    customer = make_customer()
+    database.upload_customer(customer)
+    order = make_order(right_order_data)
+    database.upload_order_for_customer(customer, order)
+    driver = make_driver(DriverStatuses.IS_BUSY)
+    database.upload_entity(driver)
+    solution = Solution(order=order, driver=driver, cost=1)
+    database.upload_solutions([solution])
+    order.set_solution_params(driver=driver, cost=1, time=1)
+    database.update_order_solution_params(customer, order)
+    database.update_entity(driver, "status", DriverStatuses.IS_WAITING.value)
+    database.delete_entity(driver)
+    order_db = database.get_order_by_id(customer, str(order.id))
+    solution_db = database.get_solution_by_id(str(solution.id))
+    assert order_db["driver"]["id"] == str(driver.id)
+    assert order_db["driver"]["status"] == DriverStatuses.IS_BUSY.value
+    assert solution_db["driver"]["name"] == driver.name
+    assert solution_db["driver"]["status"] == DriverStatuses.IS_BUSY.value
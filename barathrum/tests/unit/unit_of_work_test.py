@@ -0,0 +1,57 @@
+import pytest
+
+from barathrum.controller.db.unit_of_work import UnitOfWork
+from barathrum.models.entities import Cargo, Customer, Order, OrderStatuses
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.flushed = []
+
+    def flush_unit_of_work(self, uow):
+        self.flushed.append(dict(uow.order_fields))
+
+
+@pytest.fixture()
+def customer_and_order(right_order_data):
+    customer = Customer(
+        name="Иван", second_name="Иванов", email="", phone="", password=""
+    )
+    order = Order(cargo=Cargo(**right_order_data), **right_order_data)
+    return customer, order
+
+
+def test_order_updates_are_merged(customer_and_order):
+    customer, order = customer_and_order
+    database = RecordingDatabase()
+    order.time = 2
+    order.update_status(OrderStatuses.IN_PROGRESS)
+    with UnitOfWork(database) as uow:
+        uow.update_order_status(customer, order)
+        uow.update_order_expected_date(customer, order)
+    assert database.flushed == [
+        {
+            (str(customer.id), str(order.id)): {
+                "status": OrderStatuses.IN_PROGRESS.value,
+                "expected_date": order.expected_date,
+            }
+        }
+    ]
+
+
+def test_nothing_is_written_after_exception(customer_and_order):
+    customer, order = customer_and_order
+    database = RecordingDatabase()
+    with pytest.raises(ValueError):
+        with UnitOfWork(database) as uow:
+            uow.update_order_status(customer, order)
+            raise ValueError
+    assert database.flushed == []
+    assert uow.is_empty()
+
+
+def test_empty_unit_of_work_does_not_flush():
+    database = RecordingDatabase()
+    with UnitOfWork(database):
+        pass
+    assert database.flushed == []
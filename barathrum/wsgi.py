@@ -0,0 +1,3 @@
+from barathrum.app import create_app
+
+app = create_app()